@@ -0,0 +1,47 @@
+import argparse
+import time
+
+from parameters_analysis.feature_store.features import FEATURE_SETS
+from parameters_analysis.feature_store.store import FeatureStore
+from parameters_analysis.query_service.store import COLLECTED_DATA_DIR
+from training.tokenizing import capture_files
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Materialize and inspect the memory-mapped feature store.")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    materialize = commands.add_parser('materialize', help="compute the feature matrices of capture CSVs once")
+    materialize.add_argument('paths', nargs='*', default=[COLLECTED_DATA_DIR], help="CSV files or directories")
+    materialize.add_argument('--sets', nargs='+', choices=list(FEATURE_SETS), default=list(FEATURE_SETS))
+
+    show = commands.add_parser('show', help="print the stored features of one file")
+    show.add_argument('path', help="capture CSV")
+    show.add_argument('--set', choices=list(FEATURE_SETS), default='flow')
+    show.add_argument('--rows', type=int, default=10)
+
+    commands.add_parser('prune', help="delete entries of changed files or feature sets")
+
+    args = parser.parse_args()
+    store = FeatureStore()
+
+    if args.command == 'materialize':
+        paths = capture_files(args.paths)
+        for feature_set in args.sets:
+            start = time.perf_counter()
+            rows = sum(len(table) for table in store.load_many(feature_set, paths))
+            print(f"{feature_set}: {rows} rows from {len(paths)} files in {time.perf_counter() - start:.2f}s, "
+                  f"dataset version {store.version(feature_set, paths)[:12]}")
+    elif args.command == 'show':
+        start = time.perf_counter()
+        table = store.load(args.set, args.path)
+        elapsed = time.perf_counter() - start
+        print(table.frame().head(args.rows).to_string(index=False))
+        print(f"{len(table)} rows x {len(table.columns)} features, loaded in {elapsed * 1000:.1f} ms "
+              f"from {table.directory}")
+    else:
+        print(f"Removed {store.prune()} stale entries")
+
+
+if __name__ == '__main__':
+    main()
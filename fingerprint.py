@@ -0,0 +1,68 @@
+import argparse
+import time
+
+from parameters_analysis.aggregation.loader import load_traffic
+from parameters_analysis.feature_store.features import FEATURE_SETS
+from parameters_analysis.fingerprinting.evaluation import evaluate
+from parameters_analysis.fingerprinting.index import (ALGORITHMS, FEATURE_SET, FINGERPRINT_INDEX_PATH, NEIGHBOURS,
+                                                      WINDOW, FingerprintIndex, build_index, user_captures,
+                                                      user_windows)
+from parameters_analysis.query_service.store import COLLECTED_DATA_DIR
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Identify users by the behavioural fingerprint of their traffic.")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    build = commands.add_parser('build', help="index the fingerprint windows of collected_data/<user>/ captures")
+    build.add_argument('data_dir', nargs='?', default=COLLECTED_DATA_DIR)
+    build.add_argument('--index', default=FINGERPRINT_INDEX_PATH)
+    build.add_argument('--algorithm', choices=ALGORITHMS, default='kd_tree')
+    build.add_argument('--neighbours', type=int, default=NEIGHBOURS)
+
+    identify = commands.add_parser('identify', help="closest known user of every window of a capture CSV")
+    identify.add_argument('path', help="capture CSV")
+    identify.add_argument('--index', default=FINGERPRINT_INDEX_PATH)
+
+    evaluation = commands.add_parser('evaluate', help="accuracy and query latency as users and windows grow")
+    evaluation.add_argument('data_dir', nargs='?', default=COLLECTED_DATA_DIR)
+    evaluation.add_argument('--users', type=int, nargs='+', help="numbers of users to index (default: 2..all)")
+    evaluation.add_argument('--windows', type=int, nargs='+', help="caps on indexed windows per user "
+                                                                   "(default: all of them)")
+    evaluation.add_argument('--algorithms', nargs='+', choices=ALGORITHMS, default=ALGORITHMS)
+    evaluation.add_argument('--neighbours', type=int, default=NEIGHBOURS)
+    evaluation.add_argument('--test-size', type=float, default=0.3, help="share of each user's latest windows "
+                                                                         "held out as queries")
+    evaluation.add_argument('--repeats', type=int, default=5, help="random user subsets per user count")
+
+    args = parser.parse_args()
+
+    if args.command == 'build':
+        start = time.perf_counter()
+        index = build_index(args.data_dir, args.index, args.algorithm, args.neighbours)
+        print(f"Indexed {len(index)} windows of {WINDOW}s from {len(index.user_names)} users "
+              f"({', '.join(index.user_names)}) in {time.perf_counter() - start:.2f}s; saved to {args.index}")
+    elif args.command == 'identify':
+        index = FingerprintIndex.load(args.index)
+        df = load_traffic(args.path, columns=FEATURE_SETS[FEATURE_SET].columns)
+        start = time.perf_counter()
+        result = index.identify(df)
+        elapsed = time.perf_counter() - start
+        print(result.to_string(index=False))
+        if len(result):
+            print(f"{len(result)} windows identified in {elapsed * 1000:.1f} ms "
+                  f"({elapsed / len(result) * 1000:.2f} ms per window, fingerprinting included)")
+            print(result['user'].value_counts().to_string())
+    else:
+        X, users, starts = user_windows(user_captures(args.data_dir))
+        report = evaluate(X, users, starts, args.users, args.windows or [None], args.algorithms, args.neighbours,
+                          args.test_size, args.repeats)
+        if report.empty:
+            print("No user count to evaluate: there are fingerprint windows of only "
+                  f"{len(set(users))} users")
+        else:
+            print(report.to_string(index=False, float_format=lambda value: f'{value:.3f}'))
+
+
+if __name__ == '__main__':
+    main()
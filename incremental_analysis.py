@@ -0,0 +1,181 @@
+import argparse
+import fnmatch
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import matplotlib
+import pandas as pd
+
+# Reports are rendered without a display; select the backend before any pyplot import
+matplotlib.use('Agg')
+
+from parameters_analysis.aggregation.engine import AggregationResults, enrich, required_columns
+from parameters_analysis.aggregation.incremental import AggregateState
+from parameters_analysis.aggregation.loader import read_traffic_rows, root_dir
+from parameters_analysis.aggregation.suite import REPORTS, load_reports, suite_requirements
+from report_runner import render_report
+
+# packet_analysis_Automation.py writes a new network_traffic_<timestamp>.csv every 15 minutes here
+WATCH_DIR = os.path.join(os.path.expanduser('~'), 'Downloads')
+FILE_PATTERN = 'network_traffic_*.csv'
+
+# Checkpoint and the latest results live here
+STATE_DIR = os.path.join(root_dir, '.incremental_state')
+
+
+class IncrementalAnalysis:
+    """
+    Folds capture files into persisted aggregate state as they appear or grow.
+
+    For every file the checkpoint records the byte offset of the last complete
+    row consumed.  A poll reads only the bytes after that offset, enriches and
+    aggregates them, then replaces the checkpoint (offsets + aggregate state)
+    in one atomic rename.  A crash at any point leaves the previous checkpoint
+    intact; its offsets describe exactly the data already folded in, so a
+    restart resumes without double-counting.  The state is bounded (running
+    aggregates plus the most recent rows), so a refresh costs the same however
+    long the capture has been running.
+    """
+
+    def __init__(self, watch_dir=WATCH_DIR, reports=REPORTS, state_dir=STATE_DIR, output_dir='reports',
+                 pattern=FILE_PATTERN, workers=None):
+        self.watch_dir = watch_dir
+        self.reports = list(reports)
+        self.state_dir = state_dir
+        self.output_dir = os.path.abspath(output_dir)
+        self.pattern = pattern
+        self.workers = workers
+
+        metrics, columns = suite_requirements(load_reports(self.reports))
+        self.base, self.needed = required_columns(metrics, columns)
+        self.checkpoint = self.load_checkpoint(AggregateState(metrics))
+
+    @property
+    def checkpoint_path(self):
+        return os.path.join(self.state_dir, 'checkpoint.pkl')
+
+    def load_checkpoint(self, state):
+        """Resume from the last checkpoint unless the reports' metrics changed since."""
+        fresh = {'files': {}, 'batches': 0, 'state': state}
+        if not os.path.exists(self.checkpoint_path):
+            return fresh
+        checkpoint = pd.read_pickle(self.checkpoint_path)
+        if checkpoint['state'].signature != state.signature:
+            print("Report metrics changed; rebuilding state from the start of every file")
+            return fresh
+        return checkpoint
+
+    def save_checkpoint(self):
+        os.makedirs(self.state_dir, exist_ok=True)
+        pd.to_pickle(self.checkpoint, self.checkpoint_path + '.tmp')
+        os.replace(self.checkpoint_path + '.tmp', self.checkpoint_path)
+
+    def capture_files(self):
+        if not os.path.isdir(self.watch_dir):
+            return []
+        return sorted(os.path.join(self.watch_dir, name) for name in os.listdir(self.watch_dir)
+                      if fnmatch.fnmatch(name, self.pattern))
+
+    def read_new_rows(self, path, position):
+        """
+        Rows appended to path since position (offset, header), up to the last
+        complete line, and the new position.  A file that shrank was replaced
+        and is read from the start again.
+        """
+        offset, header = position or (0, None)
+        size = os.path.getsize(path)
+        if size < offset:
+            print(f"{path} shrank below its checkpoint; reading it again from the start")
+            offset, header = 0, None
+        if size == offset:
+            return None, (offset, header)
+
+        with open(path, 'rb') as f:
+            f.seek(offset)
+            data = f.read(size - offset)
+        # The capture may be in the middle of writing a row
+        data = data[:data.rfind(b'\n') + 1]
+        offset += len(data)
+
+        if header is None:
+            if not data:
+                return None, (0, None)
+            line, _, data = data.partition(b'\n')
+            header = line.decode().strip().split(',')
+        if not data.strip():
+            return None, (offset, header)
+        return read_traffic_rows(data, header, columns=self.base), (offset, header)
+
+    def poll(self):
+        """Fold every new or grown file into the state; returns the number of new rows."""
+        files = dict(self.checkpoint['files'])
+        frames = []
+        for path in self.capture_files():
+            rows, files[path] = self.read_new_rows(path, files.get(path))
+            if rows is not None and len(rows):
+                frames.append(rows)
+        if not frames:
+            # Header-only reads still advance the offsets
+            if files != self.checkpoint['files']:
+                self.checkpoint['files'] = files
+                self.save_checkpoint()
+            return 0
+
+        batch = enrich(pd.concat(frames, ignore_index=True), self.needed)
+
+        state = self.checkpoint['state']
+        state.fold(batch)
+
+        self.checkpoint = {'files': files, 'batches': self.checkpoint['batches'] + 1, 'state': state}
+        self.save_checkpoint()
+        return len(batch)
+
+    def frame(self):
+        """The most recent rows folded so far, for the row-level plots."""
+        recent = self.checkpoint['state'].recent
+        return pd.DataFrame(columns=sorted(self.needed)) if recent is None else recent
+
+    def refresh(self):
+        """Re-render every report from the persisted state."""
+        start = time.perf_counter()
+        tables, passes = self.checkpoint['state'].results()
+        data = AggregationResults(self.frame(), tables, passes, {})
+        results_path = os.path.join(self.state_dir, 'results.pkl')
+        pd.to_pickle(data, results_path)
+
+        with ProcessPoolExecutor(max_workers=self.workers) as pool:
+            futures = [pool.submit(render_report, report, results_path,
+                                   os.path.join(self.output_dir, report.rsplit('.', 1)[-1]), self.checkpoint['batches'])
+                       for report in self.reports]
+            for future in futures:
+                future.result()
+        return time.perf_counter() - start
+
+    def watch(self, interval=60, once=False):
+        while True:
+            rows = self.poll()
+            if rows:
+                seconds = self.refresh()
+                print(f"Folded {rows} new rows ({self.checkpoint['state'].rows} total), "
+                      f"reports refreshed in {seconds:.2f} s")
+            if once:
+                return
+            time.sleep(interval)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Incrementally analyse capture files as they are written.")
+    parser.add_argument('watch_dir', nargs='?', default=WATCH_DIR, help="directory receiving capture CSVs")
+    parser.add_argument('--pattern', default=FILE_PATTERN, help="file name pattern of capture CSVs")
+    parser.add_argument('--output-dir', default='reports', help="directory receiving one folder per report")
+    parser.add_argument('--interval', type=int, default=60, help="seconds between directory scans")
+    parser.add_argument('--once', action='store_true', help="process pending data once and exit")
+    args = parser.parse_args()
+
+    IncrementalAnalysis(args.watch_dir, output_dir=args.output_dir,
+                        pattern=args.pattern).watch(args.interval, args.once)
+
+
+if __name__ == '__main__':
+    main()
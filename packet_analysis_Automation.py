@@ -10,8 +10,34 @@ import math
 import socket
 import os
 
+from parameters_analysis.access_pattern_analysis.streaming_windows import CsvSink, WindowedAggregator, capture_observer
+from parameters_analysis.anomaly_analysis.baselines import AnomalyDetector
+from parameters_analysis.application_analysis.classifier import ApplicationClassifier
+from parameters_analysis.fingerprinting.index import LiveIdentifier
+from parameters_analysis.flow_scoring.scorer import FlowScorer
+from parameters_analysis.geo_location_analysis.geo_index import geo_database_available, load_geo_index
+from parameters_analysis.live_dashboard.aggregates import LiveAggregates
+from parameters_analysis.live_dashboard.packet_buffer import PacketRingBuffer
+from parameters_analysis.live_dashboard.server import start_dashboard
+from parameters_analysis.session_flow_analysis.sessionize import ACK, FIN, IDLE_GAP, RST
+
+# Offline IP-range index, used instead of the online lookup when a local database is present
+geo_index = load_geo_index() if geo_database_available() else None
+
+# Application labels cached per bidirectional flow
+application_classifier = ApplicationClassifier()
+
+# Online per-flow / per-host baselines scoring each packet into behavioral_pattern
+anomaly_detector = AnomalyDetector()
+
+# Classifier from training_model.py applied to flow checkpoints in background micro-batches
+flow_scorer = FlowScorer()
+
+
 # Function to get geolocation data
 def get_geolocation(ip_address):
+    if geo_index is not None:
+        return geo_index.lookup_one(ip_address)
     try:
         response = requests.get(f'https://ipinfo.io/{ip_address}/json')
         data = response.json()
@@ -24,7 +50,7 @@ def get_geolocation(ip_address):
 flow_data = {}
 
 # Dictionary to store session data
-session_data = defaultdict(lambda: {"packets": [], "start_time": None, "end_time": None})
+session_data = defaultdict(lambda: {"packets": [], "start_time": None, "end_time": None, "closed": False})
 
 # Network range
 network = ip_network('192.168.1.0/24')
@@ -36,15 +62,22 @@ csv_fields = [
     'total_packets', 'total_bytes', 'flow_direction', 'session_duration',
     'session_count', 'mean_packet_size', 'variance_packet_size', 'entropy',
     'access_patterns', 'usage_frequency', 'temporal_patterns',
-    'country', 'region', 'city', 'application_data', 'behavioral_pattern', 'network_context'
+    'country', 'region', 'city', 'application_data', 'behavioral_pattern', 'network_context',
+    'tcp_flags', 'capture_time', 'intruder_probability'
 ]
 
+# Path to Downloads folder
+save_folder = os.path.join(os.path.expanduser('~'), 'Downloads')
+
+# Headers of the most recent packets, queryable from the dashboard server at /packets
+recent_packets = PacketRingBuffer()
+
+# Callables receiving every written row (as a dict of csv_fields) and its capture time
+row_observers = []
+
 # Create new CSV file every 15 minutes
 def create_csv_writer():
     timestamp = time.strftime('%Y%m%d_%H%M')
-    
-    # Path to Downloads folder
-    save_folder = os.path.join(os.path.expanduser('~'), 'Downloads')
 
     # Create the folder if it doesn't exist
     if not os.path.exists(save_folder):
@@ -140,13 +173,21 @@ def packet_callback(packet, writer):
         flow_data[flow_key]["last_time"] = current_time
         flow_data[flow_key]["packet_sizes"].append(len(packet))
 
-        # Update session data
-        if flow_key not in session_data or session_data[flow_key]["end_time"] is None:
-            session_data[flow_key]["start_time"] = current_time
-            session_data[flow_key]["end_time"] = current_time
-
-        session_data[flow_key]["packets"].append(len(packet))
-        session_data[flow_key]["end_time"] = current_time
+        # Update session data; a session ends after IDLE_GAP seconds of silence or once
+        # the flow was closed with FIN / RST (bare ACKs finishing the close do not count)
+        tcp_flags = int(packet[TCP].flags) if protocol == 'TCP' else 0
+        closing = bool(tcp_flags & (FIN | RST))
+        significant = tcp_flags != ACK
+        session = session_data[flow_key]
+        if (session["end_time"] is None or current_time - session["end_time"] > IDLE_GAP
+                or (session["closed"] and significant and not closing)):
+            session["start_time"] = current_time
+            session["packets"] = []
+
+        session["packets"].append(len(packet))
+        session["end_time"] = current_time
+        if significant:
+            session["closed"] = closing
 
         # Calculate additional metrics
         mean_packet_size = np.mean(flow_data[flow_key]["packet_sizes"])
@@ -165,11 +206,26 @@ def packet_callback(packet, writer):
         # Get geolocation data
         country, region, city = get_geolocation(ip_layer.dst)
 
-        # Dummy application-level data and behavioral analytics
-        application_data = 'Unknown'  # Placeholder for actual application data
-        behavioral_pattern = 'Normal'  # Placeholder for actual behavior pattern analysis
+        # Application from DNS / TLS / QUIC / HTTP headers of the flow's first packets
+        transport = packet[TCP] if protocol == 'TCP' else packet[UDP]
+        application_data = application_classifier.classify(
+            ip_layer.src, ip_layer.dst, src_port, dst_port, protocol, lambda: bytes(transport.payload))
+
+        # Distance of this packet from its flow's and source host's baselines
+        behavioral_pattern = round(anomaly_detector.score(
+            flow_key + (protocol,), ip_layer.src,
+            {'packet_size': len(packet), 'payload_size': len(packet.payload),
+             'inter_arrival_time': inter_arrival_time}), 2)
         network_context = 'Normal'  # Placeholder for network context analysis
 
+        # Queue the flow's current features for the classifier; the row gets the flow's latest
+        # probability (empty until its first micro-batch is scored)
+        flow_scorer.submit(flow_key, ip_layer.src, ip_layer.dst, current_time, {
+            'packet_size': len(packet), 'total_packets': flow_data[flow_key]['packet_count'],
+            'total_bytes': flow_data[flow_key]['byte_count'],
+            'flow_duration': flow_data[flow_key]['last_time'] - flow_data[flow_key]['start_time']})
+        intruder_probability = flow_scorer.latest(flow_key)
+
         # Prepare row data for CSV
         row = [
             ip_layer.src,
@@ -197,26 +253,66 @@ def packet_callback(packet, writer):
             city,
             application_data,
             behavioral_pattern,
-            network_context
+            network_context,
+            tcp_flags,
+            round(current_time, 6),
+            None if intruder_probability is None else round(intruder_probability, 3)
         ]
 
+        # Keep the packet header in the in-memory buffer of recent packets
+        recent_packets.append(current_time, ip_layer.src, ip_layer.dst, src_port, dst_port, protocol,
+                              len(packet), len(packet.payload), tcp_flags)
+
         # Write row data to CSV
         writer.writerow(row)
 
+        # Hand the row to attached streaming operators
+        if row_observers:
+            fields = dict(zip(csv_fields, row))
+            for observer in row_observers:
+                observer(fields, current_time)
+
 
 # Main function to handle CSV file creation and sniffing
 def main():
     file, writer = create_csv_writer()
     start_time = time.time()
 
-    while True:
-        sniff(prn=lambda x: packet_callback(x, writer), store=False, timeout=60)  # Capture for 1 minute
+    # Per-host packet size statistics in 1-minute windows, written as each window closes
+    if not os.path.exists(save_folder):
+        os.makedirs(save_folder)
+    sink = CsvSink(os.path.join(save_folder, 'access_pattern_windows.csv'))
+    windows = WindowedAggregator(size='1min', allowed_lateness='5s', sink=sink)
+    row_observers.append(capture_observer(windows))
+
+    # Live dashboard fed from in-memory aggregates of the captured rows
+    live = LiveAggregates()
+    row_observers.append(live.observe)
+    dashboard = start_dashboard(live)
+
+    # Classifier scores of live flows; throughput, latency and top flows at /scores
+    flow_scorer.start()
 
-        # Check if 15 minutes have passed
-        if time.time() - start_time >= 900:  # 900 seconds = 15 minutes
-            file.close()  # Close the current file
-            file, writer = create_csv_writer()  # Create a new CSV file
-            start_time = time.time()  # Reset the start time
+    if dashboard is not None:
+        dashboard.add_route('/packets', recent_packets.query_params)
+        dashboard.add_route('/scores', flow_scorer.metrics)
+        # Closest known user (collected_data/<user>/ fingerprints) of the last complete window at /fingerprint
+        dashboard.add_route('/fingerprint', LiveIdentifier(recent_packets).identify)
+
+    try:
+        while True:
+            sniff(prn=lambda x: packet_callback(x, writer), store=False, timeout=60)  # Capture for 1 minute
+
+            # Check if 15 minutes have passed
+            if time.time() - start_time >= 900:  # 900 seconds = 15 minutes
+                file.close()  # Close the current file
+                file, writer = create_csv_writer()  # Create a new CSV file
+                flow_scorer.graph.reset()  # Host graph features are per file, as in training
+                start_time = time.time()  # Reset the start time
+    finally:
+        windows.flush()
+        sink.close()
+        file.close()
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -1,34 +1,48 @@
 import os
-import pandas as pd
+
 import plotly.express as px
 
-# Load the data from the CSV file
-root_dir = os.path.dirname(os.path.dirname(os.path.dirname(__file__)))
-csv_path = os.path.join(root_dir, 'network_traffic.csv')
-df = pd.read_csv(csv_path)
+from parameters_analysis.access_pattern_analysis.streaming_windows import aggregate_frame
+from parameters_analysis.aggregation.engine import run_metrics
+from parameters_analysis.aggregation.registry import register_metric
+
+# Aggregates this report needs from the shared engine
+METRICS = [
+    register_metric('packets_per_timestamp', keys=['temporal_patterns'], total_packets=('total_packets', 'sum')),
+]
+
+# Row-level columns used directly by the plots
+COLUMNS = []
+
+# Event-time window of each point and span of the rolling average
+WINDOW = '1D'
+ROLLING_WINDOW = '7D'
+
+
+def render(data, output_dir='.', show=True):
+    # Aggregate data by day with the same windowing operator the live capture uses
+    windows = aggregate_frame(data['packets_per_timestamp'], value_column='total_packets', size=WINDOW)
+    daily_traffic = windows.set_index('start')[['total']].rename(columns={'total': 'total_packets'})
 
-# Convert timestamp to datetime
-df['temporal_patterns'] = pd.to_datetime(df['temporal_patterns'])
+    # Calculate rolling average over the last 7 days of event time, not the last 7 rows
+    daily_traffic['rolling_avg'] = daily_traffic['total_packets'].rolling(ROLLING_WINDOW).mean()
 
-# Aggregate data by day
-daily_traffic = df.groupby(['temporal_patterns']).agg({'total_packets': 'sum'}).reset_index()
-daily_traffic.set_index('temporal_patterns', inplace=True)
+    # Create a line plot with rolling average
+    fig = px.line(daily_traffic,
+                  x=daily_traffic.index,
+                  y=['total_packets', 'rolling_avg'],
+                  title="Daily Network Traffic with Rolling Average",
+                  labels={
+                      "value": "Total Packets",
+                      "timestamp": "Date"
+                  })
 
-# Calculate rolling average
-daily_traffic['rolling_avg'] = daily_traffic['total_packets'].rolling(window=7).mean()
+    # Save the plot as an HTML file
+    output_html = os.path.join(output_dir, 'daily_traffic_rolling_avg.html')
+    fig.write_html(output_html)
 
-# Create a line plot with rolling average
-fig = px.line(daily_traffic,
-              x=daily_traffic.index,
-              y=['total_packets', 'rolling_avg'],
-              title="Daily Network Traffic with Rolling Average",
-              labels={
-                  "value": "Total Packets",
-                  "timestamp": "Date"
-              })
+    print(f"Plot saved as {output_html}")
 
-# Save the plot as an HTML file
-output_html = 'daily_traffic_rolling_avg.html'
-fig.write_html(output_html)
 
-print(f"Plot saved as {output_html}")
\ No newline at end of file
+if __name__ == '__main__':
+    render(run_metrics(METRICS, COLUMNS))
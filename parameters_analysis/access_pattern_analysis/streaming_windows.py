@@ -0,0 +1,219 @@
+import csv
+import math
+import numbers
+from collections import namedtuple
+
+import numpy as np
+import pandas as pd
+
+# One closed window for one key; variance is the population variance, as in the capture
+WindowResult = namedtuple('WindowResult', ['start', 'end', 'key', 'count', 'total', 'mean', 'variance'])
+
+
+def to_seconds(value):
+    """Durations ('1min', '1h', '1D', Timedelta, seconds) and timestamps to float seconds."""
+    if isinstance(value, numbers.Real):
+        return float(value)
+    if isinstance(value, (str, pd.Timedelta)):
+        try:
+            return pd.Timedelta(value).total_seconds()
+        except ValueError:
+            pass
+    return pd.Timestamp(value).timestamp()
+
+
+class RunningStats:
+    """Welford's online mean / variance, with weights and merging."""
+
+    def __init__(self):
+        self.count = 0
+        self.weight = 0.0
+        self.total = 0.0
+        self.mean = 0.0
+        self.m2 = 0.0
+
+    def update(self, value, weight=1):
+        self.count += 1
+        self.weight += weight
+        self.total += value * weight
+        delta = value - self.mean
+        self.mean += delta * weight / self.weight
+        self.m2 += weight * delta * (value - self.mean)
+
+    def merge(self, other):
+        if not other.weight:
+            return
+        weight = self.weight + other.weight
+        delta = other.mean - self.mean
+        self.mean += delta * other.weight / weight
+        self.m2 += other.m2 + delta * delta * self.weight * other.weight / weight
+        self.weight = weight
+        self.count += other.count
+        self.total += other.total
+
+    @property
+    def variance(self):
+        return self.m2 / self.weight if self.weight else 0.0
+
+
+class WindowedAggregator:
+    """
+    Event-time tumbling (slide == size) or sliding windows over a stream of
+    (timestamp, value, key) events, with running statistics per key.
+
+    The watermark trails the latest event time by allowed_lateness; a window
+    is closed and emitted to the sink once the watermark passes its end.
+    Events for already closed windows are counted in `late_events` and
+    dropped, so memory stays bounded by the open windows,
+    (size + allowed_lateness) / slide of them, times the active keys.
+    """
+
+    def __init__(self, size='1min', slide=None, allowed_lateness=0, sink=None):
+        self.size = to_seconds(size)
+        self.slide = to_seconds(slide) if slide is not None else self.size
+        if self.slide <= 0 or self.size <= 0:
+            raise ValueError("Window size and slide must be positive")
+        self.allowed_lateness = to_seconds(allowed_lateness)
+        self.sink = sink
+
+        # Window start -> key -> RunningStats
+        self.windows = {}
+        self.max_event_time = -math.inf
+        # Windows starting before this are closed
+        self.closed_before = -math.inf
+        self.late_events = 0
+
+    @property
+    def watermark(self):
+        return self.max_event_time - self.allowed_lateness
+
+    def window_starts(self, timestamp):
+        last = math.floor(timestamp / self.slide)
+        first = math.floor((timestamp - self.size) / self.slide + 1)
+        for index in range(first, last + 1):
+            yield index * self.slide
+
+    def add(self, timestamp, value=1, key=None, weight=1):
+        """Fold one event into every window it falls in; returns the windows closed by it."""
+        timestamp = to_seconds(timestamp)
+        assigned = False
+        for start in self.window_starts(timestamp):
+            if start < self.closed_before:
+                continue
+            stats = self.windows.setdefault(start, {})
+            if key not in stats:
+                stats[key] = RunningStats()
+            stats[key].update(value, weight)
+            assigned = True
+        if not assigned:
+            self.late_events += 1
+
+        if timestamp > self.max_event_time:
+            self.max_event_time = timestamp
+            return self.advance(self.watermark)
+        return []
+
+    def advance(self, watermark):
+        """Close every window that ends at or before watermark, in start order."""
+        closed = []
+        for start in sorted(self.windows):
+            if start + self.size > watermark:
+                break
+            closed.extend(self.close(start))
+        # Window starts are multiples of the slide
+        self.closed_before = max(self.closed_before,
+                                 math.floor((watermark - self.size) / self.slide + 1) * self.slide)
+        return closed
+
+    def close(self, start):
+        results = [WindowResult(pd.Timestamp(start, unit='s'), pd.Timestamp(start + self.size, unit='s'), key,
+                                stats.count, stats.total, stats.mean, stats.variance)
+                   for key, stats in self.windows.pop(start).items()]
+        if self.sink is not None:
+            for result in results:
+                self.sink(result)
+        return results
+
+    def flush(self):
+        """Close all remaining windows, e.g. at the end of a file or capture."""
+        closed = []
+        for start in sorted(self.windows):
+            closed.extend(self.close(start))
+        return closed
+
+
+class CsvSink:
+    """Append window results to a CSV file as they close."""
+
+    def __init__(self, path):
+        self.file = open(path, mode='a', newline='')
+        self.writer = csv.writer(self.file)
+        if self.file.tell() == 0:
+            self.writer.writerow(WindowResult._fields)
+
+    def __call__(self, result):
+        self.writer.writerow(result)
+        self.file.flush()
+
+    def close(self):
+        self.file.close()
+
+
+def capture_observer(aggregator, value_field='packet_size', key_field='source_ip'):
+    """
+    Row observer for the capture scripts (packet_analysis.py and
+    packet_analysis_Automation.row_observers): feeds every captured row into
+    the aggregator at its capture time.
+    """
+    def observe(row, timestamp):
+        aggregator.add(timestamp, float(row[value_field]), key=row[key_field] if key_field else None)
+    return observe
+
+
+def window_frame(results):
+    return pd.DataFrame(results, columns=WindowResult._fields)
+
+
+def aggregate_frame(df, time_column='temporal_patterns', value_column='total_packets', key_column=None,
+                    size='1D', slide=None, allowed_lateness=0):
+    """
+    Every window of a loaded DataFrame as a DataFrame (start, end, key,
+    count, total, mean, variance), the same windows the streaming operator
+    emits for the rows in event-time order.  In that order no event is late,
+    so each row is repeated once per window it falls in and the windows are
+    reduced with one groupby instead of a Python loop over rows.
+    """
+    size = to_seconds(size)
+    slide = to_seconds(slide) if slide is not None else size
+    if slide <= 0 or size <= 0:
+        raise ValueError("Window size and slide must be positive")
+
+    times = df[time_column]
+    if not pd.api.types.is_numeric_dtype(times):
+        times = pd.to_datetime(times)
+    if pd.api.types.is_datetime64_any_dtype(times):
+        times = (times - pd.Timestamp(0)).dt.total_seconds()
+    times = times.to_numpy(dtype=float)
+    timed = ~np.isnan(times)
+    times, values = times[timed], df[value_column].to_numpy(dtype=float)[timed]
+    keys = df[key_column].to_numpy()[timed] if key_column else np.full(len(times), None, dtype=object)
+    order = np.argsort(times, kind='stable')
+    times, values, keys = times[order], values[order], keys[order]
+
+    # Window indices [first, last] of each event, as in WindowedAggregator.window_starts
+    first = np.floor((times - size) / slide + 1).astype(np.int64)
+    spans = np.floor(times / slide).astype(np.int64) - first + 1
+    events = np.repeat(np.arange(len(times)), spans)
+    offsets = np.arange(len(events)) - np.repeat(np.cumsum(spans) - spans, spans)
+    windows = pd.DataFrame({'window': first[events] + offsets, 'key': keys[events], 'value': values[events]})
+
+    # Windows close in start order; keys within a window in order of their first event
+    windows = windows.sort_values('window', kind='stable')
+    groups = windows.groupby(['window', 'key'] if key_column else ['window'], sort=False, dropna=False)['value']
+    result = groups.agg(count='size', total='sum', mean='mean')
+    result['variance'] = groups.var(ddof=0)
+    result = result.reset_index()
+    starts = result['window'].to_numpy() * slide
+    return window_frame({'start': pd.to_datetime(starts, unit='s'), 'end': pd.to_datetime(starts + size, unit='s'),
+                         'key': result['key'] if key_column else None, 'count': result['count'],
+                         'total': result['total'], 'mean': result['mean'], 'variance': result['variance']})
@@ -0,0 +1,170 @@
+import time
+
+import pandas as pd
+
+from parameters_analysis.aggregation.loader import load_traffic
+from parameters_analysis.aggregation.registry import DECOMPOSABLE, DERIVED_COLUMNS, func_name
+
+
+class AggregationResults:
+    """
+    Everything the reports asked for: one DataFrame per metric name, plus the
+    enriched row-level frame for plots that need individual rows.
+    """
+
+    def __init__(self, frame, tables, passes, timings):
+        self.frame = frame
+        self.tables = tables
+        # Number of groupby scans over the rows (roll-ups are not counted)
+        self.passes = passes
+        self.timings = timings
+
+    def __getitem__(self, name):
+        return self.tables[name]
+
+    def __contains__(self, name):
+        return name in self.tables
+
+
+def _primitive_name(column, func):
+    return f"{column}__{func_name(func)}"
+
+
+def _pandas_func(func):
+    return list if func == 'list' else func
+
+
+def plan(metrics):
+    """
+    Group the metrics' primitive aggregations into as few row scans as
+    possible.  Metrics sharing the same keys share one scan; metrics whose
+    keys are a subset of a scanned key set, and whose aggregations are all
+    decomposable, are rolled up from that scan instead of reading the rows.
+
+    Returns (scans, rollups): scans maps key tuple -> primitives, rollups maps
+    key tuple -> (source key tuple, primitives).
+    """
+    wanted = {}
+    key_order = {}
+    for metric in metrics:
+        keyset = frozenset(metric.keys)
+        key_order.setdefault(keyset, metric.keys)
+        primitives = wanted.setdefault(keyset, {})
+        for column, func in metric.primitives():
+            primitives[_primitive_name(column, func)] = (column, func)
+
+    scans = {}
+    rollups = {}
+    # Finest groupings first so coarser ones can roll up from them
+    for keyset in sorted(wanted, key=len, reverse=True):
+        primitives = wanted[keyset]
+        decomposable = all(func_name(func) in DECOMPOSABLE for _, func in primitives.values())
+        sources = [scanned for scanned in scans if keyset < scanned]
+        if decomposable and sources:
+            source = min(sources, key=len)
+            scans[source].update(primitives)
+            rollups[keyset] = (source, primitives)
+        else:
+            scans[keyset] = dict(primitives)
+
+    return ({key_order[k]: v for k, v in scans.items()},
+            {key_order[k]: (key_order[s], p) for k, (s, p) in rollups.items()})
+
+
+def required_columns(metrics, columns=()):
+    """Base CSV columns needed by the metrics and row-level columns, derived ones expanded."""
+    needed = set(columns)
+    for metric in metrics:
+        needed |= metric.columns()
+
+    base = set()
+    pending = list(needed)
+    while pending:
+        column = pending.pop()
+        if column in DERIVED_COLUMNS:
+            pending.extend(DERIVED_COLUMNS[column][0])
+        else:
+            base.add(column)
+    return base, needed
+
+
+def enrich(df, columns):
+    """Add each requested derived column once, dependencies first."""
+    def add(column):
+        if column in df.columns or column not in DERIVED_COLUMNS:
+            return
+        requires, func = DERIVED_COLUMNS[column]
+        for dependency in requires:
+            add(dependency)
+        df[column] = func(df)
+
+    for column in sorted(columns):
+        add(column)
+    return df
+
+
+def _scan(df, keys, primitives):
+    spec = {name: (column, _pandas_func(func)) for name, (column, func) in primitives.items()}
+    if not keys:
+        # Global aggregates: one row, computed column by column
+        return pd.DataFrame({name: [df[column].agg(func) if func != 'size' else len(df)]
+                             for name, (column, func) in spec.items()})
+    return df.groupby(list(keys), sort=True, dropna=False, observed=True).agg(**spec)
+
+
+def _rollup(table, keys, primitives):
+    combine = {name: DECOMPOSABLE[func_name(func)] for name, (_, func) in primitives.items()}
+    if not keys:
+        return table[list(combine)].agg(combine).to_frame().T.reset_index(drop=True)
+    return table[list(combine)].groupby(level=list(keys), sort=True, dropna=False).agg(combine)
+
+
+def _assemble(metric, table):
+    result = pd.DataFrame(index=table.index)
+    for output, (column, func) in metric.aggregations.items():
+        if func == 'mean':
+            result[output] = table[_primitive_name(column, 'sum')] / table[_primitive_name(column, 'count')]
+        else:
+            result[output] = table[_primitive_name(column, func)]
+    if metric.keys:
+        result = result.reset_index()
+        return result[list(metric.keys) + list(metric.aggregations)]
+    return result
+
+
+def compute_metrics(df, metrics):
+    """Compute every metric over df using the planned scans and roll-ups."""
+    scans, rollups = plan(metrics)
+
+    tables = {}
+    for keys, primitives in scans.items():
+        tables[frozenset(keys)] = _scan(df, keys, primitives)
+    for keys, (source, primitives) in rollups.items():
+        tables[frozenset(keys)] = _rollup(tables[frozenset(source)], keys, primitives)
+
+    results = {metric.name: _assemble(metric, tables[frozenset(metric.keys)]) for metric in metrics}
+    return results, len(scans)
+
+
+def run_metrics(metrics, columns=(), csv_path=None, df=None):
+    """
+    Load (only the needed columns), enrich and aggregate in one go.  Pass df
+    to reuse an already loaded frame.
+    """
+    timings = {}
+    base, needed = required_columns(metrics, columns)
+
+    start = time.perf_counter()
+    if df is None:
+        df = load_traffic(csv_path, columns=base)
+    timings['load'] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    df = enrich(df, needed)
+    timings['enrich'] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    tables, passes = compute_metrics(df, metrics)
+    timings['aggregate'] = time.perf_counter() - start
+
+    return AggregationResults(df, tables, passes, timings)
@@ -0,0 +1,15 @@
+import os
+
+import matplotlib.pyplot as plt
+
+
+def finish_figure(name, output_dir='.', show=True):
+    """
+    Save the current matplotlib figure as <output_dir>/<name>.png, then show
+    it, or close it when running unattended.
+    """
+    plt.savefig(os.path.join(output_dir, f"{name}.png"), bbox_inches='tight')
+    if show:
+        plt.show()
+    else:
+        plt.close()
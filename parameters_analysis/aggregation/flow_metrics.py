@@ -0,0 +1,129 @@
+import numpy as np
+import pandas as pd
+
+from parameters_analysis.aggregation.loader import TIMESTAMP_COLUMN
+from parameters_analysis.session_flow_analysis.sessionize import IDLE_GAP, close_boundaries
+
+# Flow-level columns written by the capture and rebuilt here from the per-packet columns
+FLOW_METRIC_COLUMNS = ['inter_arrival_time', 'flow_duration', 'total_packets', 'total_bytes', 'session_duration',
+                       'session_count', 'mean_packet_size', 'variance_packet_size', 'entropy', 'usage_frequency']
+
+# Epoch seconds of each packet; older captures only have the whole-second timestamp
+CAPTURE_TIME_COLUMN = 'capture_time'
+
+
+def flow_codes(df, bidirectional=False):
+    """Integer flow key per row: the 5-tuple, or its canonical (both directions) form."""
+    ips, hosts = pd.factorize(pd.concat([df['source_ip'], df['destination_ip']], ignore_index=True))
+    source, destination = ips[:len(df)].astype(np.int64), ips[len(df):].astype(np.int64)
+    source_port = df['source_port'].to_numpy(dtype=np.int64)
+    destination_port = df['destination_port'].to_numpy(dtype=np.int64)
+    if bidirectional:
+        swapped = (source > destination) | ((source == destination) & (source_port > destination_port))
+        source, destination = np.where(swapped, destination, source), np.where(swapped, source, destination)
+        source_port, destination_port = (np.where(swapped, destination_port, source_port),
+                                          np.where(swapped, source_port, destination_port))
+    hosts = pd.factorize(source * len(hosts) + destination)[0].astype(np.int64)
+    protocol = pd.factorize(df['protocol'])[0]
+    # Dense host pair numbers leave room to pack both 16-bit ports and the protocol into one int64
+    return ((hosts * 65536 + source_port) * 65536 + destination_port) * 16 + protocol
+
+
+def packet_times(df):
+    """
+    Packet times in epoch seconds.  Captures without capture_time only
+    record whole seconds; there each recorded flow is anchored at its first
+    packet's timestamp and its packets placed by the recorded flow_duration,
+    which keeps the exact spacing within a flow.
+    """
+    if CAPTURE_TIME_COLUMN in df.columns:
+        return df[CAPTURE_TIME_COLUMN].to_numpy(dtype=float)
+    seconds = df[TIMESTAMP_COLUMN].to_numpy(dtype='datetime64[ns]').astype(np.int64) / 1e9
+    if 'flow_duration' not in df.columns:
+        return seconds
+    # Flows as the capture keyed them: source / destination address and port
+    recorded = flow_codes(df.assign(protocol=''))
+    anchor = pd.Series(seconds).groupby(recorded).transform('first').to_numpy()
+    return anchor + df['flow_duration'].to_numpy(dtype=float)
+
+
+def _group_starts(boundary):
+    """Index of the first row of each row's group, for rows sorted by group."""
+    return np.maximum.accumulate(np.where(boundary, np.arange(len(boundary)), 0))
+
+
+def _cumulative(values, starts):
+    """Running sum of values within each group (rows sorted by group)."""
+    total = np.cumsum(values)
+    return total - total[starts] + values[starts]
+
+
+def recompute_flow_metrics(df, bidirectional=False, flow_timeout=None, idle_gap=IDLE_GAP):
+    """
+    Rebuild the capture's flow-level columns from the per-packet columns in
+    one pass of grouped cumulative operations, with the capture's running
+    semantics (each row holds its flow's values up to and including that
+    packet):
+
+    - bidirectional: count both directions of a connection as one flow
+    - flow_timeout: seconds of silence after which a 5-tuple starts a new
+      flow (the capture never expires flows)
+    - idle_gap: session split as in the capture, also on FIN / RST when the
+      rows carry tcp_flags
+
+    Returns a copy of df with the columns in FLOW_METRIC_COLUMNS replaced.
+    """
+    times = packet_times(df)
+    codes = flow_codes(df, bidirectional)
+    order = np.lexsort((times, codes))
+    codes, times = codes[order], times[order]
+    sizes = df['packet_size'].to_numpy(dtype=np.int64)[order]
+
+    key_start = np.r_[True, codes[1:] != codes[:-1]]
+    gap = np.diff(times, prepend=times[:1])
+    flow_boundary = key_start.copy()
+    if flow_timeout is not None:
+        flow_boundary |= gap > flow_timeout
+    flow_start = _group_starts(flow_boundary)
+    flow_ids = np.cumsum(flow_boundary)
+
+    packets = np.arange(len(codes)) - flow_start + 1
+    total_bytes = _cumulative(sizes, flow_start)
+    squares = _cumulative(sizes * sizes, flow_start)
+    mean = total_bytes / packets
+    variance = np.maximum(squares / packets - mean ** 2, 0)
+
+    # Running entropy of packet sizes: H = log2(n) - sum(c * log2 c) / n over
+    # the size counts c, where the k-th packet of a size adds
+    # k*log2(k) - (k-1)*log2(k-1) to the sum
+    occurrence = pd.Series(sizes).groupby([flow_ids, sizes], sort=False).cumcount().to_numpy() + 1
+    increment = occurrence * np.log2(occurrence) - (occurrence - 1) * np.log2(np.maximum(occurrence - 1, 1))
+    entropy = np.log2(packets) - _cumulative(increment, flow_start) / packets
+
+    session_boundary = flow_boundary | (gap > idle_gap)
+    if 'tcp_flags' in df.columns:
+        flags = df['tcp_flags'].fillna(0).to_numpy(dtype=np.int64)[order]
+        session_boundary |= close_boundaries(flags, flow_ids, flow_boundary)
+    session_start = _group_starts(session_boundary)
+    session_duration = times - times[session_start]
+
+    metrics = {
+        'inter_arrival_time': np.where(flow_boundary, 0.0, gap),
+        'flow_duration': times - times[flow_start],
+        'total_packets': packets,
+        'total_bytes': total_bytes,
+        'session_duration': session_duration,
+        'session_count': np.arange(len(codes)) - session_start + 1,
+        'mean_packet_size': mean,
+        'variance_packet_size': variance,
+        'entropy': np.abs(entropy),
+        'usage_frequency': np.divide(packets, session_duration, out=np.zeros(len(codes)),
+                                     where=session_duration > 0),
+    }
+
+    result = df.copy()
+    for column, values in metrics.items():
+        unsorted = np.empty_like(values)
+        unsorted[order] = values
+        result[column] = unsorted
+    return result
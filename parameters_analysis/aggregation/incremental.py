@@ -0,0 +1,108 @@
+import pandas as pd
+
+from parameters_analysis.aggregation.engine import _assemble, _rollup, _scan, compute_metrics, plan
+from parameters_analysis.aggregation.registry import DECOMPOSABLE, func_name
+
+# Bumped when the layout of AggregateState changes, so older checkpoints are rebuilt
+STATE_VERSION = 2
+# Most recent rows kept for the row-level plots and metrics that cannot be kept as running state
+RECENT_ROWS = 100000
+# Most recent items kept per group of a running 'list' aggregate
+MAX_LIST_ITEMS = 1000
+
+
+def _concat_lists(lists):
+    return [item for values in lists for item in values][-MAX_LIST_ITEMS:]
+
+
+# Aggregations that do not roll up, but whose running results can still be
+# combined batch by batch, mapped to the function combining them
+RUNNING = {'list': _concat_lists}
+
+
+def is_mergeable(metric):
+    """Whether partial results of the metric over separate batches can be combined."""
+    return all(func_name(func) in DECOMPOSABLE for _, func in metric.primitives())
+
+
+def is_running(metric):
+    """Whether the metric can be kept as running state, with some aggregations bounded (e.g. 'list')."""
+    functions = [func_name(func) for _, func in metric.aggregations.values()]
+    return bool(metric.keys) and all(func in DECOMPOSABLE or func in RUNNING for func in functions)
+
+
+def merge_tables(old, new, keys, primitives):
+    """Combine two partial scan tables over the same keys."""
+    combine = {name: DECOMPOSABLE[func_name(func)] for name, (_, func) in primitives.items()}
+    both = pd.concat([old, new])
+    if not keys:
+        return both.agg(combine).to_frame().T.reset_index(drop=True)
+    return both.groupby(level=list(keys), sort=True, dropna=False).agg(combine)
+
+
+class AggregateState:
+    """
+    Running partial aggregates, folded in one batch of rows at a time.
+    Mergeable metrics (sums, counts, min, max, and means as sum / count)
+    keep only the planned scan tables; roll-ups and the final metric tables
+    are derived from them on demand.  Metrics with 'list' aggregations keep
+    their own per-group table, each list bounded to its latest
+    MAX_LIST_ITEMS items.  Anything else, and the row-level plots, use the
+    latest RECENT_ROWS rows, so neither memory nor refresh cost grows with
+    the history.
+    """
+
+    def __init__(self, metrics, recent_rows=RECENT_ROWS):
+        self.metrics = list(metrics)
+        self.signature = [STATE_VERSION] + sorted(repr(metric.signature()) for metric in self.metrics)
+        self.mergeable = [metric for metric in self.metrics if is_mergeable(metric)]
+        self.running = [metric for metric in self.metrics if not is_mergeable(metric) and is_running(metric)]
+        self.scans, self.rollups = plan(self.mergeable)
+        self.tables = {}
+        self.running_tables = {}
+        self.recent_rows = recent_rows
+        self.recent = None
+        self.rows = 0
+
+    def fold(self, df):
+        """Add an enriched batch of rows to the running aggregates."""
+        for keys, primitives in self.scans.items():
+            partial = _scan(df, keys, primitives)
+            if keys in self.tables:
+                partial = merge_tables(self.tables[keys], partial, keys, primitives)
+            self.tables[keys] = partial
+
+        for metric in self.running:
+            partial = df.groupby(list(metric.keys), sort=True, dropna=False, observed=True).agg(**{
+                output: (column, list if func == 'list' else func)
+                for output, (column, func) in metric.aggregations.items()})
+            combine = {output: RUNNING.get(func_name(func)) or DECOMPOSABLE[func_name(func)]
+                       for output, (_, func) in metric.aggregations.items()}
+            if metric.name in self.running_tables:
+                partial = pd.concat([self.running_tables[metric.name], partial])
+            # Also applied to the first batch, which bounds its lists
+            self.running_tables[metric.name] = partial.groupby(level=list(metric.keys), sort=True,
+                                                               dropna=False).agg(combine)
+
+        recent = df if self.recent is None else pd.concat([self.recent, df], ignore_index=True)
+        self.recent = recent.iloc[-self.recent_rows:].reset_index(drop=True)
+        self.rows += len(df)
+
+    def results(self):
+        """Metric tables by name, and the number of row scans the recent-row metrics took."""
+        tables = {frozenset(keys): table for keys, table in self.tables.items()}
+        for keys, (source, primitives) in self.rollups.items():
+            tables[frozenset(keys)] = _rollup(tables[frozenset(source)], keys, primitives)
+
+        results = {metric.name: _assemble(metric, tables[frozenset(metric.keys)])
+                   for metric in self.mergeable if frozenset(metric.keys) in tables}
+        for metric in self.running:
+            if metric.name in self.running_tables:
+                table = self.running_tables[metric.name].reset_index()
+                results[metric.name] = table[list(metric.keys) + list(metric.aggregations)]
+        remaining = [metric for metric in self.metrics if metric.name not in results]
+        passes = 0
+        if remaining and self.recent is not None:
+            computed, passes = compute_metrics(self.recent, remaining)
+            results.update(computed)
+        return results, passes
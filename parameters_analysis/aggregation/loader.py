@@ -0,0 +1,89 @@
+import io
+import os
+import socket
+from functools import lru_cache
+
+import pandas as pd
+
+from parameters_analysis.geo_location_analysis.geo_index import GEO_COLUMNS, enrich_geo, geo_database_available
+
+# Default capture file at the repository root
+root_dir = os.path.dirname(os.path.dirname(os.path.dirname(__file__)))
+CSV_PATH = os.path.join(root_dir, 'network_traffic.csv')
+
+# Capture timestamps are written as '%Y-%m-%d %H:%M:%S' (UTC)
+TIMESTAMP_COLUMN = 'temporal_patterns'
+TIMESTAMP_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+# With a local IP-range database present, country / region / city are resolved from this column
+GEO_SOURCE_COLUMN = 'destination_ip'
+
+
+@lru_cache(maxsize=None)
+def get_domain(ip):
+    try:
+        domain = socket.gethostbyaddr(ip)[0]
+    except (socket.herror, socket.gaierror, OSError):
+        domain = "Unknown"
+    return domain
+
+
+def resolve_domains(ips):
+    """Reverse-resolve a column of IPs, one lookup per distinct address."""
+    domains = {ip: get_domain(ip) for ip in pd.unique(ips)}
+    return ips.map(domains)
+
+
+def load_traffic(csv_path=None, columns=None):
+    """
+    Read a capture CSV once.  With columns given, only those are parsed;
+    the timestamp column is converted to datetime if present, and geo
+    columns are re-resolved offline when a local IP-range database exists.
+    """
+    csv_path = csv_path or CSV_PATH
+    usecols = None
+    if columns is not None:
+        header = pd.read_csv(csv_path, nrows=0).columns
+        usecols = [column for column in header if column in _with_geo_source(columns)]
+
+    return _prepare(pd.read_csv(csv_path, usecols=usecols), columns)
+
+
+def read_traffic_rows(data, header, columns=None):
+    """
+    Parse raw CSV bytes without a header line (e.g. rows appended to a capture
+    file since the last read) using the column names from the file's header.
+    """
+    usecols = None
+    if columns is not None:
+        usecols = [column for column in header if column in _with_geo_source(columns)]
+
+    return _prepare(pd.read_csv(io.BytesIO(data), header=None, names=header, usecols=usecols), columns)
+
+
+def _wants_geo(columns):
+    return geo_database_available() and (columns is None or bool(set(columns) & set(GEO_COLUMNS)))
+
+
+def _with_geo_source(columns):
+    # Geo columns are re-resolved offline from the destination IP, as in the capture
+    columns = set(columns)
+    if _wants_geo(columns):
+        columns.add(GEO_SOURCE_COLUMN)
+    return columns
+
+
+def _prepare(df, columns):
+    if TIMESTAMP_COLUMN in df.columns:
+        df[TIMESTAMP_COLUMN] = parse_timestamps(df[TIMESTAMP_COLUMN])
+    if _wants_geo(columns) and GEO_SOURCE_COLUMN in df.columns:
+        df = enrich_geo(df, GEO_SOURCE_COLUMN)
+    return df
+
+
+def parse_timestamps(values):
+    # The fixed capture format parses much faster than format inference
+    try:
+        return pd.to_datetime(values, format=TIMESTAMP_FORMAT)
+    except ValueError:
+        return pd.to_datetime(values)
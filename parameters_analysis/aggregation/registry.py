@@ -0,0 +1,110 @@
+import pandas as pd
+
+# Aggregations whose results can be rolled up from a finer grouping, mapped
+# to the function that combines the partial results
+DECOMPOSABLE = {'sum': 'sum', 'size': 'sum', 'count': 'sum', 'min': 'min', 'max': 'max'}
+
+# Every metric declared by a report, by name
+METRICS = {}
+
+# Columns computed from other columns during enrichment, by name
+DERIVED_COLUMNS = {}
+
+
+class Metric:
+    """
+    A named aggregate that a report needs: the group keys plus output
+    columns given as (input column, aggregation), like pandas named
+    aggregation.  'mean' is planned as sum / count so that it can share
+    passes and roll-ups with other metrics.
+    """
+
+    def __init__(self, name, keys=(), **aggregations):
+        self.name = name
+        self.keys = tuple(keys)
+        self.aggregations = aggregations
+
+    def primitives(self):
+        """(column, func) pairs the engine has to compute for this metric."""
+        needed = []
+        for column, func in self.aggregations.values():
+            if func == 'mean':
+                needed.extend([(column, 'sum'), (column, 'count')])
+            else:
+                needed.append((column, func))
+        return needed
+
+    def columns(self):
+        return set(self.keys) | {column for column, _ in self.aggregations.values()}
+
+    def signature(self):
+        return self.keys, tuple(sorted((out, column, func_name(func))
+                                       for out, (column, func) in self.aggregations.items()))
+
+
+def func_name(func):
+    return func if isinstance(func, str) else getattr(func, '__name__', repr(func))
+
+
+def register_metric(name, keys=(), **aggregations):
+    """Declare a metric; the same name may only be declared with one definition."""
+    metric = Metric(name, keys, **aggregations)
+    existing = METRICS.get(name)
+    if existing is not None and existing.signature() != metric.signature():
+        raise ValueError(f"Metric '{name}' is already registered with a different definition")
+    METRICS[name] = metric
+    return metric
+
+
+def derived_column(name, requires=()):
+    """Register a function df -> Series computing column `name` from `requires`."""
+    def decorator(func):
+        DERIVED_COLUMNS[name] = (tuple(requires), func)
+        return func
+    return decorator
+
+
+@derived_column('header_size', requires=('packet_size', 'payload_size'))
+def _header_size(df):
+    return df['packet_size'] - df['payload_size']
+
+
+@derived_column('traffic_hour', requires=('temporal_patterns',))
+def _traffic_hour(df):
+    return df['temporal_patterns'].dt.floor('h')
+
+
+@derived_column('source_domain', requires=('source_ip',))
+def _source_domain(df):
+    from parameters_analysis.aggregation.loader import resolve_domains
+    return resolve_domains(df['source_ip'])
+
+
+@derived_column('destination_domain', requires=('destination_ip',))
+def _destination_domain(df):
+    from parameters_analysis.aggregation.loader import resolve_domains
+    return resolve_domains(df['destination_ip'])
+
+
+@derived_column('source_label', requires=('source_ip', 'source_domain'))
+def _source_label(df):
+    return _host_labels(df['source_ip'], df['source_domain'])
+
+
+@derived_column('destination_label', requires=('destination_ip', 'destination_domain'))
+def _destination_label(df):
+    return _host_labels(df['destination_ip'], df['destination_domain'])
+
+
+def _host_labels(ips, domains):
+    # "domain (ip)", formatted once per distinct host
+    pairs = pd.DataFrame({'ip': ips, 'domain': domains}).drop_duplicates('ip')
+    labels = dict(zip(pairs['ip'], pairs['domain'] + ' (' + pairs['ip'] + ')'))
+    return ips.map(labels)
+
+
+@derived_column('anomaly_score', requires=('source_ip', 'destination_ip', 'source_port', 'destination_port', 'protocol',
+                                           'packet_size', 'payload_size', 'inter_arrival_time', 'temporal_patterns'))
+def _anomaly_score(df):
+    from parameters_analysis.anomaly_analysis.baselines import score_frame
+    return score_frame(df)
@@ -0,0 +1,58 @@
+import importlib
+import sys
+import time
+
+from parameters_analysis.aggregation.engine import plan, run_metrics
+
+# Every report under parameters_analysis, in the order they are rendered
+REPORTS = [
+    'parameters_analysis.access_pattern_analysis.access_pattern_analysis',
+    'parameters_analysis.flow_frequency.flow_frequency',
+    'parameters_analysis.flow_frequency.flow_frequency_heatgraph',
+    'parameters_analysis.flow_frequency.ports_detection',
+    'parameters_analysis.geo_location_analysis.geo_location_analysis',
+    'parameters_analysis.mean_variance_analysis.mean_variance_analysis',
+    'parameters_analysis.packet_analysis.packet_size_analysis',
+    'parameters_analysis.protocol_analysis.protocol_analysis',
+    'parameters_analysis.session_flow_analysis.flow_direction',
+    'parameters_analysis.session_flow_analysis.session_flow',
+]
+
+
+def load_reports(reports=REPORTS):
+    return [importlib.import_module(report) for report in reports]
+
+
+def suite_requirements(modules):
+    """All metrics and row-level columns the given report modules declare."""
+    metrics = [metric for module in modules for metric in module.METRICS]
+    columns = set()
+    for module in modules:
+        columns |= set(module.COLUMNS)
+    return metrics, columns
+
+
+def run_suite(reports=REPORTS, csv_path=None, output_dir='.', show=False):
+    """
+    Load the CSV once, compute the union of every report's metrics in the
+    fewest passes, then hand the shared results to each report's plot code.
+    """
+    modules = load_reports(reports)
+    metrics, columns = suite_requirements(modules)
+    data = run_metrics(metrics, columns, csv_path)
+
+    scans, rollups = plan(metrics)
+    print(f"{len(metrics)} metrics computed in {data.passes} passes ({len(rollups)} rolled up)")
+    for stage, seconds in data.timings.items():
+        print(f"{stage}: {seconds:.2f} s")
+
+    for module in modules:
+        start = time.perf_counter()
+        module.render(data, output_dir=output_dir, show=show)
+        print(f"{module.__name__}: {time.perf_counter() - start:.2f} s")
+
+    return data
+
+
+if __name__ == '__main__':
+    run_suite(csv_path=sys.argv[1] if len(sys.argv) > 1 else None)
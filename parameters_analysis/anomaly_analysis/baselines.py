@@ -0,0 +1,237 @@
+import math
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+from pandas.api.indexers import BaseIndexer
+
+# Features scored against the baseline of their flow, and of their source host
+FLOW_FEATURES = ('packet_size', 'payload_size', 'inter_arrival_time')
+HOST_FEATURES = ('packet_size', 'payload_size')
+FLOW_KEYS = ['source_ip', 'destination_ip', 'source_port', 'destination_port', 'protocol']
+HOST_KEYS = ['source_ip']
+
+# Smallest spread a baseline may report, per feature, so constant-size
+# flows (e.g. pure ACKs) do not turn every small change into an anomaly.
+# Inter-arrival times are heavy tailed and scored as log10 of milliseconds
+MIN_SCALE = {'packet_size': 16.0, 'payload_size': 16.0, 'inter_arrival_time': 0.5}
+
+# EWMA smoothing factor; the baseline remembers roughly the last 2 / ALPHA packets
+ALPHA = 0.05
+# Observations a baseline needs before it scores anything
+WARMUP = 20
+# Scores at or above this are anomalous
+THRESHOLD = 4.0
+# Packets kept by the offline rolling median / MAD, the counterpart of the online sketches
+ROBUST_WINDOW = 200
+
+# MAD -> standard deviation of a normal distribution
+MAD_SCALE = 1.4826
+
+# Baselines kept in memory per level; least recently updated are dropped first
+MAX_FLOWS = 100000
+MAX_HOSTS = 10000
+
+
+class Ewma:
+    """Exponentially weighted mean and variance, updated in constant time."""
+
+    __slots__ = ('alpha', 'mean', 'variance')
+
+    def __init__(self, alpha=ALPHA):
+        self.alpha = alpha
+        self.mean = None
+        self.variance = 0.0
+
+    def update(self, value):
+        if self.mean is None:
+            self.mean = value
+            return
+        difference = value - self.mean
+        increment = self.alpha * difference
+        self.mean += increment
+        self.variance = (1 - self.alpha) * (self.variance + difference * increment)
+
+
+class FrugalMedian:
+    """
+    Median estimate in constant memory (a frugal streaming quantile): the
+    estimate moves toward each value by a step that doubles while values
+    keep landing on the same side and halves when they switch sides.
+    """
+
+    __slots__ = ('estimate', 'step', 'direction', 'min_step')
+
+    def __init__(self, min_step=1.0):
+        self.estimate = None
+        self.step = min_step
+        self.direction = 0
+        self.min_step = min_step
+
+    def update(self, value):
+        if self.estimate is None:
+            self.estimate = value
+            return
+        if value == self.estimate:
+            return
+        direction = 1 if value > self.estimate else -1
+        if direction == self.direction:
+            self.step *= 2
+        else:
+            self.step = max(self.step / 2, self.min_step)
+        self.estimate += direction * min(self.step, abs(value - self.estimate))
+        self.direction = direction
+
+
+class Baseline:
+    """EWMA mean / variance plus sketched median / MAD of one feature."""
+
+    __slots__ = ('count', 'ewma', 'median', 'mad', 'min_scale')
+
+    def __init__(self, min_scale, alpha=ALPHA):
+        self.count = 0
+        self.ewma = Ewma(alpha)
+        self.median = FrugalMedian(min_scale / 8)
+        self.mad = FrugalMedian(min_scale / 8)
+        self.min_scale = min_scale
+
+    def score(self, value):
+        """
+        Smaller of the EWMA z-score and the robust (median / MAD) z-score:
+        a value is only unusual if both baselines agree, which keeps
+        bimodal features (ACKs next to full segments) from scoring high on
+        the MAD alone.
+        """
+        ewma_scale = max(math.sqrt(self.ewma.variance), self.min_scale)
+        robust_scale = max(MAD_SCALE * self.mad.estimate, self.min_scale)
+        return min(abs(value - self.ewma.mean) / ewma_scale, abs(value - self.median.estimate) / robust_scale)
+
+    def update(self, value):
+        self.count += 1
+        self.ewma.update(value)
+        self.median.update(value)
+        self.mad.update(abs(value - self.median.estimate))
+
+
+class BaselineTable:
+    """Baselines of a set of features per key, bounded to `max_keys` keys."""
+
+    def __init__(self, features, max_keys, alpha=ALPHA):
+        self.features = features
+        self.max_keys = max_keys
+        self.alpha = alpha
+        self.baselines = OrderedDict()
+
+    def score_and_update(self, key, values, warmup):
+        baselines = self.baselines.get(key)
+        if baselines is None:
+            baselines = self.baselines[key] = [Baseline(MIN_SCALE[feature], self.alpha) for feature in self.features]
+            if len(self.baselines) > self.max_keys:
+                self.baselines.popitem(last=False)
+        else:
+            self.baselines.move_to_end(key)
+
+        score = 0.0
+        for baseline, feature in zip(baselines, self.features):
+            value = values[feature]
+            if feature == 'inter_arrival_time':
+                value = math.log10(value * 1000 + 1)
+            # Score against the baseline before the value joins it
+            if baseline.count >= warmup:
+                score = max(score, baseline.score(value))
+            baseline.update(value)
+        return score
+
+
+class AnomalyDetector:
+    """
+    Online per-flow and per-host baselines for the capture path.  Each
+    packet is scored against its flow's and its source host's baselines
+    (constant time, bounded memory) and then folded into them; the score is
+    the largest z-score over features and levels, 0 while warming up.
+    """
+
+    def __init__(self, alpha=ALPHA, warmup=WARMUP, max_flows=MAX_FLOWS, max_hosts=MAX_HOSTS):
+        self.warmup = warmup
+        self.flows = BaselineTable(FLOW_FEATURES, max_flows, alpha)
+        self.hosts = BaselineTable(HOST_FEATURES, max_hosts, alpha)
+
+    def score(self, flow_key, host, values):
+        """values: feature -> number for one packet."""
+        return max(self.flows.score_and_update(flow_key, values, self.warmup),
+                   self.hosts.score_and_update(host, values, self.warmup))
+
+
+def log_interval(seconds):
+    return np.log10(seconds * 1000 + 1)
+
+
+class GroupWindow(BaseIndexer):
+    """
+    Trailing windows of at most `window_size` rows that never reach back
+    past the start of the row's group; rows must be sorted by group.  The
+    bounds are computed with numpy, unlike pandas' per-group rolling.
+    """
+
+    def get_window_bounds(self, num_values=0, min_periods=None, center=None, closed=None, step=None):
+        end = np.arange(1, num_values + 1, dtype=np.int64)
+        start = np.maximum(end - self.window_size, self.group_starts)
+        return start, end
+
+
+def _previous(values, first):
+    """Statistic of the rows before each row, within its group (a row never scores against itself)."""
+    values = np.roll(values, 1)
+    values[first] = np.nan
+    return values
+
+
+def _level_scores(df, keys, features, alpha, warmup, window):
+    group_ids = df.groupby(keys, sort=False, observed=True).ngroup().to_numpy()
+    # Work with each group's rows contiguous, in capture order
+    order = np.argsort(group_ids, kind='stable')
+    sorted_ids = group_ids[order]
+    first = np.r_[True, sorted_ids[1:] != sorted_ids[:-1]]
+    group_starts = np.maximum.accumulate(np.where(first, np.arange(len(order)), 0))
+    position = np.arange(len(order)) - group_starts
+    indexer = GroupWindow(window_size=window, group_starts=group_starts)
+
+    scores = np.zeros(len(order))
+    for feature in features:
+        values = df[feature].to_numpy(dtype=float)[order]
+        if feature == 'inter_arrival_time':
+            values = log_interval(values)
+        ewm = pd.Series(values).groupby(sorted_ids, sort=False).ewm(alpha=alpha, adjust=False)
+        mean = _previous(ewm.mean().to_numpy(), first)
+        variance = _previous(ewm.var(bias=True).to_numpy(), first)
+        median = _previous(pd.Series(values).rolling(indexer, min_periods=1).median().to_numpy(), first)
+        deviation = np.abs(values - median)
+        mad = _previous(pd.Series(deviation).rolling(indexer, min_periods=1).median().to_numpy(), first)
+
+        ewma_scale = np.maximum(np.sqrt(variance), MIN_SCALE[feature])
+        robust_scale = np.maximum(MAD_SCALE * mad, MIN_SCALE[feature])
+        score = np.minimum(np.abs(values - mean) / ewma_scale, deviation / robust_scale)
+        scores = np.fmax(scores, np.nan_to_num(score))
+    scores[position < warmup] = 0
+
+    unsorted = np.empty(len(order))
+    unsorted[order] = scores
+    return unsorted
+
+
+def score_frame(df, alpha=ALPHA, warmup=WARMUP, window=ROBUST_WINDOW):
+    """
+    Offline counterpart of AnomalyDetector for historical captures: the same
+    per-flow and per-host scores computed with grouped EWMs and rolling
+    medians, in capture order.  The robust part uses exact windowed medians
+    where the capture uses sketches, so scores agree closely but not exactly.
+    """
+    if 'temporal_patterns' in df.columns:
+        order = np.argsort(df['temporal_patterns'].to_numpy(), kind='stable')
+    else:
+        order = np.arange(len(df))
+    ordered = df.iloc[order].reset_index(drop=True)
+    scores = np.empty(len(df))
+    scores[order] = np.fmax(_level_scores(ordered, FLOW_KEYS, FLOW_FEATURES, alpha, warmup, window),
+                            _level_scores(ordered, HOST_KEYS, HOST_FEATURES, alpha, warmup, window))
+    return pd.Series(scores, index=df.index)
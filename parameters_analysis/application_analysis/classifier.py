@@ -0,0 +1,294 @@
+import hashlib
+import hmac
+import struct
+from collections import OrderedDict
+
+# Packets per flow (both directions) inspected before settling on the port-based label
+MAX_INSPECTED_PACKETS = 6
+# Only the start of a payload is ever parsed
+MAX_PAYLOAD_BYTES = 2048
+# Flows remembered at once; the least recently seen are forgotten first
+MAX_FLOWS = 100000
+
+DNS_PORTS = {53, 5353, 5355}
+HTTP_METHODS = (b'GET ', b'POST ', b'HEAD ', b'PUT ', b'DELETE ', b'OPTIONS ', b'PATCH ', b'CONNECT ')
+
+# Fallback labels for flows whose payload did not identify the application
+WELL_KNOWN_PORTS = {
+    20: 'ftp-data', 21: 'ftp', 22: 'ssh', 23: 'telnet', 25: 'smtp', 53: 'dns', 67: 'dhcp', 68: 'dhcp',
+    80: 'http', 110: 'pop3', 123: 'ntp', 137: 'netbios', 138: 'netbios', 143: 'imap', 161: 'snmp', 443: 'https',
+    465: 'smtps', 587: 'smtp', 993: 'imaps', 995: 'pop3s', 1900: 'ssdp', 3389: 'rdp', 5353: 'mdns',
+    5355: 'llmnr', 8080: 'http',
+}
+
+# RFC 9001 initial salt for QUIC version 1
+QUIC_V1 = 0x00000001
+QUIC_V2 = 0x6b3343cf
+QUIC_V1_INITIAL_SALT = bytes.fromhex('38762cf7f55934b34d179ae6a4c80cadccbb7f0a')
+
+
+def parse_dns_qname(payload, tcp=False):
+    """First question name of a DNS message, or None."""
+    if tcp:
+        payload = payload[2:]
+    if len(payload) < 17 or struct.unpack('!H', payload[4:6])[0] == 0:
+        return None
+    labels = []
+    position = 12
+    while position < len(payload):
+        length = payload[position]
+        if length == 0:
+            return '.'.join(labels) if labels else None
+        # Compression pointers never appear in the first question
+        if length & 0xC0 or position + 1 + length > len(payload):
+            return None
+        labels.append(payload[position + 1:position + 1 + length].decode('ascii', 'replace'))
+        position += 1 + length
+    return None
+
+
+def parse_client_hello_sni(handshake):
+    """Server name from a TLS ClientHello handshake message (without record header), or None."""
+    if len(handshake) < 42 or handshake[0] != 0x01:
+        return None
+    # Handshake header (4), client version (2), random (32)
+    position = 38
+    try:
+        session_id_length = handshake[position]
+        position += 1 + session_id_length
+        cipher_suites_length = struct.unpack('!H', handshake[position:position + 2])[0]
+        position += 2 + cipher_suites_length
+        compression_length = handshake[position]
+        position += 1 + compression_length
+        extensions_end = position + 2 + struct.unpack('!H', handshake[position:position + 2])[0]
+        position += 2
+        while position + 4 <= min(extensions_end, len(handshake)):
+            extension_type, extension_length = struct.unpack('!HH', handshake[position:position + 4])
+            position += 4
+            if extension_type == 0x0000:
+                # server_name_list length (2), name type (1), name length (2)
+                name_length = struct.unpack('!H', handshake[position + 3:position + 5])[0]
+                name = handshake[position + 5:position + 5 + name_length]
+                return name.decode('ascii', 'replace') if len(name) == name_length else None
+            position += extension_length
+    except (IndexError, struct.error):
+        return None
+    return None
+
+
+def parse_tls_sni(payload):
+    """Server name from a TLS record carrying a ClientHello, or None."""
+    # Handshake record (0x16), TLS 1.x record version
+    if len(payload) < 47 or payload[0] != 0x16 or payload[1] != 0x03:
+        return None
+    return parse_client_hello_sni(payload[5:])
+
+
+def parse_http_host(payload):
+    """Host header of an HTTP/1.x request, or None."""
+    if not payload.startswith(HTTP_METHODS):
+        return None
+    headers = payload[:MAX_PAYLOAD_BYTES]
+    start = headers.lower().find(b'\r\nhost:')
+    if start < 0:
+        return None
+    end = headers.find(b'\r\n', start + 7)
+    host = headers[start + 7:end if end >= 0 else len(headers)].strip()
+    return host.decode('ascii', 'replace') or None
+
+
+def _read_varint(data, position):
+    first = data[position]
+    length = 1 << (first >> 6)
+    value = first & 0x3F
+    for byte in data[position + 1:position + length]:
+        value = (value << 8) | byte
+    if position + length > len(data):
+        raise IndexError
+    return value, position + length
+
+
+def _hkdf_expand_label(secret, label, length):
+    full_label = b'tls13 ' + label
+    info = struct.pack('!H', length) + bytes([len(full_label)]) + full_label + b'\x00'
+    output, block, counter = b'', b'', 1
+    while len(output) < length:
+        block = hmac.new(secret, block + info + bytes([counter]), hashlib.sha256).digest()
+        output += block
+        counter += 1
+    return output[:length]
+
+
+def _quic_client_initial(payload):
+    """
+    Decrypt a QUIC v1 client Initial packet and return the ClientHello
+    bytes from its CRYPTO frames (contiguous from offset 0), or None.
+    Requires the optional 'cryptography' package.
+    """
+    try:
+        from cryptography.hazmat.primitives.ciphers import Cipher, algorithms, modes
+        from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+    except ImportError:
+        return None
+
+    position = 5
+    dcid_length = payload[position]
+    dcid = payload[position + 1:position + 1 + dcid_length]
+    position += 1 + dcid_length
+    position += 1 + payload[position]                     # source connection id
+    token_length, position = _read_varint(payload, position)
+    position += token_length
+    length, position = _read_varint(payload, position)
+    packet_number_offset = position
+    if packet_number_offset + length > len(payload) or length < 20:
+        return None
+
+    initial_secret = hmac.new(QUIC_V1_INITIAL_SALT, dcid, hashlib.sha256).digest()
+    client_secret = _hkdf_expand_label(initial_secret, b'client in', 32)
+    key = _hkdf_expand_label(client_secret, b'quic key', 16)
+    iv = _hkdf_expand_label(client_secret, b'quic iv', 12)
+    header_key = _hkdf_expand_label(client_secret, b'quic hp', 16)
+
+    # Remove header protection
+    sample = payload[packet_number_offset + 4:packet_number_offset + 20]
+    encryptor = Cipher(algorithms.AES(header_key), modes.ECB()).encryptor()
+    mask = encryptor.update(sample) + encryptor.finalize()
+    first = payload[0] ^ (mask[0] & 0x0F)
+    packet_number_length = (first & 0x03) + 1
+    packet_number = bytes(byte ^ mask[1 + i] for i, byte in enumerate(
+        payload[packet_number_offset:packet_number_offset + packet_number_length]))
+    header = bytes([first]) + payload[1:packet_number_offset] + packet_number
+
+    nonce = bytes(a ^ b for a, b in zip(iv, packet_number.rjust(12, b'\x00')))
+    ciphertext = payload[packet_number_offset + packet_number_length:packet_number_offset + length]
+    try:
+        plaintext = AESGCM(key).decrypt(nonce, ciphertext, header)
+    except Exception:
+        return None
+
+    # Collect CRYPTO frames; skip padding, ping and ack frames
+    chunks = {}
+    position = 0
+    while position < len(plaintext):
+        frame_type = plaintext[position]
+        if frame_type == 0x00 or frame_type == 0x01:
+            position += 1
+        elif frame_type in (0x02, 0x03):
+            _, position = _read_varint(plaintext, position + 1)   # largest acknowledged
+            _, position = _read_varint(plaintext, position)       # ack delay
+            ranges, position = _read_varint(plaintext, position)
+            _, position = _read_varint(plaintext, position)       # first range
+            for _ in range(ranges * 2):
+                _, position = _read_varint(plaintext, position)
+            if frame_type == 0x03:
+                for _ in range(3):
+                    _, position = _read_varint(plaintext, position)
+        elif frame_type == 0x06:
+            offset, position = _read_varint(plaintext, position + 1)
+            data_length, position = _read_varint(plaintext, position)
+            chunks[offset] = plaintext[position:position + data_length]
+            position += data_length
+        else:
+            break
+
+    crypto = b''
+    while len(crypto) in chunks:
+        crypto += chunks[len(crypto)]
+    return crypto or None
+
+
+def parse_quic_initial(payload):
+    """
+    (is QUIC long-header Initial, server name or None).  The server name is
+    only recovered for version 1 and when 'cryptography' is installed.
+    """
+    # Long header with fixed bit set, packet type Initial
+    if len(payload) < 7 or payload[0] & 0xC0 != 0xC0:
+        return False, None
+    version = struct.unpack('!I', payload[1:5])[0]
+    if version == QUIC_V1 and payload[0] & 0x30 != 0x00:
+        return False, None
+    if version != QUIC_V1:
+        # QUIC v2 and IETF drafts are recognised, but not decrypted
+        return version == QUIC_V2 or version >> 8 == 0xff0000, None
+    try:
+        hello = _quic_client_initial(payload)
+    except (IndexError, struct.error):
+        return True, None
+    return True, parse_client_hello_sni(hello) if hello else None
+
+
+def classify_payload(protocol, source_port, destination_port, payload):
+    """Application label from the first bytes of one packet, or None if it says nothing."""
+    if not payload:
+        return None
+    payload = payload[:MAX_PAYLOAD_BYTES]
+
+    if source_port in DNS_PORTS or destination_port in DNS_PORTS:
+        name = parse_dns_qname(payload, tcp=protocol == 'TCP')
+        if name:
+            return f"dns:{name}"
+
+    if protocol == 'TCP':
+        name = parse_tls_sni(payload)
+        if name:
+            return f"tls:{name}"
+        name = parse_http_host(payload)
+        if name:
+            return f"http:{name}"
+    elif protocol == 'UDP':
+        is_quic, name = parse_quic_initial(payload)
+        if is_quic:
+            return f"quic:{name}" if name else 'quic'
+    return None
+
+
+def port_label(source_port, destination_port):
+    for port in sorted((source_port, destination_port)):
+        if port in WELL_KNOWN_PORTS:
+            return WELL_KNOWN_PORTS[port]
+    return 'Unknown'
+
+
+class ApplicationClassifier:
+    """
+    Labels flows from the payload of their first few packets (DNS query
+    name, TLS / QUIC ClientHello SNI, HTTP Host) and caches the label on the
+    bidirectional flow, so later packets cost one dict lookup.  Flows that
+    reveal nothing within MAX_INSPECTED_PACKETS fall back to a port-based
+    label.  `payload` is passed as a callable so the bytes are only
+    extracted for the packets that are actually inspected.
+    """
+
+    def __init__(self, max_inspected=MAX_INSPECTED_PACKETS, max_flows=MAX_FLOWS):
+        self.max_inspected = max_inspected
+        self.max_flows = max_flows
+        # Flow -> [label or None, packets inspected]
+        self.flows = OrderedDict()
+
+    @staticmethod
+    def flow_key(source_ip, destination_ip, source_port, destination_port, protocol):
+        a, b = (source_ip, source_port), (destination_ip, destination_port)
+        return (protocol,) + (a + b if a <= b else b + a)
+
+    def classify(self, source_ip, destination_ip, source_port, destination_port, protocol, payload):
+        key = self.flow_key(source_ip, destination_ip, source_port, destination_port, protocol)
+        state = self.flows.get(key)
+        if state is None:
+            state = self.flows[key] = [None, 0]
+            if len(self.flows) > self.max_flows:
+                self.flows.popitem(last=False)
+        else:
+            self.flows.move_to_end(key)
+            if state[0] is not None:
+                return state[0]
+
+        state[1] += 1
+        label = classify_payload(protocol, source_port, destination_port, payload())
+        if label is None and state[1] >= self.max_inspected:
+            label = port_label(source_port, destination_port)
+        if label is None:
+            # Still inspecting; report the port-based guess meanwhile
+            return port_label(source_port, destination_port)
+        state[0] = label
+        return label
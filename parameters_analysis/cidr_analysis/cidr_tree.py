@@ -0,0 +1,265 @@
+import hashlib
+import heapq
+import os
+import pickle
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+# Prefix trees are cached on disk next to the dataset, keyed by dataset hash.  Every
+# incremental refresh is a new dataset, so only the MAX_STORED_TREES most recently
+# used pickles are kept and superseded ones are deleted when a new one is written
+root_dir = os.path.dirname(os.path.dirname(os.path.dirname(__file__)))
+CIDR_CACHE_DIR = os.path.join(root_dir, '.cidr_cache')
+MAX_STORED_TREES = 8
+
+# In-process cache so every view in one run shares the same tree; the least
+# recently used trees are dropped beyond MAX_CACHED_TREES
+MAX_CACHED_TREES = 4
+_tree_cache = OrderedDict()
+
+
+def _cache_tree(key, tree):
+    _tree_cache[key] = tree
+    _tree_cache.move_to_end(key)
+    while len(_tree_cache) > MAX_CACHED_TREES:
+        _tree_cache.popitem(last=False)
+
+
+def _prune_stored_trees(cache_dir):
+    # Reads refresh a file's modification time, so the oldest ones are the least recently used
+    paths = [os.path.join(cache_dir, name) for name in os.listdir(cache_dir) if name.endswith('.pkl')]
+    paths.sort(key=os.path.getmtime)
+    for path in paths[:max(len(paths) - MAX_STORED_TREES, 0)]:
+        try:
+            os.remove(path)
+        except OSError:
+            # Removed by another process in the meantime
+            pass
+
+# Label of the top-level bucket for addresses that are not dotted IPv4
+NON_IPV4_LABEL = 'non-IPv4'
+
+# Label standing for top-level nodes that do not fit in the node budget
+OTHER_LABEL = 'Other'
+
+
+def ip_to_int(ips):
+    """Vectorized dotted-quad IPv4 -> integer; -1 for anything else (judged per value)."""
+    # Addresses repeat a lot, so only the distinct ones are parsed; missing values get position -1
+    positions, distinct = pd.factorize(pd.Series(ips, dtype=object))
+    distinct = pd.Series(distinct, dtype=object).astype(str)
+    ints = np.full(len(distinct) + 1, -1, dtype=np.int64)
+    dotted = distinct.str.fullmatch(r'\d{1,3}(?:\.\d{1,3}){3}').to_numpy(dtype=bool)
+    if dotted.any():
+        values = distinct[dotted].str.split('.', expand=True).to_numpy(dtype=np.int64)
+        packed = (values[:, 0] << 24) | (values[:, 1] << 16) | (values[:, 2] << 8) | values[:, 3]
+        ints[:-1][dotted] = np.where((values <= 255).all(axis=1), packed, -1)
+    return ints[positions]
+
+
+def int_to_ip(ints):
+    ints = np.asarray(ints, dtype=np.int64)
+    return [f"{i >> 24}.{(i >> 16) & 255}.{(i >> 8) & 255}.{i & 255}" for i in ints]
+
+
+class PrefixTree:
+    """
+    Hosts rolled up into nested prefix levels (/8 -> /16 -> /24 -> host by
+    default, or organisation -> /24 -> host with an ASN table).  Every node
+    keeps packet, byte and host counts, so any level of detail can be drawn
+    without touching the raw rows again.
+    """
+
+    def __init__(self, nodes, hosts, paths, level_names):
+        # nodes: one row per tree node (depth, label, parent, packets, bytes, hosts)
+        self.nodes = nodes
+        # hosts: host address -> row in paths
+        self.hosts = hosts
+        # paths[i, d]: node id of host i's ancestor at depth d
+        self.paths = paths
+        self.level_names = level_names
+
+    def level_counts(self, level):
+        """Packets, bytes and hosts per node of one level (by name or depth)."""
+        depth = self.level_names.index(level) if isinstance(level, str) else level
+        return self.nodes[self.nodes['depth'] == depth].set_index('label')[['packets', 'bytes', 'hosts']]
+
+    def level_of_detail(self, node_budget=50, metric='packets'):
+        """
+        Node ids of the most detailed cut with at most node_budget nodes.
+        Starts from the top level and greedily expands the heaviest node
+        whose children still fit in the budget.  If the top level alone is
+        over budget, its lightest nodes are left out (one slot is kept for
+        an OTHER_LABEL bucket).
+        """
+        depth = self.nodes['depth'].to_numpy()
+        weight = self.nodes[metric].to_numpy()
+        parent = self.nodes['parent'].to_numpy()
+        leaf_depth = len(self.level_names) - 1
+
+        # children[p] as slices of an argsort over the parent column
+        order = np.argsort(parent, kind='stable')
+        starts = np.searchsorted(parent[order], np.arange(len(parent)), side='left')
+        ends = np.searchsorted(parent[order], np.arange(len(parent)), side='right')
+
+        top = np.flatnonzero(depth == 0)
+        if len(top) > node_budget:
+            top = top[np.argsort(-weight[top], kind='stable')[:max(node_budget - 1, 0)]]
+            node_budget -= 1
+        frontier = set(top.tolist())
+        heap = [(-weight[n], n) for n in frontier if depth[n] < leaf_depth]
+        heapq.heapify(heap)
+
+        while heap:
+            _, node = heapq.heappop(heap)
+            children = order[starts[node]:ends[node]]
+            if len(frontier) - 1 + len(children) > node_budget:
+                continue
+            frontier.remove(node)
+            for child in children.tolist():
+                frontier.add(child)
+                if depth[child] < leaf_depth:
+                    heapq.heappush(heap, (-weight[child], child))
+
+        return np.array(sorted(frontier), dtype=np.int64)
+
+    def representatives(self, node_budget=50, metric='packets'):
+        """Host address -> label of the node that stands for it at this level of detail."""
+        frontier = self.level_of_detail(node_budget, metric)
+        in_frontier = np.isin(self.paths, frontier)
+        # The cut is an antichain, so each host path crosses it at most once
+        chosen = self.paths[np.arange(len(self.paths)), in_frontier.argmax(axis=1)]
+        labels = np.where(in_frontier.any(axis=1), self.nodes['label'].to_numpy()[chosen], OTHER_LABEL)
+        return pd.Series(labels, index=self.hosts)
+
+    def aggregate(self, ips, node_budget=50, metric='packets'):
+        """Replace each address in ips by its representative label."""
+        return pd.Series(ips).map(self.representatives(node_budget, metric))
+
+
+def _network_labels(ints, prefix):
+    # Format each distinct network once rather than once per host
+    valid = ints >= 0
+    network = np.where(valid, ints >> (32 - prefix) << (32 - prefix), 0)
+    uniques, inverse = np.unique(network, return_inverse=True)
+    labels = np.array([f"{ip}/{prefix}" for ip in int_to_ip(uniques)], dtype=object)[inverse]
+    return np.where(valid, labels, NON_IPV4_LABEL)
+
+
+def _cidr_levels(ints, host_labels):
+    # Each default level drops another 8 bits of the address
+    levels = []
+    for prefix in (8, 16, 24):
+        keys = np.where(ints >= 0, ints >> (32 - prefix), -1)
+        levels.append((f"/{prefix}", keys, _network_labels(ints, prefix)))
+    levels.append(('host', np.arange(len(ints)), host_labels))
+    return levels
+
+
+def _asn_levels(ints, host_labels, asn_table):
+    # asn_table: start, end (ints or dotted strings) and org columns, non-overlapping
+    table = asn_table.copy()
+    for column in ('start', 'end'):
+        if not pd.api.types.is_numeric_dtype(table[column]):
+            table[column] = ip_to_int(table[column])
+    table = table.sort_values('start')
+    starts = table['start'].to_numpy(dtype=np.int64)
+    ends = table['end'].to_numpy(dtype=np.int64)
+    orgs = table['org'].astype(str).to_numpy()
+
+    slot = np.searchsorted(starts, ints, side='right') - 1
+    found = (slot >= 0) & (ints >= 0) & (ints <= ends[np.clip(slot, 0, None)])
+    org_labels = np.where(found, orgs[np.clip(slot, 0, None)], 'Unknown')
+    org_keys = pd.factorize(org_labels)[0]
+
+    return [
+        ('org', org_keys, org_labels),
+        ('/24', np.where(ints >= 0, ints >> 8, -1), _network_labels(ints, 24)),
+        ('host', np.arange(len(ints)), host_labels),
+    ]
+
+
+def build_prefix_tree(df, columns=('source_ip', 'destination_ip'), size_column='packet_size', asn_table=None):
+    """
+    Build a PrefixTree over every address in the given columns.  Each row
+    counts one packet (and its size in bytes) for each endpoint.
+    """
+    endpoints = pd.concat([df[column] for column in columns], ignore_index=True)
+    sizes = np.tile(df[size_column].to_numpy(dtype=float), len(columns)) if size_column in df.columns \
+        else np.zeros(len(endpoints))
+
+    host_codes, hosts = pd.factorize(endpoints)
+    host_packets = np.bincount(host_codes, minlength=len(hosts)).astype(float)
+    host_bytes = np.bincount(host_codes, weights=sizes, minlength=len(hosts))
+    host_labels = np.asarray(hosts, dtype=object).astype(str)
+    ints = ip_to_int(host_labels)
+
+    if asn_table is None:
+        levels = _cidr_levels(ints, host_labels)
+    else:
+        levels = _asn_levels(ints, host_labels, asn_table)
+
+    frames = []
+    paths = np.empty((len(hosts), len(levels)), dtype=np.int64)
+    parent_ids = np.full(len(hosts), -1, dtype=np.int64)
+    offset = 0
+    for depth, (_, keys, labels) in enumerate(levels):
+        # A node is identified by its parent node and its key at this level
+        codes, _ = pd.MultiIndex.from_arrays([parent_ids, keys]).factorize()
+        # Codes are numbered in order of appearance, so this is each node's first host
+        _, first = np.unique(codes, return_index=True)
+        count = len(first)
+
+        frames.append(pd.DataFrame({
+            'depth': depth,
+            'label': np.asarray(labels, dtype=object)[first],
+            'parent': parent_ids[first],
+            'packets': np.bincount(codes, weights=host_packets, minlength=count),
+            'bytes': np.bincount(codes, weights=host_bytes, minlength=count),
+            'hosts': np.bincount(codes, minlength=count),
+        }))
+        parent_ids = codes + offset
+        paths[:, depth] = parent_ids
+        offset += count
+
+    nodes = pd.concat(frames, ignore_index=True)
+    return PrefixTree(nodes, pd.Index(hosts), paths, [name for name, _, _ in levels])
+
+
+def cached_prefix_tree(df, columns=('source_ip', 'destination_ip'), size_column='packet_size', asn_table=None,
+                       use_cache=True, cache_dir=CIDR_CACHE_DIR):
+    """build_prefix_tree, computed once per dataset and cached in memory and on disk."""
+    hashed = [df[column] for column in columns]
+    if size_column in df.columns:
+        hashed.append(df[size_column])
+    if asn_table is not None:
+        hashed.extend(asn_table[column] for column in asn_table.columns)
+    digest = hashlib.sha1()
+    for series in hashed:
+        digest.update(pd.util.hash_pandas_object(series, index=False).values.tobytes())
+    key = digest.hexdigest()
+
+    if use_cache and key in _tree_cache:
+        _tree_cache.move_to_end(key)
+        return _tree_cache[key]
+
+    cache_path = os.path.join(cache_dir, f"{key}.pkl")
+    if use_cache and os.path.exists(cache_path):
+        with open(cache_path, 'rb') as f:
+            tree = pickle.load(f)
+        os.utime(cache_path)
+        _cache_tree(key, tree)
+        return tree
+
+    tree = build_prefix_tree(df, columns, size_column, asn_table)
+    if use_cache:
+        os.makedirs(cache_dir, exist_ok=True)
+        # Written beside the target first, so readers never load a partial pickle
+        with open(cache_path + '.tmp', 'wb') as f:
+            pickle.dump(tree, f)
+        os.replace(cache_path + '.tmp', cache_path)
+        _prune_stored_trees(cache_dir)
+        _cache_tree(key, tree)
+    return tree
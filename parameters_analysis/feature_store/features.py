@@ -0,0 +1,313 @@
+import hashlib
+import json
+
+import numpy as np
+import pandas as pd
+
+from parameters_analysis.aggregation.flow_metrics import flow_codes, packet_times
+from parameters_analysis.aggregation.loader import TIMESTAMP_COLUMN
+from parameters_analysis.graph_analysis.graph_features import (build_host_graph, degrees, host_graph_features,
+                                                               join_host_features)
+
+DIRECTIONS = ['outbound', 'inbound', 'internal', 'external']
+# Destination port classes: well-known (< 1024), registered (< 49152), ephemeral
+PORT_CLASSES = ['well_known', 'registered', 'ephemeral']
+EPHEMERAL_PORT = 49152
+
+# Numeric key columns; every other key is a string.  Files without rows still
+# store keys of these types, so positions and times compare as numbers
+KEY_DTYPES = {'row': np.int64, 'source_port': np.int64, 'destination_port': np.int64, 'start': np.float64,
+              'window_start': np.float64}
+
+
+class FeatureSet:
+    """
+    A named feature computation: compute(df, **params) returns (keys,
+    features) DataFrames with one row per entity.  The hash covers the
+    name, version, parameters and output columns, so stored matrices are
+    recomputed whenever any of them changes; bump `version` when the
+    computation itself changes.
+    """
+
+    def __init__(self, name, compute, columns, features, keys, version=1, **params):
+        self.name = name
+        self.compute_function = compute
+        self.columns = columns
+        self.features = features
+        self.keys = keys
+        self.version = version
+        self.params = params
+
+    @property
+    def hash(self):
+        spec = [self.name, self.version, self.params, self.columns, self.features, self.keys,
+                [np.dtype(KEY_DTYPES.get(key, str)).kind for key in self.keys]]
+        return hashlib.sha1(json.dumps(spec, sort_keys=True).encode()).hexdigest()
+
+    def compute(self, df):
+        if df.empty:
+            keys = pd.DataFrame({key: np.array([], dtype=KEY_DTYPES.get(key, str)) for key in self.keys})
+            return keys, pd.DataFrame(columns=self.features, dtype=np.float64)
+        keys, features = self.compute_function(df, **self.params)
+        return keys[self.keys], features[self.features]
+
+
+def _starts(sorted_codes):
+    return np.flatnonzero(np.r_[True, sorted_codes[1:] != sorted_codes[:-1]])
+
+
+def _distinct(groups, values, n):
+    """Distinct values per group (groups are integers 0..n-1)."""
+    values = pd.factorize(values)[0].astype(np.int64)
+    pairs = np.unique(groups.astype(np.int64) * (values.max(initial=0) + 1) + values)
+    return np.bincount(pairs // (values.max(initial=0) + 1), minlength=n)
+
+
+def _entropy(groups, values, n):
+    """Shannon entropy (bits) of the values within each group."""
+    pairs, counts = np.unique(np.column_stack([groups, values]), axis=0, return_counts=True)
+    totals = np.bincount(pairs[:, 0], weights=counts, minlength=n)
+    share = counts / totals[pairs[:, 0]]
+    return np.bincount(pairs[:, 0], weights=-share * np.log2(share), minlength=n)
+
+
+def _fractions(groups, codes, labels, n, prefix):
+    """Share of each label per group, as one column per label."""
+    counts = np.zeros((n, len(labels)))
+    valid = codes >= 0
+    np.add.at(counts, (groups[valid], codes[valid]), 1)
+    totals = np.maximum(counts.sum(axis=1, keepdims=True), 1)
+    return {f'{prefix}{label}': counts[:, i] / totals[:, 0] for i, label in enumerate(labels)}
+
+
+def port_classes(ports):
+    ports = np.asarray(ports, dtype=np.int64)
+    return np.where(ports < 1024, 0, np.where(ports < EPHEMERAL_PORT, 1, 2))
+
+
+def _grouped_stats(starts, values, prefix):
+    """Mean / std / min / max of values over sorted groups starting at starts."""
+    counts = np.diff(np.r_[starts, len(values)])
+    total = np.add.reduceat(values, starts)
+    mean = total / counts
+    variance = np.maximum(np.add.reduceat(values * values, starts) / counts - mean ** 2, 0)
+    return {
+        f'{prefix}mean': mean,
+        f'{prefix}std': np.sqrt(variance),
+        f'{prefix}min': np.minimum.reduceat(values, starts),
+        f'{prefix}max': np.maximum.reduceat(values, starts),
+    }
+
+
+def _gap_stats(times, starts, first, prefix='gap_'):
+    """Mean / std / max of the gaps between consecutive packets of each group (0 for single packets)."""
+    gaps = np.where(first, 0.0, np.diff(times, prepend=times[:1]))
+    counts = np.maximum(np.diff(np.r_[starts, len(times)]) - 1, 1)
+    total = np.add.reduceat(gaps, starts)
+    mean = total / counts
+    variance = np.maximum(np.add.reduceat(gaps * gaps, starts) / counts - mean ** 2, 0)
+    return {f'{prefix}mean': mean, f'{prefix}std': np.sqrt(variance),
+            f'{prefix}max': np.maximum.reduceat(gaps, starts)}
+
+
+# Capture columns the packet features are built from
+PACKET_COLUMNS = ['source_ip', 'destination_ip', 'packet_size', 'total_packets', 'total_bytes', 'flow_duration',
+                  TIMESTAMP_COLUMN]
+PACKET_FEATURES = ['packet_size', 'total_packets', 'total_bytes', 'flow_duration',
+                   'src_out_degree', 'src_in_degree', 'src_distinct_peers', 'src_pagerank', 'src_max_fan_out']
+
+
+def packet_features(df):
+    """
+    The per-packet features of training_model.py: the capture's running
+    flow columns plus graph features of the sending host over the file.
+    Keyed by the row's position in the file.
+    """
+    rows = np.arange(len(df))
+    df = df.reset_index(drop=True).dropna(subset=[column for column in PACKET_COLUMNS if column in df.columns])
+
+    # Join per-host communication graph features for the sending host
+    df = join_host_features(df, host_graph_features(df), on='source_ip', prefix='src_')
+    return pd.DataFrame({'row': rows[df.index.to_numpy()]}), df
+
+
+FLOW_FEATURES = ['packets', 'bytes', 'size_mean', 'size_std', 'size_min', 'size_max', 'payload_mean', 'duration',
+                 'gap_mean', 'gap_std', 'gap_max', 'size_entropy'] + \
+                [f'direction_{direction}' for direction in DIRECTIONS] + \
+                [f'port_{name}' for name in PORT_CLASSES] + \
+                ['tcp', 'udp', 'src_out_degree', 'src_in_degree', 'dst_in_degree']
+FLOW_KEYS = ['source_ip', 'destination_ip', 'source_port', 'destination_port', 'protocol', 'start']
+
+
+def flow_features(df):
+    """One row per flow (the capture's 5-tuple), from its packets in the file."""
+    times = packet_times(df)
+    codes = flow_codes(df)
+    order = np.lexsort((times, codes))
+    codes, times = codes[order], times[order]
+    starts = _starts(codes)
+    n = len(starts)
+    groups = np.cumsum(np.r_[True, codes[1:] != codes[:-1]]) - 1
+    first = np.zeros(len(codes), dtype=bool)
+    first[starts] = True
+    rows = df.iloc[order].reset_index(drop=True)
+    sizes = rows['packet_size'].to_numpy(dtype=np.float64)
+
+    features = {'packets': np.diff(np.r_[starts, len(codes)]), 'bytes': np.add.reduceat(sizes, starts)}
+    features.update(_grouped_stats(starts, sizes, 'size_'))
+    features['payload_mean'] = np.add.reduceat(rows['payload_size'].to_numpy(dtype=np.float64), starts) / \
+        features['packets']
+    features['duration'] = np.maximum.reduceat(times, starts) - times[starts]
+    features.update(_gap_stats(times, starts, first))
+    features['size_entropy'] = _entropy(groups, sizes.astype(np.int64), n)
+    direction = pd.Categorical(rows['flow_direction'], categories=DIRECTIONS).codes.astype(np.int64)
+    features.update(_fractions(groups, direction, DIRECTIONS, n, 'direction_'))
+
+    heads = rows.iloc[starts].reset_index(drop=True)
+    port_class = port_classes(heads['destination_port'])
+    for i, name in enumerate(PORT_CLASSES):
+        features[f'port_{name}'] = (port_class == i).astype(np.float64)
+    features['tcp'] = (heads['protocol'] == 'TCP').to_numpy(dtype=np.float64)
+    features['udp'] = (heads['protocol'] == 'UDP').to_numpy(dtype=np.float64)
+
+    # Graph degree of both endpoints over the file
+    host_degrees = degrees(build_host_graph(df))
+    features['src_out_degree'] = host_degrees['out_degree'].reindex(heads['source_ip']).to_numpy(dtype=np.float64)
+    features['src_in_degree'] = host_degrees['in_degree'].reindex(heads['source_ip']).to_numpy(dtype=np.float64)
+    features['dst_in_degree'] = host_degrees['in_degree'].reindex(heads['destination_ip']).to_numpy(dtype=np.float64)
+
+    keys = heads[FLOW_KEYS[:-1]].copy()
+    keys['start'] = times[starts]
+    return keys, pd.DataFrame(features)
+
+
+HOST_WINDOW_FEATURES = ['packets', 'bytes', 'size_mean', 'size_std', 'size_min', 'size_max', 'active_span',
+                        'gap_mean', 'gap_std', 'gap_max', 'size_entropy', 'distinct_destinations',
+                        'distinct_ports', 'in_degree'] + \
+                       [f'direction_{direction}' for direction in DIRECTIONS] + \
+                       [f'port_{name}' for name in PORT_CLASSES] + ['tcp', 'udp']
+HOST_WINDOW_KEYS = ['host', 'window_start']
+
+
+def host_window_features(df, window=300):
+    """One row per sending host and window of `window` seconds."""
+    times = packet_times(df)
+    hosts, host_names = pd.factorize(df['source_ip'])
+    bins = np.floor(times / window).astype(np.int64)
+    bins -= bins.min(initial=0)
+    codes = hosts.astype(np.int64) * (bins.max(initial=0) + 1) + bins
+    order = np.lexsort((times, codes))
+    codes, times = codes[order], times[order]
+    starts = _starts(codes)
+    n = len(starts)
+    groups = np.cumsum(np.r_[True, codes[1:] != codes[:-1]]) - 1
+    first = np.zeros(len(codes), dtype=bool)
+    first[starts] = True
+    rows = df.iloc[order].reset_index(drop=True)
+    sizes = rows['packet_size'].to_numpy(dtype=np.float64)
+
+    features = {'packets': np.diff(np.r_[starts, len(codes)]), 'bytes': np.add.reduceat(sizes, starts)}
+    features.update(_grouped_stats(starts, sizes, 'size_'))
+    features['active_span'] = np.maximum.reduceat(times, starts) - times[starts]
+    features.update(_gap_stats(times, starts, first))
+    features['size_entropy'] = _entropy(groups, sizes.astype(np.int64), n)
+    features['distinct_destinations'] = _distinct(groups, rows['destination_ip'], n)
+    features['distinct_ports'] = _distinct(groups, rows['destination_port'], n)
+
+    # In-degree: distinct hosts sending to this host within the same window
+    window_keys = pd.Series(np.arange(n), index=codes[starts])
+    destination_hosts = pd.Index(host_names).get_indexer(rows['destination_ip'])
+    receiving = window_keys.reindex(destination_hosts.astype(np.int64) * (bins.max(initial=0) + 1)
+                                    + bins[order]).to_numpy()
+    known = ~np.isnan(receiving)
+    features['in_degree'] = _distinct(receiving[known].astype(np.int64), rows['source_ip'][known], n) \
+        if known.any() else np.zeros(n)
+
+    direction = pd.Categorical(rows['flow_direction'], categories=DIRECTIONS).codes.astype(np.int64)
+    features.update(_fractions(groups, direction, DIRECTIONS, n, 'direction_'))
+    features.update(_fractions(groups, port_classes(rows['destination_port']), PORT_CLASSES, n, 'port_'))
+    protocols = pd.Categorical(rows['protocol'], categories=['TCP', 'UDP']).codes.astype(np.int64)
+    features.update({name.lower(): values for name, values in
+                     _fractions(groups, protocols, ['TCP', 'UDP'], n, '').items()})
+
+    keys = pd.DataFrame({'host': np.asarray(host_names)[hosts[order][starts]],
+                         'window_start': np.floor(times[starts] / window) * window})
+    return keys, pd.DataFrame(features)
+
+
+# Service ports whose share of a window's packets is part of a user fingerprint
+SERVICE_PORTS = [53, 80, 443, 5353]
+USER_WINDOW_FEATURES = ['packets', 'bytes', 'size_mean', 'size_std', 'size_min', 'size_max', 'payload_mean',
+                        'gap_mean', 'gap_std', 'gap_max', 'size_entropy', 'distinct_sources',
+                        'distinct_destinations', 'distinct_ports', 'flows', 'top_destination_share'] + \
+                       [f'port_{name}' for name in PORT_CLASSES] + \
+                       [f'service_{port}' for port in SERVICE_PORTS] + ['tcp', 'udp']
+USER_WINDOW_KEYS = ['window_start']
+
+
+def user_window_features(df, window=30):
+    """
+    One row per window of `window` seconds over all packets of a capture:
+    the capturing user's behaviour (volume, sizes, pacing, how many peers
+    and which services).  Only columns the live packet buffer also holds
+    are used, so live windows are described the same way.
+    """
+    times = packet_times(df)
+    bins = np.floor(times / window).astype(np.int64)
+    order = np.lexsort((times, bins))
+    bins, times = bins[order], times[order]
+    starts = _starts(bins)
+    n = len(starts)
+    groups = np.cumsum(np.r_[True, bins[1:] != bins[:-1]]) - 1
+    first = np.zeros(len(bins), dtype=bool)
+    first[starts] = True
+    rows = df.iloc[order].reset_index(drop=True)
+    sizes = rows['packet_size'].to_numpy(dtype=np.float64)
+
+    features = {'packets': np.diff(np.r_[starts, len(bins)]), 'bytes': np.add.reduceat(sizes, starts)}
+    features.update(_grouped_stats(starts, sizes, 'size_'))
+    features['payload_mean'] = np.add.reduceat(rows['payload_size'].to_numpy(dtype=np.float64), starts) / \
+        features['packets']
+    features.update(_gap_stats(times, starts, first))
+    features['size_entropy'] = _entropy(groups, sizes.astype(np.int64), n)
+    features['distinct_sources'] = _distinct(groups, rows['source_ip'], n)
+    features['distinct_destinations'] = _distinct(groups, rows['destination_ip'], n)
+    features['distinct_ports'] = _distinct(groups, rows['destination_port'], n)
+    features['flows'] = _distinct(groups, flow_codes(rows), n)
+
+    # Share of the window's packets going to its busiest destination
+    destinations = pd.factorize(rows['destination_ip'])[0].astype(np.int64)
+    pairs, counts = np.unique(np.column_stack([groups, destinations]), axis=0, return_counts=True)
+    top = np.zeros(n)
+    np.maximum.at(top, pairs[:, 0], counts)
+    features['top_destination_share'] = top / features['packets']
+
+    # The service side of a connection is the lower of its two ports
+    service = np.minimum(rows['source_port'].to_numpy(dtype=np.int64),
+                         rows['destination_port'].to_numpy(dtype=np.int64))
+    features.update(_fractions(groups, port_classes(service), PORT_CLASSES, n, 'port_'))
+    service_codes = pd.Categorical(service, categories=SERVICE_PORTS).codes.astype(np.int64)
+    features.update(_fractions(groups, service_codes, SERVICE_PORTS, n, 'service_'))
+    protocols = pd.Categorical(rows['protocol'], categories=['TCP', 'UDP']).codes.astype(np.int64)
+    features.update({name.lower(): values for name, values in
+                     _fractions(groups, protocols, ['TCP', 'UDP'], n, '').items()})
+
+    keys = pd.DataFrame({'window_start': bins[starts] * float(window)})
+    return keys, pd.DataFrame(features)
+
+
+FEATURE_SETS = {
+    'packet': FeatureSet('packet', packet_features, PACKET_COLUMNS, PACKET_FEATURES, ['row']),
+    'flow': FeatureSet('flow', flow_features,
+                       ['source_ip', 'destination_ip', 'source_port', 'destination_port', 'protocol', 'packet_size',
+                        'payload_size', 'flow_direction', 'flow_duration', 'capture_time', TIMESTAMP_COLUMN],
+                       FLOW_FEATURES, FLOW_KEYS),
+    'host_window': FeatureSet('host_window', host_window_features,
+                              ['source_ip', 'destination_ip', 'source_port', 'destination_port', 'protocol',
+                               'packet_size', 'flow_direction', 'flow_duration', 'capture_time', TIMESTAMP_COLUMN],
+                              HOST_WINDOW_FEATURES, HOST_WINDOW_KEYS, window=300),
+    'user_window': FeatureSet('user_window', user_window_features,
+                              ['source_ip', 'destination_ip', 'source_port', 'destination_port', 'protocol',
+                               'packet_size', 'payload_size', 'flow_duration', 'capture_time', TIMESTAMP_COLUMN],
+                              USER_WINDOW_FEATURES, USER_WINDOW_KEYS, window=30),
+}
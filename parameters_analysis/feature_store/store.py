@@ -0,0 +1,224 @@
+import hashlib
+import json
+import os
+import shutil
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:
+    # Windows: concurrent updates of the digest cache are merged without a lock (best effort)
+    fcntl = None
+
+import numpy as np
+import pandas as pd
+
+from parameters_analysis.aggregation.loader import load_traffic, read_traffic_rows, root_dir
+from parameters_analysis.feature_store.features import FEATURE_SETS
+from parameters_analysis.query_service.store import file_digest
+
+# <store>/<feature set>/<feature set hash>/<source digest>/{manifest.json, features.npy, key_<name>.npy}
+FEATURE_STORE_DIR = os.path.join(root_dir, '.feature_store')
+MANIFEST = 'manifest.json'
+
+
+def read_rows(path, offset=0):
+    """
+    Header line and the complete rows of a capture from byte `offset` on
+    (offsets inside the header start at the first row), and the offset
+    after the last complete row: the capture may be writing one.
+    """
+    with open(path, 'rb') as f:
+        header = f.readline()
+        offset = max(offset, len(header))
+        f.seek(offset)
+        data = f.read()
+    data = data[:data.rfind(b'\n') + 1]
+    return header, data, offset + len(data)
+
+
+def rows_digest(header, data):
+    return hashlib.sha1(header + data).hexdigest()
+
+
+class FeatureTable:
+    """
+    Stored features of one source file: `matrix` is a read-only memory map
+    of shape (rows, features) in column-major order, so matrix[:, j] (or
+    column(name)) is a contiguous view of one feature; `keys` holds one
+    mapped array per key column.  Nothing is read until it is touched.
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+        with open(os.path.join(directory, MANIFEST)) as f:
+            self.manifest = json.load(f)
+        self.columns = self.manifest['features']
+        self.matrix = np.load(os.path.join(directory, 'features.npy'), mmap_mode='r')
+        self.keys = {name: np.load(os.path.join(directory, f'key_{name}.npy'), mmap_mode='r')
+                     for name in self.manifest['keys']}
+
+    def __len__(self):
+        return self.matrix.shape[0]
+
+    def column(self, name):
+        return self.matrix[:, self.columns.index(name)]
+
+    def frame(self):
+        """Keys and features as a DataFrame (a copy)."""
+        df = pd.DataFrame({name: np.asarray(values) for name, values in self.keys.items()})
+        return pd.concat([df, pd.DataFrame(np.asarray(self.matrix), columns=self.columns)], axis=1)
+
+
+class FeatureStore:
+    """
+    Feature matrices materialized once per (feature set, source file) and
+    reused until either changes.  Entries are keyed by the feature set's
+    hash and the file's content digest; digests are cached by size and
+    modification time, so looking up an unchanged file does not read it.
+    A dataset version (the hash of its entries) identifies exactly the
+    features a model was trained on.
+    """
+
+    def __init__(self, root=FEATURE_STORE_DIR):
+        self.root = root
+        self.digests_path = os.path.join(root, 'digests.json')
+        self.digests = self._read_digests()
+
+    def _read_digests(self):
+        try:
+            with open(self.digests_path) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def digest(self, path):
+        source = os.path.abspath(path)
+        stat = os.stat(source)
+        cached = self.digests.get(source)
+        if cached and cached['size'] == stat.st_size and cached['mtime'] == stat.st_mtime:
+            return cached['digest']
+        digest = file_digest(source)
+        self.digests[source] = {'size': stat.st_size, 'mtime': stat.st_mtime, 'digest': digest}
+        # Several training workers update the cache at once: merge what the others wrote since this
+        # store was opened.  A digest lost anyway is only recomputed; prune() does not rely on the cache.
+        with self._locked():
+            merged = self._read_digests()
+            merged.update({path: entry for path, entry in self.digests.items() if path not in merged})
+            merged[source] = self.digests[source]
+            self.digests = merged
+            temporary = f'{self.digests_path}.{os.getpid()}.tmp'
+            with open(temporary, 'w') as f:
+                json.dump(self.digests, f)
+            os.replace(temporary, self.digests_path)
+        return digest
+
+    @contextmanager
+    def _locked(self):
+        os.makedirs(self.root, exist_ok=True)
+        with open(self.digests_path + '.lock', 'w') as lock:
+            if fcntl is not None:
+                fcntl.flock(lock, fcntl.LOCK_EX)
+            yield
+
+    def entry_dir(self, feature_set, path):
+        feature_set = FEATURE_SETS[feature_set]
+        return os.path.join(self.root, feature_set.name, feature_set.hash[:16], self.digest(path)[:16])
+
+    def materialize(self, feature_set, path):
+        """Compute and write the features of one file unless they are stored already; returns the entry."""
+        directory = self.entry_dir(feature_set, path)
+        if os.path.exists(os.path.join(directory, MANIFEST)):
+            return directory
+        features = FEATURE_SETS[feature_set]
+        header = pd.read_csv(path, nrows=0).columns
+        df = load_traffic(path, columns=[column for column in features.columns if column in header])
+        self._write(directory, features, df, {'source': os.path.abspath(path), 'digest': self.digest(path)})
+        return directory
+
+    def materialize_rows(self, feature_set, path, offset=0):
+        """
+        Features of the complete rows of a file from byte `offset` on (e.g.
+        rows appended since the last read), stored as an entry of their own
+        keyed by the content of those rows.  Only those rows are read and
+        featurized; the manifest's 'end' is the offset to continue from.
+        """
+        features = FEATURE_SETS[feature_set]
+        header, data, end = read_rows(path, offset)
+        digest = rows_digest(header, data)
+        directory = os.path.join(self.root, features.name, features.hash[:16], f'rows-{digest[:16]}')
+        if os.path.exists(os.path.join(directory, MANIFEST)):
+            return directory
+        names = header.decode().strip().split(',')
+        columns = [column for column in features.columns if column in names]
+        df = read_traffic_rows(data, names, columns) if data.strip() else pd.DataFrame(columns=columns)
+        self._write(directory, features, df, {'source': os.path.abspath(path), 'digest': digest,
+                                              'offset': end - len(data), 'end': end})
+        return directory
+
+    def _write(self, directory, features, df, source):
+        keys, values = features.compute(df)
+
+        # Written to a temporary directory and renamed, so readers never see a partial entry
+        temporary = directory + '.tmp'
+        shutil.rmtree(temporary, ignore_errors=True)
+        os.makedirs(temporary)
+        np.save(os.path.join(temporary, 'features.npy'), np.asfortranarray(values.to_numpy(dtype=np.float32)))
+        for name in keys.columns:
+            column = keys[name].to_numpy()
+            if column.dtype == object:
+                # Strings as fixed-width unicode, which numpy can memory-map
+                column = column.astype(str)
+            np.save(os.path.join(temporary, f'key_{name}.npy'), column)
+        with open(os.path.join(temporary, MANIFEST), 'w') as f:
+            json.dump(dict({'feature_set': features.name, 'hash': features.hash}, **source,
+                           source_rows=len(df), rows=len(values), features=list(values.columns),
+                           keys=list(keys.columns)), f, indent=1)
+        shutil.rmtree(directory, ignore_errors=True)
+        os.replace(temporary, directory)
+
+    def load(self, feature_set, path):
+        """Memory-mapped features of one file, materialized first if needed."""
+        return FeatureTable(self.materialize(feature_set, path))
+
+    def load_rows(self, feature_set, path, offset=0):
+        """Memory-mapped features of the rows of one file from byte `offset` on."""
+        return FeatureTable(self.materialize_rows(feature_set, path, offset))
+
+    def load_many(self, feature_set, paths):
+        return [self.load(feature_set, path) for path in paths]
+
+    def version(self, feature_set, paths):
+        """Dataset version of the features of these files."""
+        digest = hashlib.sha1(FEATURE_SETS[feature_set].hash.encode())
+        for path in sorted(os.path.abspath(path) for path in paths):
+            digest.update(self.digest(path).encode())
+        return digest.hexdigest()
+
+    def prune(self):
+        """
+        Delete entries of feature set versions that are no longer defined,
+        or whose source file changed or is gone; returns their count.  Each
+        entry is judged by its own manifest, not by the digest cache; a row
+        range entry stays while the file still holds those rows.
+        """
+        removed = 0
+        for name, feature_set in FEATURE_SETS.items():
+            for manifest_dir, _, files in os.walk(os.path.join(self.root, name)):
+                if MANIFEST not in files:
+                    continue
+                with open(os.path.join(manifest_dir, MANIFEST)) as f:
+                    manifest = json.load(f)
+                if manifest['hash'] != feature_set.hash or not os.path.exists(manifest['source']) or \
+                        self._source_digest(manifest) != manifest['digest']:
+                    shutil.rmtree(manifest_dir)
+                    removed += 1
+        return removed
+
+    def _source_digest(self, manifest):
+        """Current digest of what an entry was computed from: its row range, or the whole file."""
+        if 'offset' not in manifest:
+            return self.digest(manifest['source'])
+        header, data, end = read_rows(manifest['source'], manifest['offset'])
+        # Rows appended after the range do not change it
+        return rows_digest(header, data[:manifest['end'] - manifest['offset']]) if end >= manifest['end'] else None
@@ -0,0 +1,95 @@
+import time
+
+import numpy as np
+import pandas as pd
+
+from parameters_analysis.fingerprinting.index import NEIGHBOURS, FingerprintIndex
+
+
+def chronological_split(users, starts, test_size=0.3):
+    """
+    Train mask holding each user's earliest windows; the latest test_size
+    share is held out.  Neighbouring windows of a session look alike, so a
+    random split would let the index memorize the test windows' neighbours.
+    """
+    train = np.zeros(len(users), dtype=bool)
+    for user in np.unique(users.astype(str)):
+        positions = np.flatnonzero(users.astype(str) == user)
+        positions = positions[np.argsort(starts[positions], kind='stable')]
+        held_out = int(np.ceil(len(positions) * test_size)) if len(positions) > 1 else 0
+        train[positions[:len(positions) - held_out]] = True
+    return train
+
+
+def _latest(positions, starts, count):
+    """The `count` latest of the windows at positions (all of them when count is None)."""
+    positions = positions[np.argsort(starts[positions], kind='stable')]
+    return positions if count is None else positions[-count:]
+
+
+def evaluate_config(X, users, starts, train, selected, windows_per_user, algorithm, neighbours):
+    """Build an index over the selected users' training windows and query their held-out windows one by one."""
+    indexed = np.concatenate([_latest(np.flatnonzero(train & (users == user)), starts, windows_per_user)
+                              for user in selected])
+    queries = np.flatnonzero(~train & np.isin(users, selected))
+
+    start = time.perf_counter()
+    index = FingerprintIndex(algorithm, neighbours).fit(X[indexed], users[indexed])
+    build = time.perf_counter() - start
+
+    # One window at a time, as the live capture queries them
+    latencies, predicted = [], []
+    for position in queries:
+        start = time.perf_counter()
+        predicted.append(index.query(X[position:position + 1])['user'].iloc[0])
+        latencies.append(time.perf_counter() - start)
+    start = time.perf_counter()
+    index.query(X[queries])
+    batch = time.perf_counter() - start
+
+    latencies = np.array(latencies)
+    return {
+        'indexed': len(indexed),
+        'queries': len(queries),
+        'accuracy': float(np.mean(np.array(predicted) == users[queries])) if len(queries) else np.nan,
+        'unknown': float(np.mean(np.array(predicted) == 'unknown')) if len(queries) else np.nan,
+        'build_ms': build * 1000,
+        'query_p50_ms': float(np.percentile(latencies, 50) * 1000) if len(queries) else np.nan,
+        'query_p99_ms': float(np.percentile(latencies, 99) * 1000) if len(queries) else np.nan,
+        'batch_us_per_window': batch / len(queries) * 1e6 if len(queries) else np.nan,
+    }
+
+
+def evaluate(X, users, starts, user_counts=None, windows_per_user=(None,), algorithms=('kd_tree',),
+             neighbours=NEIGHBOURS, test_size=0.3, repeats=5, seed=0):
+    """
+    Accuracy and query latency as the index grows: for every number of
+    users (random subsets of the known users, `repeats` times unless all
+    are taken) and cap on indexed windows per user (their latest training
+    windows; None = all), averaged over the subsets.  Returns one row per
+    (algorithm, users, windows per user).
+    """
+    users = np.asarray(users).astype(str)
+    known = np.unique(users)
+    train = chronological_split(users, starts, test_size)
+    # Users need a window to index and one to query
+    known = [user for user in known if (train & (users == user)).any() and (~train & (users == user)).any()]
+    if len(known) < 2:
+        raise ValueError("Evaluation needs at least two users with several fingerprint windows each")
+    rng = np.random.default_rng(seed)
+
+    rows = []
+    for algorithm in algorithms:
+        for count in sorted(set(user_counts or range(2, len(known) + 1))):
+            if not 2 <= count <= len(known):
+                continue
+            subsets = [known] if count == len(known) else \
+                [list(rng.choice(known, count, replace=False)) for _ in range(repeats)]
+            for cap in windows_per_user:
+                results = pd.DataFrame([evaluate_config(X, users, starts, train, subset, cap, algorithm, neighbours)
+                                        for subset in subsets])
+                summary = results.mean().to_dict()
+                summary['indexed'], summary['queries'] = round(summary['indexed']), round(summary['queries'])
+                rows.append(dict({'algorithm': algorithm, 'users': count,
+                                  'windows_per_user': 'all' if cap is None else cap, 'chance': 1 / count}, **summary))
+    return pd.DataFrame(rows)
@@ -0,0 +1,195 @@
+import os
+import threading
+import time
+
+import joblib
+import numpy as np
+import pandas as pd
+from sklearn.neighbors import BallTree, KDTree
+
+from parameters_analysis.aggregation.loader import root_dir
+from parameters_analysis.feature_store.features import FEATURE_SETS
+from parameters_analysis.feature_store.store import FEATURE_STORE_DIR, FeatureStore
+from parameters_analysis.query_service.store import COLLECTED_DATA_DIR
+from training.tokenizing import capture_files
+
+FINGERPRINT_INDEX_PATH = os.path.join(root_dir, 'fingerprint_index.joblib')
+FEATURE_SET = 'user_window'
+# Fingerprint window length in seconds, fixed by the feature set
+WINDOW = FEATURE_SETS[FEATURE_SET].params['window']
+# Windows with fewer packets say too little about their user and are neither indexed nor identified
+MIN_PACKETS = 10
+NEIGHBOURS = 5
+ALGORITHMS = ['kd_tree', 'ball_tree']
+# Queries farther from every indexed window than this quantile of the indexed windows'
+# own nearest-neighbour distances (times the margin) are reported as 'unknown'
+UNKNOWN_QUANTILE = 99
+UNKNOWN_MARGIN = 1.5
+
+
+def user_captures(data_dir=COLLECTED_DATA_DIR):
+    """{user: capture files} from the per-user folders collected_data/<user>/."""
+    captures = {}
+    for path in capture_files([data_dir]):
+        parts = os.path.relpath(path, data_dir).split(os.sep)
+        # Files directly in data_dir belong to no user
+        if len(parts) > 1:
+            captures.setdefault(parts[0], []).append(path)
+    return captures
+
+
+def user_windows(captures, store_dir=FEATURE_STORE_DIR, min_packets=MIN_PACKETS):
+    """
+    Fingerprint windows of every user from the feature store: (X, users,
+    window starts), ordered by user and time.
+    """
+    store = FeatureStore(store_dir)
+    X, users, starts = [], [], []
+    for user in sorted(captures):
+        for table in store.load_many(FEATURE_SET, captures[user]):
+            kept = np.asarray(table.column('packets')) >= min_packets
+            X.append(np.asarray(table.matrix[kept], dtype=np.float64))
+            starts.append(np.asarray(table.keys['window_start'])[kept])
+            users.append(np.full(int(kept.sum()), user, dtype=object))
+    if not X:
+        return np.zeros((0, len(FEATURE_SETS[FEATURE_SET].features))), np.array([], dtype=object), np.zeros(0)
+    X, users, starts = np.concatenate(X), np.concatenate(users), np.concatenate(starts)
+    order = np.lexsort((starts, users.astype(str)))
+    return X[order], users[order], starts[order]
+
+
+class FingerprintIndex:
+    """
+    Nearest-neighbour index of user fingerprints: one vector per user and
+    window, log-scaled (counts and byte volumes span orders of magnitude)
+    and standardized, in a KD-tree or ball tree.  A query window gets the
+    majority user of its k nearest indexed windows, with the vote share as
+    confidence; a window far from everything indexed is 'unknown'.
+    """
+
+    def __init__(self, algorithm='kd_tree', neighbours=NEIGHBOURS, leaf_size=40):
+        if algorithm not in ALGORITHMS:
+            raise ValueError(f"Unknown algorithm '{algorithm}'; expected one of {ALGORITHMS}")
+        self.algorithm = algorithm
+        self.neighbours = neighbours
+        self.leaf_size = leaf_size
+        self.feature_hash = FEATURE_SETS[FEATURE_SET].hash
+        self.window = WINDOW
+
+    def transform(self, X):
+        return (np.log1p(np.maximum(X, 0)) - self.mean) / self.scale
+
+    def fit(self, X, users):
+        if not len(X):
+            raise ValueError("No fingerprint windows to index")
+        logged = np.log1p(np.maximum(X, 0))
+        self.mean = logged.mean(axis=0)
+        # Constant features carry no information; a unit scale keeps them at zero
+        self.scale = np.where(logged.std(axis=0) > 0, logged.std(axis=0), 1.0)
+        self.user_names, self.codes = np.unique(np.asarray(users, dtype=str), return_inverse=True)
+        tree = KDTree if self.algorithm == 'kd_tree' else BallTree
+        self.tree = tree(self.transform(X), leaf_size=self.leaf_size)
+
+        if len(X) > 1:
+            # Distance of each indexed window to its nearest other window
+            distances, _ = self.tree.query(self.tree.data, k=2)
+            self.unknown_distance = float(np.percentile(distances[:, 1], UNKNOWN_QUANTILE) * UNKNOWN_MARGIN)
+        else:
+            self.unknown_distance = np.inf
+        return self
+
+    def __len__(self):
+        return self.tree.data.shape[0]
+
+    def query(self, X):
+        """Closest known user of each window: DataFrame of user, distance (to the nearest window), confidence."""
+        X = np.atleast_2d(np.asarray(X, dtype=np.float64))
+        k = min(self.neighbours, len(self))
+        distances, indices = self.tree.query(self.transform(X), k=k)
+        votes = np.zeros((len(X), len(self.user_names)))
+        np.add.at(votes, (np.repeat(np.arange(len(X)), k), self.codes[indices].ravel()), 1.0)
+        # Ties go to the user of the nearest window
+        votes[np.arange(len(X)), self.codes[indices[:, 0]]] += 0.5
+        best = votes.argmax(axis=1)
+        users = self.user_names[best].astype(object)
+        users[distances[:, 0] > self.unknown_distance] = 'unknown'
+        return pd.DataFrame({'user': users, 'distance': distances[:, 0],
+                             'confidence': np.floor(votes[np.arange(len(X)), best]) / k})
+
+    def identify(self, df, min_packets=MIN_PACKETS):
+        """Fingerprint the windows of a traffic DataFrame (capture CSV columns) and identify each one."""
+        keys, features = FEATURE_SETS[FEATURE_SET].compute(df)
+        kept = features['packets'].to_numpy() >= min_packets
+        keys, features = keys[kept].reset_index(drop=True), features[kept].reset_index(drop=True)
+        if not len(features):
+            return pd.DataFrame(columns=['window_start', 'packets', 'user', 'distance', 'confidence'])
+        result = self.query(features.to_numpy(dtype=np.float64))
+        result.insert(0, 'window_start', pd.to_datetime(keys['window_start'], unit='s'))
+        result.insert(1, 'packets', features['packets'].astype(int))
+        return result
+
+    def save(self, path=FINGERPRINT_INDEX_PATH):
+        # Written beside the target first, so an interrupted save keeps the previous index
+        joblib.dump(self, path + '.tmp')
+        os.replace(path + '.tmp', path)
+
+    @staticmethod
+    def load(path=FINGERPRINT_INDEX_PATH):
+        index = joblib.load(path)
+        if index.feature_hash != FEATURE_SETS[FEATURE_SET].hash:
+            raise ValueError(f"{path} was built from other fingerprint features; rebuild it with "
+                             f"python fingerprint.py build")
+        return index
+
+
+def build_index(data_dir=COLLECTED_DATA_DIR, path=FINGERPRINT_INDEX_PATH, algorithm='kd_tree',
+                neighbours=NEIGHBOURS, store_dir=FEATURE_STORE_DIR):
+    X, users, _ = user_windows(user_captures(data_dir), store_dir)
+    index = FingerprintIndex(algorithm, neighbours).fit(X, users)
+    if path:
+        index.save(path)
+    return index
+
+
+class LiveIdentifier:
+    """
+    Identifies the user behind the live capture: every request fingerprints
+    the last completed window of the packet ring buffer (aligned like the
+    indexed windows) and queries the index, which is reloaded when
+    fingerprint.py rebuilds it.  Served as JSON at /fingerprint.
+    """
+
+    def __init__(self, packets, path=FINGERPRINT_INDEX_PATH):
+        self.packets = packets
+        self.path = path
+        self.index = None
+        self.index_mtime = None
+        self.lock = threading.Lock()
+
+    def load(self):
+        try:
+            mtime = os.path.getmtime(self.path)
+        except OSError:
+            return None
+        with self.lock:
+            if mtime != self.index_mtime:
+                self.index, self.index_mtime = FingerprintIndex.load(self.path), mtime
+            return self.index
+
+    def identify(self, params=None):
+        from parameters_analysis.live_dashboard.packet_buffer import to_frame
+        index = self.load()
+        if index is None:
+            return {'enabled': False, 'index': self.path}
+        end = np.floor(time.time() / index.window) * index.window
+        packets = self.packets.query(start=end - index.window, end=end, limit=self.packets.capacity)
+        start = time.perf_counter()
+        df = to_frame(packets).rename(columns={'timestamp': 'capture_time'})
+        result = index.identify(df) if len(df) else pd.DataFrame()
+        elapsed = time.perf_counter() - start
+        window = {'enabled': True, 'window_start': pd.Timestamp(end - index.window, unit='s').isoformat(),
+                  'packets': len(df), 'latency_ms': elapsed * 1000}
+        if not len(result):
+            return dict(window, user=None)
+        row = result.iloc[0]
+        return dict(window, user=row['user'], distance=float(row['distance']), confidence=float(row['confidence']))
@@ -0,0 +1,148 @@
+import numpy as np
+import pandas as pd
+from scipy import sparse
+
+# Label used for the remainder row/column when only the top-K are kept
+OTHER_LABEL = 'Other'
+
+# IANA port ranges
+WELL_KNOWN_MAX = 1023
+REGISTERED_MAX = 49151
+
+
+def bucket_ports(ports, scheme='range', width=1024):
+    """
+    Map port numbers to bucket labels so that ephemeral ports do not blow up
+    the number of distinct rows/columns.
+
+    scheme='range'   -> 'well-known' / 'registered' / 'ephemeral'
+    scheme='service' -> well-known ports kept as-is, others bucketed by range
+    scheme='width'   -> fixed-width bins such as '49152-50175'
+    scheme=None      -> ports returned unchanged
+    """
+    if scheme is None:
+        return pd.Series(ports)
+
+    ports = np.asarray(ports, dtype=np.int64)
+    range_labels = np.select(
+        [ports <= WELL_KNOWN_MAX, ports <= REGISTERED_MAX],
+        ['well-known', 'registered'],
+        default='ephemeral'
+    )
+
+    if scheme == 'range':
+        return pd.Series(range_labels)
+    if scheme == 'service':
+        return pd.Series(np.where(ports <= WELL_KNOWN_MAX, ports.astype(str), range_labels))
+    if scheme == 'width':
+        start = ports // width * width
+        # Build the labels once per distinct bin instead of once per row
+        uniques, inverse = np.unique(start, return_inverse=True)
+        labels = np.array([f"{s}-{s + width - 1}" for s in uniques], dtype=object)
+        return pd.Series(labels[inverse])
+
+    raise ValueError(f"Unknown port bucketing scheme: {scheme}")
+
+
+class SparseContingency:
+    """
+    Pair counts of two label columns stored as a CSR matrix.  Only observed
+    pairs take memory; densify with top_k() before plotting.
+    """
+
+    def __init__(self, matrix, row_labels, col_labels):
+        self.matrix = matrix.tocsr()
+        self.row_labels = np.asarray(row_labels, dtype=object)
+        self.col_labels = np.asarray(col_labels, dtype=object)
+
+    @property
+    def shape(self):
+        return self.matrix.shape
+
+    @property
+    def nnz(self):
+        return self.matrix.nnz
+
+    def row_totals(self):
+        return np.asarray(self.matrix.sum(axis=1)).ravel()
+
+    def col_totals(self):
+        return np.asarray(self.matrix.sum(axis=0)).ravel()
+
+    def to_frame(self, row_name='row', col_name='column', value_name='count'):
+        """Long format DataFrame with one row per observed pair."""
+        coo = self.matrix.tocoo()
+        return pd.DataFrame({
+            row_name: self.row_labels[coo.row],
+            col_name: self.col_labels[coo.col],
+            value_name: coo.data
+        })
+
+    def top_k(self, k_rows=20, k_cols=20, other=True):
+        """
+        Dense DataFrame restricted to the k_rows/k_cols largest marginals.
+        The remaining rows/columns are folded into an OTHER_LABEL bucket
+        when other=True, otherwise dropped.
+        """
+        row_map, row_labels = _top_k_mapping(self.row_totals(), self.row_labels, k_rows, other)
+        col_map, col_labels = _top_k_mapping(self.col_totals(), self.col_labels, k_cols, other)
+
+        # Collapse with two sparse projections: R @ M @ C.T is (k+1) x (k+1)
+        rows = _projection(row_map, len(row_labels), self.matrix.dtype)
+        cols = _projection(col_map, len(col_labels), self.matrix.dtype)
+        dense = (rows @ self.matrix @ cols.T).toarray()
+
+        return pd.DataFrame(dense, index=row_labels, columns=col_labels)
+
+
+def _top_k_mapping(totals, labels, k, other):
+    # Indices of the k largest totals, largest first
+    k = min(k, len(totals))
+    top = np.argpartition(-totals, k - 1)[:k] if k > 0 else np.array([], dtype=np.int64)
+    top = top[np.argsort(-totals[top], kind='stable')]
+
+    # -1 marks entries that are dropped
+    mapping = np.full(len(totals), -1, dtype=np.int64)
+    mapping[top] = np.arange(len(top))
+    new_labels = list(labels[top])
+
+    if other and len(top) < len(totals):
+        mapping[mapping < 0] = len(top)
+        new_labels.append(OTHER_LABEL)
+
+    return mapping, new_labels
+
+
+def _projection(mapping, size, dtype):
+    # Keeps the count dtype so integer heatmaps can still use fmt='d'
+    keep = mapping >= 0
+    cols = np.flatnonzero(keep)
+    return sparse.csr_matrix(
+        (np.ones(len(cols), dtype=dtype), (mapping[keep], cols)),
+        shape=(size, len(mapping))
+    )
+
+
+def sparse_crosstab(rows, cols, weights=None):
+    """
+    Sparse equivalent of pd.crosstab(rows, cols) (or of a 'size' pivot_table).
+    Cost is proportional to the number of input rows and observed pairs, not
+    to the product of the distinct label counts.
+    """
+    row_codes, row_labels = pd.factorize(pd.Series(rows), sort=True)
+    col_codes, col_labels = pd.factorize(pd.Series(cols), sort=True)
+
+    # Missing labels get code -1; drop them like crosstab does
+    valid = (row_codes >= 0) & (col_codes >= 0)
+    if weights is None:
+        data = np.ones(valid.sum(), dtype=np.int64)
+    else:
+        data = np.asarray(weights)[valid]
+
+    # coo -> csr sums duplicate (row, col) pairs
+    matrix = sparse.coo_matrix(
+        (data, (row_codes[valid], col_codes[valid])),
+        shape=(len(row_labels), len(col_labels))
+    ).tocsr()
+
+    return SparseContingency(matrix, row_labels, col_labels)
@@ -1,74 +1,71 @@
-import os
-import pandas as pd
-import socket
 import matplotlib.pyplot as plt
 import seaborn as sns
 
-# Load your network traffic data
-root_dir = os.path.dirname(os.path.dirname(os.path.dirname(__file__)))
-csv_path = os.path.join(root_dir, 'network_traffic.csv')
-df = pd.read_csv(csv_path)
+from parameters_analysis.aggregation.engine import run_metrics
+from parameters_analysis.aggregation.figures import finish_figure
+from parameters_analysis.aggregation.registry import register_metric
+from parameters_analysis.flow_frequency.contingency import sparse_crosstab
 
-def get_domain(ip):
-    try:
-        domain = socket.gethostbyaddr(ip)[0]
-    except socket.herror:
-        domain = "Unknown"
-    return domain
+# Aggregates this report needs from the shared engine; the single-column
+# counts are rolled up from the pair counts without another pass
+METRICS = [
+    register_metric('domain_pairs', keys=['source_domain', 'destination_domain'],
+                    count=('source_domain', 'size')),
+    register_metric('source_domain_counts', keys=['source_domain'], count=('source_domain', 'size')),
+    register_metric('destination_domain_counts', keys=['destination_domain'], count=('destination_domain', 'size')),
+    register_metric('ip_pairs', keys=['source_ip', 'destination_ip'], count=('source_ip', 'size')),
+    register_metric('source_ip_counts', keys=['source_ip'], count=('source_ip', 'size')),
+    register_metric('destination_ip_counts', keys=['destination_ip'], count=('destination_ip', 'size')),
+]
 
-# Apply this function to your dataframe
-df['source_domain'] = df['source_ip'].apply(get_domain)
-df['destination_domain'] = df['destination_ip'].apply(get_domain)
+# Row-level columns used directly by the plots
+COLUMNS = []
 
-# Plot frequency of Source Domains
-plt.figure(figsize=(14, 8))
-sns.countplot(y='source_domain', data=df, order=df['source_domain'].value_counts().index, palette='viridis')
-plt.title('Frequency of Source Domains', fontsize=16)
-plt.xlabel('Count', fontsize=14)
-plt.ylabel('Source Domain', fontsize=14)
-plt.xticks(rotation=45, ha='right')
-plt.tight_layout()  # Adjusts plot to fit labels
-plt.show()
 
-# Plot frequency of Destination Domains
-plt.figure(figsize=(14, 8))
-sns.countplot(y='destination_domain', data=df, order=df['destination_domain'].value_counts().index, palette='viridis')
-plt.title('Frequency of Destination Domains', fontsize=16)
-plt.xlabel('Count', fontsize=14)
-plt.ylabel('Destination Domain', fontsize=14)
-plt.xticks(rotation=45, ha='right')
-plt.tight_layout()  # Adjusts plot to fit labels
-plt.show()
+def plot_frequency(counts, column, title, ylabel, name, output_dir='.', show=True):
+    counts = counts.sort_values('count', ascending=False)
+    plt.figure(figsize=(14, 8))
+    sns.barplot(x='count', y=column, data=counts, order=counts[column], palette='viridis')
+    plt.title(title, fontsize=16)
+    plt.xlabel('Count', fontsize=14)
+    plt.ylabel(ylabel, fontsize=14)
+    plt.xticks(rotation=45, ha='right')
+    plt.tight_layout()  # Adjusts plot to fit labels
+    finish_figure(name, output_dir, show)
 
-# Plot frequency of Source IP Addresses
-plt.figure(figsize=(14, 8))
-sns.countplot(y='source_ip', data=df, order=df['source_ip'].value_counts().index, palette='viridis')
-plt.title('Frequency of Source IP Addresses', fontsize=16)
-plt.xlabel('Count', fontsize=14)
-plt.ylabel('Source IP', fontsize=14)
-plt.xticks(rotation=45, ha='right')
-plt.tight_layout()  # Adjusts plot to fit labels
-plt.show()
 
-# Plot frequency of Destination IP Addresses
-plt.figure(figsize=(14, 8))
-sns.countplot(y='destination_ip', data=df, order=df['destination_ip'].value_counts().index, palette='viridis')
-plt.title('Frequency of Destination IP Addresses', fontsize=16)
-plt.xlabel('Count', fontsize=14)
-plt.ylabel('Destination IP', fontsize=14)
-plt.xticks(rotation=45, ha='right')
-plt.tight_layout()  # Adjusts plot to fit labels
-plt.show()
+def render(data, output_dir='.', show=True):
+    # Plot frequency of Source Domains
+    plot_frequency(data['source_domain_counts'], 'source_domain', 'Frequency of Source Domains', 'Source Domain',
+                   'source_domain_frequency', output_dir, show)
 
-# Create a pivot table for the heatmap
-heatmap_data = df.pivot_table(index='source_domain', columns='destination_domain', aggfunc='size', fill_value=0)
+    # Plot frequency of Destination Domains
+    plot_frequency(data['destination_domain_counts'], 'destination_domain', 'Frequency of Destination Domains',
+                   'Destination Domain', 'destination_domain_frequency', output_dir, show)
 
-plt.figure(figsize=(14, 10))
-sns.heatmap(heatmap_data, cmap='YlGnBu', annot=True, fmt='d', annot_kws={"size": 8})
-plt.title('Traffic Heatmap: Source Domain vs. Destination Domain', fontsize=16)
-plt.xlabel('Destination Domain', fontsize=14)
-plt.ylabel('Source Domain', fontsize=14)
-plt.xticks(rotation=45, ha='right')
-plt.yticks(rotation=0)
-plt.tight_layout()  # Adjusts plot to fit labels
-plt.show()
+    # Plot frequency of Source IP Addresses
+    plot_frequency(data['source_ip_counts'], 'source_ip', 'Frequency of Source IP Addresses', 'Source IP',
+                   'source_ip_frequency', output_dir, show)
+
+    # Plot frequency of Destination IP Addresses
+    plot_frequency(data['destination_ip_counts'], 'destination_ip', 'Frequency of Destination IP Addresses',
+                   'Destination IP', 'destination_ip_frequency', output_dir, show)
+
+    # Count domain pairs sparsely and keep only the busiest domains for the heatmap
+    pairs = data['domain_pairs']
+    heatmap_data = sparse_crosstab(pairs['source_domain'], pairs['destination_domain'],
+                                   weights=pairs['count']).top_k(k_rows=20, k_cols=20)
+
+    plt.figure(figsize=(14, 10))
+    sns.heatmap(heatmap_data, cmap='YlGnBu', annot=True, fmt='d', annot_kws={"size": 8})
+    plt.title('Traffic Heatmap: Source Domain vs. Destination Domain', fontsize=16)
+    plt.xlabel('Destination Domain', fontsize=14)
+    plt.ylabel('Source Domain', fontsize=14)
+    plt.xticks(rotation=45, ha='right')
+    plt.yticks(rotation=0)
+    plt.tight_layout()  # Adjusts plot to fit labels
+    finish_figure('domain_heatmap', output_dir, show)
+
+
+if __name__ == '__main__':
+    render(run_metrics(METRICS, COLUMNS))
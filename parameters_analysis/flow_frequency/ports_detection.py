@@ -1,82 +1,106 @@
 import os
 
 import networkx as nx
-import pandas as pd
 from matplotlib import pyplot as plt
 import seaborn as sns
-from pyvis.network import Network
-
-# Load the network traffic data
-root_dir = os.path.dirname(os.path.dirname(os.path.dirname(__file__)))
-csv_path = os.path.join(root_dir , 'network_traffic.csv')
-df = pd.read_csv(csv_path)
-
-# Plot histogram for Source Ports
-plt.figure(figsize=(12, 6))
-plt.hist(df['source_port'], bins=50, color='skyblue', edgecolor='black')
-plt.title('Distribution of Source Ports')
-plt.xlabel('Source Port')
-plt.ylabel('Frequency')
-plt.grid(True)
-plt.show()
-
-# Plot histogram for Destination Ports
-plt.figure(figsize=(12, 6))
-plt.hist(df['destination_port'], bins=50, color='salmon', edgecolor='black')
-plt.title('Distribution of Destination Ports')
-plt.xlabel('Destination Port')
-plt.ylabel('Frequency')
-plt.grid(True)
-plt.show()
-
-#### Heat Graph
-
-# Create a matrix for the heatmap
-port_matrix = pd.crosstab(index=df['source_port'], columns=df['destination_port'], values=df['source_ip'], aggfunc='count').fillna(0)
-
-# Draw the heatmap
-plt.figure(figsize=(12, 8))
-sns.heatmap(port_matrix, annot=False, cmap='YlGnBu')
-plt.title('Source Port vs Destination Port Traffic')
-plt.xlabel('Destination Port')
-plt.ylabel('Source Port')
-plt.show()
-
-# Aggregate data to reduce complexity
-# Group by Source IP and Destination IP, then aggregate ports
-agg_df = df.groupby(['source_ip', 'destination_ip']).agg({
-    'source_port': lambda x: ','.join(map(str, set(x))),
-    'destination_port': lambda x: ','.join(map(str, set(x)))
-}).reset_index()
-
-# Create a directed graph
-G = nx.DiGraph()
-
-# Add edges to the graph with aggregated port information
-for _, row in agg_df.iterrows():
-    G.add_edge(row['source_ip'], row['destination_ip'],
-               label=f"{row['source_port']}->{row['destination_port']}")
-
-# Simplify the layout
-pos = nx.spring_layout(G, k=0.15, iterations=20)
-
-# Draw the graph with simpler design
-plt.figure(figsize=(10, 8))
-nx.draw(G, pos, with_labels=True, node_color='skyblue', node_size=1000, font_size=8, font_weight='bold', edge_color='gray')
-edge_labels = nx.get_edge_attributes(G, 'label')
-nx.draw_networkx_edge_labels(G, pos, edge_labels=edge_labels, font_size=7, font_color='red')
-
-plt.title('Simplified Network Traffic Visualization')
-plt.show()
-
-# Initialize a PyVis network
-net = Network(notebook=True, height="750px", width="100%", bgcolor="#222222", font_color="white")
-
-# Add nodes and edges
-for _, row in agg_df.iterrows():
-    net.add_node(row['source_ip'], label=row['source_ip'])
-    net.add_node(row['destination_ip'], label=row['destination_ip'])
-    net.add_edge(row['source_ip'], row['destination_ip'], title=f"{row['source_port']}->{row['destination_port']}")
-
-# Generate the interactive visualization
-net.show("network_traffic.html")
\ No newline at end of file
+
+from parameters_analysis.aggregation.engine import run_metrics
+from parameters_analysis.aggregation.figures import finish_figure
+from parameters_analysis.aggregation.registry import register_metric
+from parameters_analysis.cidr_analysis.cidr_tree import cached_prefix_tree
+from parameters_analysis.flow_frequency.contingency import bucket_ports, sparse_crosstab
+from parameters_analysis.graph_analysis.graph_builder import build_edge_list, build_graph, compute_layout, to_pyvis
+
+# Aggregates this report needs from the shared engine; the per-port counts
+# are rolled up from the port pair counts without another pass
+METRICS = [
+    register_metric('port_pairs', keys=['source_port', 'destination_port'], count=('source_port', 'size')),
+    register_metric('source_port_counts', keys=['source_port'], count=('source_port', 'size')),
+    register_metric('destination_port_counts', keys=['destination_port'], count=('destination_port', 'size')),
+]
+
+# Row-level columns used directly by the plots
+COLUMNS = ['source_ip', 'destination_ip', 'source_port', 'destination_port', 'packet_size']
+
+
+def render(data, output_dir='.', show=True):
+    df = data.frame
+
+    # Plot histogram for Source Ports
+    source_ports = data['source_port_counts']
+    plt.figure(figsize=(12, 6))
+    plt.hist(source_ports['source_port'], weights=source_ports['count'], bins=50, color='skyblue', edgecolor='black')
+    plt.title('Distribution of Source Ports')
+    plt.xlabel('Source Port')
+    plt.ylabel('Frequency')
+    plt.grid(True)
+    finish_figure('source_port_distribution', output_dir, show)
+
+    # Plot histogram for Destination Ports
+    destination_ports = data['destination_port_counts']
+    plt.figure(figsize=(12, 6))
+    plt.hist(destination_ports['destination_port'], weights=destination_ports['count'], bins=50, color='salmon',
+             edgecolor='black')
+    plt.title('Distribution of Destination Ports')
+    plt.xlabel('Destination Port')
+    plt.ylabel('Frequency')
+    plt.grid(True)
+    finish_figure('destination_port_distribution', output_dir, show)
+
+    #### Heat Graph
+
+    # Count port pairs sparsely; non well-known ports are bucketed by range and
+    # only the busiest ports are densified for plotting
+    pairs = data['port_pairs']
+    port_counts = sparse_crosstab(bucket_ports(pairs['source_port'], scheme='service'),
+                                  bucket_ports(pairs['destination_port'], scheme='service'),
+                                  weights=pairs['count'])
+    port_matrix = port_counts.top_k(k_rows=20, k_cols=30)
+
+    # Draw the heatmap
+    plt.figure(figsize=(12, 8))
+    sns.heatmap(port_matrix, annot=False, cmap='YlGnBu')
+    plt.title('Source Port vs Destination Port Traffic')
+    plt.xlabel('Destination Port')
+    plt.ylabel('Source Port')
+    finish_figure('port_heatmap', output_dir, show)
+
+    # Aggregate data to reduce complexity
+    # Roll hosts up into CIDR prefixes so the graph stays within a node budget
+    host_groups = cached_prefix_tree(df).representatives(node_budget=100)
+    graph_df = df.assign(source_ip=df['source_ip'].map(host_groups),
+                         destination_ip=df['destination_ip'].map(host_groups))
+
+    # Group by Source and Destination once, with packet/byte/flow weights and port sets
+    agg_df = build_edge_list(graph_df)
+
+    # Create a directed graph in one bulk call
+    G = build_graph(agg_df)
+
+    # Cached, scalable layout shared by the static and interactive views
+    pos = compute_layout(agg_df, method='force')
+
+    # Draw the graph with simpler design
+    plt.figure(figsize=(10, 8))
+    nx.draw(G, pos, with_labels=True, node_color='skyblue', node_size=1000, font_size=8, font_weight='bold',
+            edge_color='gray')
+    edge_labels = nx.get_edge_attributes(G, 'label')
+    nx.draw_networkx_edge_labels(G, pos, edge_labels=edge_labels, font_size=7, font_color='red')
+
+    plt.title('Simplified Network Traffic Visualization')
+    finish_figure('network_traffic_graph', output_dir, show)
+
+    # Initialize a PyVis network with all nodes and edges in one pass; its scripts are
+    # inlined, so nothing is copied next to the working directory
+    net = to_pyvis(agg_df, positions=pos, cdn_resources='in_line')
+
+    # Generate the interactive visualization
+    output_html = os.path.join(output_dir, "network_traffic.html")
+    if show:
+        net.show(output_html, notebook=False)
+    else:
+        net.write_html(output_html)
+
+
+if __name__ == '__main__':
+    render(run_metrics(METRICS, COLUMNS))
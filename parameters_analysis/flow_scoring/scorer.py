@@ -0,0 +1,296 @@
+import heapq
+import os
+import threading
+import time
+from collections import OrderedDict, deque
+
+import numpy as np
+import pandas as pd
+
+from parameters_analysis.graph_analysis.graph_features import HostGraph, pagerank
+
+# Written by training_model.py: model, scaler, feature schema and the rows learned per file.  Anchored
+# at the repository root, so the capture and the training script agree from any working directory
+root_dir = os.path.dirname(os.path.dirname(os.path.dirname(__file__)))
+MODEL_PATH = os.path.join(root_dir, 'training_model.joblib')
+
+# A micro-batch is scored once it holds BATCH_SIZE flows or its oldest flow
+# waited MAX_DELAY seconds, whichever comes first
+BATCH_SIZE = 4096
+MAX_DELAY = 0.05
+# Probabilities at or above this count as intruder flows in the metrics
+THRESHOLD = 0.5
+# Checkpoints waiting to be scored; beyond this the oldest are dropped and counted
+MAX_QUEUED = 16 * BATCH_SIZE
+
+# Latest score kept per flow; least recently scored flows are dropped first
+MAX_FLOWS = 100000
+# Batch latencies kept for the latency percentiles of the metrics
+LATENCY_WINDOW = 1000
+# Seconds between PageRank refreshes of the live host graph, and between model file checks
+PAGERANK_INTERVAL = 10.0
+RELOAD_INTERVAL = 30.0
+# Fan-out is counted per window of this many seconds, as fan_out_bursts() does offline
+FAN_OUT_WINDOW = 60
+
+
+class LiveHostGraph:
+    """
+    The per-host graph features of training_model.py (prefix src_) kept up
+    to date packet by packet: in / out degree, distinct peers and peak
+    fan-out per minute in constant time per packet, PageRank recomputed on
+    the edge counts every PAGERANK_INTERVAL seconds.  Training computes the
+    features per capture file, so the capture resets the graph whenever it
+    starts a new file; packet_analysis.py stands in for that by resetting it
+    every GRAPH_RESET_INTERVAL seconds.
+    """
+
+    def __init__(self, pagerank_interval=PAGERANK_INTERVAL):
+        self.pagerank_interval = pagerank_interval
+        self.lock = threading.Lock()
+        self._clear()
+
+    def _clear(self):
+        self.edges = {}                 # (source, destination) -> packets
+        self.out_peers = {}             # host -> set of destinations
+        self.in_peers = {}              # host -> set of sources
+        self.peers = {}                 # host -> distinct peers in either direction
+        self.fan_out = {}               # host -> (window, destinations in it)
+        self.max_fan_out = {}
+        self.pageranks = {}
+        self.pagerank_time = 0.0
+
+    def reset(self):
+        with self.lock:
+            self._clear()
+
+    def add(self, source, destination, now):
+        with self.lock:
+            edge = (source, destination)
+            self.edges[edge] = self.edges.get(edge, 0) + 1
+            if self.edges[edge] == 1:
+                self.out_peers.setdefault(source, set()).add(destination)
+                self.in_peers.setdefault(destination, set()).add(source)
+                self.peers.setdefault(source, set()).add(destination)
+                self.peers.setdefault(destination, set()).add(source)
+
+            window = int(now // FAN_OUT_WINDOW)
+            current = self.fan_out.get(source)
+            if current is None or current[0] != window:
+                current = self.fan_out[source] = (window, set())
+            current[1].add(destination)
+            self.max_fan_out[source] = max(self.max_fan_out.get(source, 0), len(current[1]))
+
+    def features(self, host):
+        return {
+            'src_out_degree': len(self.out_peers.get(host, ())),
+            'src_in_degree': len(self.in_peers.get(host, ())),
+            'src_distinct_peers': len(self.peers.get(host, ())),
+            'src_pagerank': self.pageranks.get(host, 0.0),
+            'src_max_fan_out': self.max_fan_out.get(host, 0),
+        }
+
+    def refresh_pagerank(self, now):
+        """Recompute PageRank when the last one is older than pagerank_interval (run off the capture thread)."""
+        if now - self.pagerank_time < self.pagerank_interval:
+            return
+        with self.lock:
+            edges = list(self.edges.items())
+        self.pagerank_time = now
+        if not edges:
+            return
+        from scipy import sparse
+        sources, destinations = zip(*(edge for edge, _ in edges))
+        codes, hosts = pd.factorize(pd.Index(sources).append(pd.Index(destinations)))
+        n = len(hosts)
+        packets = sparse.csr_matrix((np.array([count for _, count in edges], dtype=np.float64),
+                                     (codes[:len(edges)], codes[len(edges):])), shape=(n, n))
+        ranks = pagerank(HostGraph(hosts, packets, packets))
+        self.pageranks = dict(zip(hosts, ranks))
+
+
+class FlowScorer:
+    """
+    Applies the classifier persisted by training_model.py to live flows.
+    The capture submits each flow's current feature vector (a checkpoint
+    of the flow, one per packet); a background thread scores them in
+    micro-batches with one vectorized scaler transform and predict_proba
+    call, within the latency budget of max_delay seconds.  latest() returns
+    a flow's most recent probability, so the capture writes it without
+    waiting for the model, and metrics() feeds the dashboard's /scores.
+    """
+
+    def __init__(self, model_path=MODEL_PATH, batch_size=BATCH_SIZE, max_delay=MAX_DELAY, threshold=THRESHOLD,
+                 max_flows=MAX_FLOWS, max_queued=MAX_QUEUED, n_jobs=1):
+        self.model_path = model_path
+        self.batch_size = batch_size
+        self.max_delay = max_delay
+        self.threshold = threshold
+        self.max_flows = max_flows
+        self.n_jobs = n_jobs
+
+        self.model = self.scaler = self.features = None
+        self.model_mtime = None
+        self.checked = 0.0
+        self.queue = deque(maxlen=max_queued)
+        self.scored = self.batches = self.flagged = self.dropped = self.stale = self.errors = self.overflowed = 0
+        self.load()
+
+        self.graph = LiveHostGraph()
+        self.wakeup = threading.Event()
+        self.scores = OrderedDict()
+        self.lock = threading.Lock()
+        self.latencies = deque(maxlen=LATENCY_WINDOW)
+        self.started = time.time()
+        self.thread = None
+
+    @property
+    def enabled(self):
+        return self.model is not None
+
+    def load(self):
+        """(Re)load the model when its file changed, e.g. after training_model.py updated it."""
+        self.checked = time.time()
+        try:
+            mtime = os.path.getmtime(self.model_path)
+        except OSError:
+            return
+        if mtime == self.model_mtime:
+            return
+        import joblib
+        state = joblib.load(self.model_path)
+        model = state['model']
+        if hasattr(model, 'n_jobs'):
+            # Micro-batches are small; thread fan-out per call costs more than it saves
+            model.n_jobs = self.n_jobs
+        features = list(state['features'])
+        if features != self.features:
+            # Vectors queued for the previous feature schema cannot be scored by this model
+            self.stale += len(self.queue)
+            self.queue.clear()
+            self.features = features
+        self.model, self.scaler = model, state['scaler']
+        self.model_mtime = mtime
+
+    def start(self):
+        # Also started without a model file: the thread picks up one written later
+        if self.thread is None:
+            self.thread = threading.Thread(target=self.run, name='flow-scorer', daemon=True)
+            self.thread.start()
+        return self
+
+    def submit(self, flow_key, source, destination, now, values):
+        """Queue a flow checkpoint: values holds its per-flow features; host graph features are added here."""
+        if not self.enabled:
+            return
+        self.graph.add(source, destination, now)
+        values.update(self.graph.features(source))
+        # The schema travels with the vector, so a model reloaded meanwhile never sees it in another layout
+        features = self.features
+        if len(self.queue) == self.queue.maxlen:
+            # The scoring thread fell behind; append() drops the oldest checkpoint
+            self.overflowed += 1
+        self.queue.append((flow_key, [values.get(name, 0.0) for name in features], time.perf_counter(), features))
+        if len(self.queue) >= self.batch_size:
+            self.wakeup.set()
+
+    def latest(self, flow_key):
+        """Most recent probability of the flow, or None before its first batch was scored."""
+        return self.scores.get(flow_key)
+
+    def next_batch(self):
+        """Wait until a batch is full or its oldest entry reaches the latency budget, then take it."""
+        while not self.queue:
+            self.wakeup.wait(self.max_delay)
+            self.wakeup.clear()
+            self.maintain()
+        remaining = self.queue[0][2] + self.max_delay - time.perf_counter()
+        if len(self.queue) < self.batch_size and remaining > 0:
+            self.wakeup.wait(remaining)
+            self.wakeup.clear()
+        batch = []
+        while self.queue and len(batch) < self.batch_size:
+            batch.append(self.queue.popleft())
+        return batch
+
+    def maintain(self):
+        now = time.time()
+        self.graph.refresh_pagerank(now)
+        if now - self.checked >= RELOAD_INTERVAL:
+            self.load()
+
+    def score_batch(self, batch):
+        # A flow checkpointed several times in one batch is only scored at its latest state
+        latest = {}
+        stale = 0
+        for flow_key, vector, submitted, features in batch:
+            if features is not self.features:
+                stale += 1
+                continue
+            latest[flow_key] = (vector, submitted)
+        if not latest:
+            with self.lock:
+                self.stale += stale
+            return {}
+        keys = list(latest)
+        X = np.array([latest[key][0] for key in keys], dtype=np.float64)
+        start = time.perf_counter()
+        probabilities = self.model.predict_proba(self.scaler.transform(X))
+        # Probability of the intruder class (label 1)
+        classes = list(self.model.classes_)
+        probabilities = probabilities[:, classes.index(1)] if 1 in classes else np.zeros(len(keys))
+        finished = time.perf_counter()
+
+        with self.lock:
+            for key, probability in zip(keys, probabilities):
+                self.scores[key] = float(probability)
+                self.scores.move_to_end(key)
+            while len(self.scores) > self.max_flows:
+                self.scores.popitem(last=False)
+            self.scored += len(keys)
+            self.stale += stale
+            self.dropped += len(batch) - stale - len(keys)
+            self.batches += 1
+            self.flagged += int((probabilities >= self.threshold).sum())
+            # Queueing delay of the oldest checkpoint plus model time
+            self.latencies.append((finished - min(submitted for _, submitted in latest.values()),
+                                   finished - start))
+        return dict(zip(keys, probabilities))
+
+    def run(self):
+        while True:
+            try:
+                batch = self.next_batch()
+                if batch:
+                    self.score_batch(batch)
+                self.maintain()
+            except Exception as error:
+                # One bad batch or model file must not end live scoring; the next batch is tried as usual
+                with self.lock:
+                    self.errors += 1
+                print(f"Flow scoring error ({self.errors} so far): {error!r}")
+
+    def metrics(self, params=None):
+        """Throughput, batch latency and intruder counts, served as JSON at /scores."""
+        with self.lock:
+            latencies = np.array(self.latencies) if self.latencies else np.zeros((0, 2))
+            flows = heapq.nlargest(10, self.scores.items(), key=lambda item: item[1])
+            uptime = time.time() - self.started
+            return {
+                'enabled': self.enabled,
+                'model': self.model_path,
+                'flows_scored': self.scored,
+                'checkpoints_superseded': self.dropped,
+                'stale_dropped': self.stale,
+                'queue_overflow_dropped': self.overflowed,
+                'errors': self.errors,
+                'batches': self.batches,
+                'queued': len(self.queue),
+                'flows_per_second': self.scored / uptime if uptime > 0 else 0.0,
+                'latency_p50_ms': float(np.percentile(latencies[:, 0], 50) * 1000) if len(latencies) else None,
+                'latency_p99_ms': float(np.percentile(latencies[:, 0], 99) * 1000) if len(latencies) else None,
+                'model_ms_per_batch': float(latencies[:, 1].mean() * 1000) if len(latencies) else None,
+                'flagged': self.flagged,
+                'top_flows': [{'flow': ' '.join(map(str, key)), 'probability': round(probability, 3)}
+                              for key, probability in flows],
+            }
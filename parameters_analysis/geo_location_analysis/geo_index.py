@@ -0,0 +1,217 @@
+import ipaddress
+import os
+from functools import lru_cache
+
+import numpy as np
+import pandas as pd
+
+from parameters_analysis.cidr_analysis.cidr_tree import ip_to_int
+
+# Local IP-range database (CSV such as DB-IP / IP2Location lite, or a MaxMind .mmdb)
+root_dir = os.path.dirname(os.path.dirname(os.path.dirname(__file__)))
+GEO_DATABASE = os.environ.get('GEO_DATABASE', os.path.join(root_dir, 'geo', 'ip_ranges.csv'))
+
+GEO_COLUMNS = ['country', 'region', 'city']
+UNKNOWN = 'Unknown'
+
+# Accepted header names for each field of a range CSV
+FIELD_NAMES = {
+    'start': ['start', 'ip_start', 'start_ip', 'ip_from', 'range_start'],
+    'end': ['end', 'ip_end', 'end_ip', 'ip_to', 'range_end'],
+    'network': ['network', 'cidr', 'prefix'],
+    'country': ['country', 'country_code', 'country_name', 'country_iso_code'],
+    'region': ['region', 'stateprov', 'region_name', 'subdivision', 'subdivision_1_name', 'state'],
+    'city': ['city', 'city_name'],
+}
+
+# Column order of header-less files: DB-IP lite, or plain start,end,country,region,city
+HEADERLESS_LAYOUTS = {
+    5: ['start', 'end', 'country', 'region', 'city'],
+    8: ['start', 'end', 'continent', 'country', 'region', 'city', 'latitude', 'longitude'],
+    6: ['start', 'end', 'continent', 'country', 'region', 'city'],
+}
+
+
+class GeoIndex:
+    """
+    Non-overlapping IPv4 ranges as sorted start / end integer arrays, with
+    the location of each range stored as category codes.  A whole column of
+    IPs is resolved with one np.searchsorted over its distinct addresses;
+    nothing goes over the network.
+    """
+
+    def __init__(self, starts, ends, codes, categories):
+        order = np.argsort(starts, kind='stable')
+        self.starts = np.asarray(starts, dtype=np.int64)[order]
+        self.ends = np.asarray(ends, dtype=np.int64)[order]
+        # codes: one int32 array per geo column; categories: labels per column
+        self.codes = {column: np.asarray(codes[column], dtype=np.int32)[order] for column in GEO_COLUMNS}
+        self.categories = {column: np.asarray(categories[column], dtype=object) for column in GEO_COLUMNS}
+
+    def __len__(self):
+        return len(self.starts)
+
+    @classmethod
+    def from_frame(cls, ranges):
+        """ranges: DataFrame with integer start / end and country, region, city."""
+        codes, categories = {}, {}
+        for column in GEO_COLUMNS:
+            values = ranges[column].fillna(UNKNOWN).astype(str).replace('', UNKNOWN)
+            codes[column], categories[column] = pd.factorize(values)
+        return cls(ranges['start'].to_numpy(), ranges['end'].to_numpy(), codes, categories)
+
+    def _range_index(self, ints):
+        index = np.searchsorted(self.starts, ints, side='right') - 1
+        found = (index >= 0) & (ints >= 0)
+        index = np.where(found, index, 0)
+        found &= ints <= self.ends[index] if len(self) else False
+        return index, found
+
+    def lookup(self, ips):
+        """
+        Categorical country / region / city for a column of IPs, 'Unknown'
+        where no range covers the address.
+        """
+        ips = pd.Series(ips)
+        positions, distinct = pd.factorize(ips)
+        index, found = self._range_index(ip_to_int(distinct))
+
+        result = {}
+        for column in GEO_COLUMNS:
+            categories = list(self.categories[column])
+            if UNKNOWN not in categories:
+                categories.append(UNKNOWN)
+            unknown = categories.index(UNKNOWN)
+            per_ip = np.where(found, self.codes[column][index] if len(self) else unknown, unknown)
+            # factorize marks missing IPs with -1
+            per_row = np.where(positions >= 0, per_ip[positions], unknown)
+            result[column] = pd.Categorical.from_codes(per_row, categories)
+        return pd.DataFrame(result, index=ips.index)
+
+    def lookup_one(self, ip):
+        """(country, region, city) of one IP, for the capture path."""
+        try:
+            value = int(ipaddress.IPv4Address(ip))
+        except ValueError:
+            return UNKNOWN, UNKNOWN, UNKNOWN
+        index = int(np.searchsorted(self.starts, value, side='right')) - 1
+        if index < 0 or value > self.ends[index]:
+            return UNKNOWN, UNKNOWN, UNKNOWN
+        return tuple(self.categories[column][self.codes[column][index]] for column in GEO_COLUMNS)
+
+    def save(self, path):
+        arrays = {'starts': self.starts, 'ends': self.ends}
+        for column in GEO_COLUMNS:
+            arrays[f'{column}_codes'] = self.codes[column]
+            arrays[f'{column}_categories'] = self.categories[column].astype(str)
+        np.savez(path, **arrays)
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as arrays:
+            codes = {column: arrays[f'{column}_codes'] for column in GEO_COLUMNS}
+            categories = {column: arrays[f'{column}_categories'].astype(object) for column in GEO_COLUMNS}
+            return cls(arrays['starts'], arrays['ends'], codes, categories)
+
+
+def _range_bounds(values):
+    """Range start / end column as integers: already integer, or dotted quads."""
+    try:
+        return pd.to_numeric(values).to_numpy(dtype=np.int64)
+    except ValueError:
+        return ip_to_int(values)
+
+
+def _mmdb_name(entry):
+    entry = entry or {}
+    return entry.get('names', {}).get('en') or entry.get('iso_code')
+
+
+def read_range_csv(path):
+    """Read a range CSV into start, end, country, region, city; IPv6 rows are dropped."""
+    first = pd.read_csv(path, nrows=1, header=None).iloc[0]
+    try:
+        ipaddress.ip_address(str(first.iloc[0]))
+        headerless = True
+    except ValueError:
+        headerless = str(first.iloc[0]).isdigit()
+
+    if headerless:
+        raw = pd.read_csv(path, header=None, dtype=str, keep_default_na=False)
+        layout = HEADERLESS_LAYOUTS.get(raw.shape[1], HEADERLESS_LAYOUTS[6])
+        raw.columns = (layout + [f'extra_{i}' for i in range(raw.shape[1])])[:raw.shape[1]]
+    else:
+        raw = pd.read_csv(path, dtype=str, keep_default_na=False)
+        lowered = {column.lower(): column for column in raw.columns}
+        raw = raw.rename(columns={lowered[name]: field for field, names in FIELD_NAMES.items()
+                                  for name in names if name in lowered})
+
+    if 'network' in raw.columns and 'start' not in raw.columns:
+        networks = [ipaddress.ip_network(value, strict=False) for value in raw['network']]
+        raw = raw.assign(start=[str(network.network_address) for network in networks],
+                         end=[str(network.broadcast_address) for network in networks])
+
+    raw = raw[~raw['start'].str.contains(':', regex=False)]
+    ranges = pd.DataFrame({
+        'start': _range_bounds(raw['start']),
+        'end': _range_bounds(raw['end']),
+    })
+    for column in GEO_COLUMNS:
+        ranges[column] = raw[column].to_numpy() if column in raw.columns else UNKNOWN
+    return ranges[(ranges['start'] >= 0) & (ranges['end'] >= ranges['start'])]
+
+
+def read_mmdb(path):
+    """Flatten the IPv4 networks of a MaxMind .mmdb (requires the maxminddb package)."""
+    try:
+        import maxminddb
+    except ImportError:
+        raise ImportError("Reading .mmdb files requires the 'maxminddb' package (pip install maxminddb)")
+
+    rows = []
+    with maxminddb.open_database(path) as reader:
+        for network, record in reader:
+            if network.version != 4 or not record:
+                continue
+            subdivisions = record.get('subdivisions') or [{}]
+            rows.append((int(network.network_address), int(network.broadcast_address),
+                         _mmdb_name(record.get('country')), _mmdb_name(subdivisions[0]),
+                         _mmdb_name(record.get('city'))))
+    return pd.DataFrame(rows, columns=['start', 'end'] + GEO_COLUMNS)
+
+
+@lru_cache(maxsize=None)
+def load_geo_index(path=GEO_DATABASE):
+    """
+    Build (or load the cached) index for a range database.  The index is
+    cached as <database>.index.npz and rebuilt when the database is newer.
+    """
+    cache = path + '.index.npz'
+    if os.path.exists(cache) and os.path.getmtime(cache) >= os.path.getmtime(path):
+        return GeoIndex.load(cache)
+
+    ranges = read_mmdb(path) if path.endswith('.mmdb') else read_range_csv(path)
+    index = GeoIndex.from_frame(ranges)
+    try:
+        index.save(cache)
+    except OSError:
+        pass
+    return index
+
+
+def geo_database_available(path=GEO_DATABASE):
+    return path is not None and os.path.exists(path)
+
+
+def enrich_geo(df, ip_column='destination_ip', path=GEO_DATABASE):
+    """
+    Fill country / region / city from the offline index; values the index
+    does not cover keep what the capture recorded.
+    """
+    located = load_geo_index(path).lookup(df[ip_column])
+    for column in GEO_COLUMNS:
+        if column in df.columns:
+            df[column] = located[column].astype(object).where(located[column] != UNKNOWN, df[column])
+        else:
+            df[column] = located[column].astype(object)
+    return df
@@ -1,45 +1,122 @@
 import os
+
 import pandas as pd
 import plotly.express as px
 
-# Load the data from the CSV file
-root_dir = os.path.dirname(os.path.dirname(os.path.dirname(__file__)))
-csv_path = os.path.join(root_dir, 'network_traffic.csv')
-df = pd.read_csv(csv_path)
-
-# Create a bar chart to show traffic volume by country
-fig = px.bar(df,
-             x='country',
-             y='total_packets',
-             color='country',
-             hover_data=['region', 'city', 'source_ip', 'destination_ip'],
-             title="Network Traffic by Country",
-             labels={
-                 "total_packets": "Total Packets",
-                 "country": "Country"
-             })
-
-# Save the plot as an HTML file
-output_html = 'country_traffic_visualization.html'
-fig.write_html(output_html)
-
-print(f"Plot saved as {output_html}")
-
-
-fig = px.bar(df,
-             x='region',  # You can switch between 'country', 'region', or 'city' as the x-axis
-             y='total_packets',
-             color='country',  # Color code by country
-             hover_data=['country', 'city', 'source_ip', 'destination_ip'],
-             title="Network Traffic by Country, Region, and City",
-             labels={
-                 "total_packets": "Total Packets",
-                 "region": "Region",
-                 "city": "City"
-             })
-
-# Save the plot as an HTML file
-output_html = 'region_city_traffic_visualization.html'
-fig.write_html(output_html)
-
-print(f"Plot saved as {output_html}")
\ No newline at end of file
+from parameters_analysis.aggregation.engine import run_metrics
+from parameters_analysis.aggregation.registry import register_metric
+
+# Aggregates this report needs from the shared engine.  total_packets and
+# total_bytes are running counters per flow in the capture, so a flow's
+# totals are its maxima; summing them per row would count packets many times
+FLOW_KEYS = ['source_ip', 'destination_ip', 'source_port', 'destination_port', 'protocol']
+METRICS = [
+    register_metric('geo_flows', keys=FLOW_KEYS + ['country', 'region', 'city'],
+                    packets=('total_packets', 'max'), bytes=('total_bytes', 'max')),
+    register_metric('geo_traffic_by_hour', keys=['country', 'traffic_hour'],
+                    packets=('packet_size', 'size'), bytes=('packet_size', 'sum')),
+]
+
+# Row-level columns used directly by the plots
+COLUMNS = []
+
+# Bars drawn per chart; the remaining locations are merged into 'Other'
+MAX_BARS = 20
+# Countries drawn as separate lines over time
+MAX_LINES = 6
+OTHER = 'Other'
+
+
+def location_totals(flows, keys):
+    """Bytes, packets, flows and distinct hosts per location, from per-flow totals."""
+    return flows.groupby(keys, sort=False, observed=True).agg(
+        bytes=('bytes', 'sum'),
+        packets=('packets', 'sum'),
+        flows=('packets', 'size'),
+        source_hosts=('source_ip', 'nunique'),
+        destination_hosts=('destination_ip', 'nunique'),
+    ).reset_index()
+
+
+def top_with_other(totals, label, limit=MAX_BARS, metric='bytes'):
+    """Keep the `limit` largest rows by metric and sum the rest into one 'Other' row."""
+    totals = totals.sort_values(metric, ascending=False)
+    if len(totals) <= limit:
+        return totals
+    head, tail = totals.iloc[:limit - 1], totals.iloc[limit - 1:]
+    other = {column: OTHER for column in totals.columns if column not in ('bytes', 'packets', 'flows')}
+    other.update(bytes=tail['bytes'].sum(), packets=tail['packets'].sum(), flows=tail['flows'].sum())
+    # Distinct host counts do not add up across locations; leave them out for 'Other'
+    other.update({column: None for column in ('source_hosts', 'destination_hosts') if column in totals.columns})
+    other[label] = f"{OTHER} ({len(tail)})"
+    return pd.concat([head, pd.DataFrame([other])], ignore_index=True)
+
+
+def render(data, output_dir='.', show=True):
+    flows = data['geo_flows']
+    hover = ['packets', 'flows', 'source_hosts', 'destination_hosts']
+
+    # Create a bar chart to show traffic volume by country
+    countries = top_with_other(location_totals(flows, ['country']), 'country')
+    fig = px.bar(countries,
+                 x='country',
+                 y='bytes',
+                 color='country',
+                 hover_data=hover,
+                 title="Network Traffic by Country",
+                 labels={
+                     "bytes": "Total Bytes",
+                     "country": "Country"
+                 })
+
+    # Save the plot as an HTML file
+    output_html = os.path.join(output_dir, 'country_traffic_visualization.html')
+    fig.write_html(output_html)
+
+    print(f"Plot saved as {output_html}")
+
+    cities = location_totals(flows, ['country', 'region', 'city'])
+    cities['location'] = cities['city'].astype(str) + ', ' + cities['region'].astype(str)
+    cities = top_with_other(cities, 'location')
+    fig = px.bar(cities,
+                 x='location',
+                 y='bytes',
+                 color='country',  # Color code by country
+                 hover_data=['country', 'region', 'city'] + hover,
+                 title="Network Traffic by Country, Region, and City",
+                 labels={
+                     "bytes": "Total Bytes",
+                     "location": "City, Region"
+                 })
+
+    # Save the plot as an HTML file
+    output_html = os.path.join(output_dir, 'region_city_traffic_visualization.html')
+    fig.write_html(output_html)
+
+    print(f"Plot saved as {output_html}")
+
+    # Hourly traffic of the busiest countries
+    hourly = data['geo_traffic_by_hour']
+    busiest = countries['country'].iloc[:MAX_LINES - 1]
+    hourly = hourly.assign(country=hourly['country'].where(hourly['country'].isin(busiest), OTHER))
+    hourly = hourly.groupby(['traffic_hour', 'country'], sort=True).sum().reset_index()
+    fig = px.line(hourly,
+                  x='traffic_hour',
+                  y='bytes',
+                  color='country',
+                  hover_data=['packets'],
+                  markers=True,
+                  title="Network Traffic by Country over Time",
+                  labels={
+                      "bytes": "Bytes per Hour",
+                      "traffic_hour": "Hour"
+                  })
+
+    output_html = os.path.join(output_dir, 'country_traffic_over_time.html')
+    fig.write_html(output_html)
+
+    print(f"Plot saved as {output_html}")
+
+
+if __name__ == '__main__':
+    render(run_metrics(METRICS, COLUMNS))
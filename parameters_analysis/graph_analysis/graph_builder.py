@@ -0,0 +1,333 @@
+import hashlib
+import os
+from collections import OrderedDict
+
+import networkx as nx
+import numpy as np
+import pandas as pd
+from scipy import sparse
+from scipy.sparse.linalg import ArpackError, eigsh
+
+# Layouts are cached on disk next to the dataset, keyed by graph hash; the least
+# recently used files are deleted beyond MAX_STORED_LAYOUTS
+root_dir = os.path.dirname(os.path.dirname(os.path.dirname(__file__)))
+LAYOUT_CACHE_DIR = os.path.join(root_dir, '.layout_cache')
+MAX_STORED_LAYOUTS = 64
+
+# In-process cache so repeated renders in one run skip even the disk read;
+# the least recently used layouts are dropped beyond MAX_CACHED_LAYOUTS
+MAX_CACHED_LAYOUTS = 16
+_layout_cache = OrderedDict()
+
+
+def _cache_layout(key, positions):
+    _layout_cache[key] = positions
+    _layout_cache.move_to_end(key)
+    while len(_layout_cache) > MAX_CACHED_LAYOUTS:
+        _layout_cache.popitem(last=False)
+
+
+def _prune_stored_layouts(cache_dir):
+    # Reads refresh a file's modification time, so the oldest ones are the least recently used
+    paths = [os.path.join(cache_dir, name) for name in os.listdir(cache_dir) if name.endswith('.npz')]
+    paths.sort(key=os.path.getmtime)
+    for path in paths[:max(len(paths) - MAX_STORED_LAYOUTS, 0)]:
+        try:
+            os.remove(path)
+        except OSError:
+            # Removed by another process in the meantime
+            pass
+
+
+def build_edge_list(df, source='source_ip', target='destination_ip', size_column='packet_size',
+                    source_port='source_port', destination_port='destination_port'):
+    """
+    Aggregate packet rows into one row per (source, target) pair with
+    packets/bytes/flows weights and the port sets seen on that edge.
+    """
+    keys = [source, target]
+    grouped = df.groupby(keys, sort=False)
+
+    edges = grouped.size().rename('packets').to_frame()
+    if size_column is not None and size_column in df.columns:
+        edges['bytes'] = grouped[size_column].sum()
+
+    have_ports = source_port in df.columns and destination_port in df.columns
+    if have_ports:
+        # A flow is a distinct port pair on the edge
+        edges['flows'] = df.drop_duplicates(keys + [source_port, destination_port]).groupby(keys).size()
+
+        # Aggregate each port set once over the distinct values only
+        for column, name in ((source_port, 'source_ports'), (destination_port, 'destination_ports')):
+            edges[name] = _join_distinct(df, keys, column)
+
+    edges = edges.reset_index()
+    if have_ports:
+        edges['label'] = edges['source_ports'] + '->' + edges['destination_ports']
+    return edges
+
+
+def _join_distinct(df, keys, column):
+    # Sort once so every group is a contiguous, ordered slice, then join slices
+    distinct = df[keys + [column]].drop_duplicates().sort_values(keys + [column])
+    values = distinct[column].astype(str).tolist()
+    boundaries = np.flatnonzero(distinct[keys].ne(distinct[keys].shift()).any(axis=1).to_numpy())
+    ends = np.append(boundaries[1:], len(values))
+    index = pd.MultiIndex.from_frame(distinct[keys].iloc[boundaries])
+    return pd.Series([','.join(values[a:b]) for a, b in zip(boundaries, ends)], index=index)
+
+
+def build_graph(edges, source='source_ip', target='destination_ip'):
+    """Build a DiGraph from an edge list in one bulk call."""
+    return nx.from_pandas_edgelist(edges, source, target, edge_attr=True, create_using=nx.DiGraph)
+
+
+def graph_hash(edges, source='source_ip', target='destination_ip', weight=None):
+    """Stable hash of the edge structure (and weights if given)."""
+    columns = [source, target] + ([weight] if weight else [])
+    ordered = edges[columns].sort_values([source, target]).astype(str)
+    digest = hashlib.sha1(pd.util.hash_pandas_object(ordered, index=False).values.tobytes())
+    return digest.hexdigest()
+
+
+def compute_layout(edges, source='source_ip', target='destination_ip', weight='packets',
+                   method='force', iterations=50, seed=42, use_cache=True, cache_dir=LAYOUT_CACHE_DIR):
+    """
+    Return {node: (x, y)} for the graph described by edges.
+
+    method='spectral'     -> sparse Laplacian eigenvectors (O(E) per solver iteration)
+    method='force'        -> spectral start refined by ForceAtlas-style iterations
+                             with grid-approximated repulsion (O(N + E) per iteration)
+    method='hierarchical' -> sources / mixed / destinations in three layers
+
+    Results are cached in memory and on disk keyed by graph hash and parameters.
+    """
+    weight = weight if weight in edges.columns else None
+    key = f"{graph_hash(edges, source, target, weight)}-{method}-{iterations}-{seed}"
+
+    if use_cache and key in _layout_cache:
+        _layout_cache.move_to_end(key)
+        return _layout_cache[key]
+
+    cache_path = os.path.join(cache_dir, f"{key}.npz")
+    if use_cache and os.path.exists(cache_path):
+        try:
+            with np.load(cache_path, allow_pickle=False) as cached:
+                positions = dict(zip(cached['nodes'].tolist(), map(tuple, cached['positions'])))
+        except (OSError, ValueError):
+            # Truncated, or written with pickled nodes by an older version: computed again below
+            positions = None
+        if positions is not None:
+            os.utime(cache_path)
+            _cache_layout(key, positions)
+            return positions
+
+    nodes, src, dst = _edge_arrays(edges, source, target)
+    w = edges[weight].to_numpy(dtype=float) if weight else np.ones(len(src))
+
+    if method == 'spectral':
+        coords = _spectral_coords(len(nodes), src, dst, w, seed)
+    elif method == 'force':
+        coords = _spectral_coords(len(nodes), src, dst, w, seed)
+        coords = _force_refine(coords, src, dst, w, iterations)
+    elif method == 'hierarchical':
+        coords = _hierarchical_coords(len(nodes), src, dst, w)
+    else:
+        raise ValueError(f"Unknown layout method: {method}")
+
+    positions = dict(zip(nodes, map(tuple, coords)))
+    if use_cache:
+        _cache_layout(key, positions)
+        stored = np.asarray(nodes)
+        # Plain string or number arrays only; nodes of mixed types are not stored
+        if stored.dtype != object:
+            os.makedirs(cache_dir, exist_ok=True)
+            np.savez(cache_path, nodes=stored, positions=coords)
+            _prune_stored_layouts(cache_dir)
+    return positions
+
+
+def _edge_arrays(edges, source, target):
+    # Integer node ids shared by both endpoint columns
+    codes, nodes = pd.factorize(pd.concat([edges[source], edges[target]], ignore_index=True))
+    return list(nodes), codes[:len(edges)], codes[len(edges):]
+
+
+def _adjacency(n, src, dst, w):
+    # Symmetric weighted adjacency; log-scaled so heavy edges do not dominate
+    w = np.log1p(w)
+    adjacency = sparse.coo_matrix((w, (src, dst)), shape=(n, n)).tocsr()
+    return adjacency + adjacency.T
+
+
+def _spectral_coords(n, src, dst, w, seed):
+    rng = np.random.default_rng(seed)
+    if n < 4:
+        return rng.random((n, 2))
+
+    adjacency = _adjacency(n, src, dst, w)
+    degree = np.asarray(adjacency.sum(axis=1)).ravel()
+    # Nodes whose edges all weigh 0 are left unconnected instead of dividing by zero
+    inv_sqrt = np.where(degree > 0, 1.0 / np.sqrt(np.maximum(degree, 1e-300)), 0.0)
+    normalized = sparse.diags(inv_sqrt) @ adjacency @ sparse.diags(inv_sqrt)
+
+    try:
+        # Largest eigenvectors of D^-1/2 A D^-1/2 are the smallest of the
+        # normalized Laplacian; only sparse mat-vecs, no factorization
+        _, vectors = eigsh(normalized, k=3, which='LA', tol=1e-3, maxiter=n, v0=rng.random(n))
+        coords = vectors[:, :2] * inv_sqrt[:, None]
+    except (ArpackError, np.linalg.LinAlgError):
+        # No convergence (e.g. many equal-sized components): fall back to random
+        coords = rng.random((n, 2))
+
+    # Jitter separates nodes that land on the same spot (disconnected components)
+    coords = _normalize(coords)
+    return _normalize(coords + rng.normal(scale=1e-2, size=coords.shape))
+
+
+def _force_refine(coords, src, dst, w, iterations, grid_size=8):
+    n = len(coords)
+    if n < 2:
+        return coords
+
+    w = np.log1p(w)
+    degree = np.bincount(src, minlength=n) + np.bincount(dst, minlength=n) + 1.0
+    k = 1.0 / np.sqrt(n)
+    cells_total = grid_size ** 2
+
+    for step in range(iterations):
+        # Attraction along edges (linear, as in ForceAtlas2)
+        pull = (coords[dst] - coords[src]) * w[:, None]
+        displacement = np.column_stack([
+            np.bincount(src, weights=pull[:, axis], minlength=n) - np.bincount(dst, weights=pull[:, axis], minlength=n)
+            for axis in range(2)
+        ])
+
+        # Repulsion from grid cell centroids instead of every other node
+        cells = np.clip((coords * grid_size).astype(int), 0, grid_size - 1)
+        cell_id = cells[:, 0] * grid_size + cells[:, 1]
+        mass = np.bincount(cell_id, weights=degree, minlength=cells_total)
+        occupied = np.flatnonzero(mass)
+        centroids = np.column_stack([
+            np.bincount(cell_id, weights=degree * coords[:, axis], minlength=cells_total)[occupied]
+            for axis in range(2)
+        ]) / mass[occupied, None]
+        for centroid, cell_mass in zip(centroids, mass[occupied]):
+            away = coords - centroid
+            distance2 = (away ** 2).sum(axis=1, keepdims=True) + k ** 2
+            displacement += away * (cell_mass * degree[:, None] * k ** 2 / distance2)
+
+        # Cooling schedule bounds the step length
+        temperature = 0.1 * (1 - step / iterations)
+        length = np.linalg.norm(displacement, axis=1, keepdims=True) + 1e-9
+        coords = _normalize(coords + displacement / length * np.minimum(length, temperature))
+
+    return coords
+
+
+def _hierarchical_coords(n, src, dst, w):
+    out_weight = np.bincount(src, weights=w, minlength=n)
+    in_weight = np.bincount(dst, weights=w, minlength=n)
+
+    # Layer 0: only send, layer 2: only receive, layer 1: both
+    layer = np.where(in_weight == 0, 0, np.where(out_weight == 0, 2, 1))
+
+    coords = np.zeros((n, 2))
+    coords[:, 0] = layer / 2.0
+    for value in range(3):
+        members = np.flatnonzero(layer == value)
+        # Busiest hosts at the top of each layer
+        order = members[np.argsort(-(in_weight + out_weight)[members], kind='stable')]
+        coords[order, 1] = 1 - (np.arange(len(order)) + 0.5) / max(len(order), 1)
+    return coords
+
+
+def _normalize(coords):
+    low = coords.min(axis=0)
+    span = coords.max(axis=0) - low
+    span[span == 0] = 1
+    return (coords - low) / span
+
+
+def to_pyvis(edges, positions=None, source='source_ip', target='destination_ip', title='label',
+             value='packets', **network_options):
+    """
+    Build a pyvis Network through its public API: all nodes (with their
+    precomputed positions) in one add_nodes call, then one add_edge per
+    edge row, which also carries the edge's title and value.
+    """
+    from pyvis.network import Network
+
+    options = dict(height="750px", width="100%", bgcolor="#222222", font_color="white", directed=True)
+    options.update(network_options)
+    net = Network(**options)
+
+    nodes = pd.unique(pd.concat([edges[source], edges[target]], ignore_index=True)).tolist()
+    node_options = {'label': [str(node) for node in nodes]}
+    if positions is not None:
+        # vis.js uses pixel coordinates
+        coords = np.array([positions[node] for node in nodes], dtype=float).reshape(-1, 2) * 1000
+        node_options.update(x=coords[:, 0].tolist(), y=coords[:, 1].tolist())
+    net.add_nodes(nodes, **node_options)
+
+    titles = edges[title].astype(str) if title in edges.columns else [None] * len(edges)
+    values = edges[value].tolist() if value in edges.columns else [None] * len(edges)
+    for frm, to, edge_title, edge_value in zip(edges[source].tolist(), edges[target].tolist(), titles, values):
+        edge = {}
+        if edge_title is not None:
+            edge['title'] = edge_title
+        if edge_value is not None:
+            edge['value'] = edge_value
+        net.add_edge(frm, to, **edge)
+
+    if positions is not None:
+        # Positions are precomputed, so skip the in-browser physics simulation
+        net.toggle_physics(False)
+    return net
+
+
+def to_plotly(edges, positions, source='source_ip', target='destination_ip', title='label'):
+    """Edge and node traces for a Plotly figure, built from arrays in one pass."""
+    import plotly.graph_objects as go
+
+    nodes = list(positions)
+    coords = np.array([positions[node] for node in nodes])
+    index = {node: i for i, node in enumerate(nodes)}
+    src = edges[source].map(index).to_numpy()
+    dst = edges[target].map(index).to_numpy()
+
+    # Each edge is [start, end, None] so Plotly draws separate segments
+    segments = np.full((len(edges), 3, 2), np.nan)
+    segments[:, 0] = coords[src]
+    segments[:, 1] = coords[dst]
+    segments = segments.reshape(-1, 2)
+
+    edge_trace = go.Scatter(
+        x=segments[:, 0], y=segments[:, 1],
+        mode='lines',
+        line=dict(width=0.5, color='gray'),
+        hoverinfo='none',
+        name='Edges'
+    )
+
+    # Edge details are shown on invisible markers at the edge midpoints
+    midpoints = (coords[src] + coords[dst]) / 2
+    edge_hover = go.Scatter(
+        x=midpoints[:, 0], y=midpoints[:, 1],
+        mode='markers',
+        marker=dict(size=2, opacity=0),
+        hoverinfo='text',
+        text=edges[title].astype(str) if title in edges.columns else None,
+        name='Edge details'
+    )
+
+    node_trace = go.Scatter(
+        x=coords[:, 0], y=coords[:, 1],
+        mode='markers+text',
+        marker=dict(size=10, color='lightblue'),
+        text=[f"Node: {node}" for node in nodes],
+        textposition="bottom center",
+        hoverinfo='text',
+        name='Nodes'
+    )
+    return [edge_trace, edge_hover, node_trace]
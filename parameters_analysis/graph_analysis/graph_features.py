@@ -0,0 +1,200 @@
+import numpy as np
+import pandas as pd
+from scipy import sparse
+from scipy.sparse.csgraph import connected_components
+
+
+class HostGraph:
+    """
+    Directed host communication graph held as CSR adjacency arrays.
+    Node i is hosts[i]; packets[i, j] and bytes[i, j] are summed over all
+    rows from hosts[i] to hosts[j].
+    """
+
+    def __init__(self, hosts, packets, bytes_):
+        self.hosts = np.asarray(hosts, dtype=object)
+        self.packets = packets.tocsr()
+        self.bytes = bytes_.tocsr()
+
+    @property
+    def size(self):
+        return len(self.hosts)
+
+    def structure(self):
+        """0/1 adjacency (one entry per distinct directed peer pair)."""
+        adjacency = self.packets.copy()
+        adjacency.data = np.ones_like(adjacency.data)
+        return adjacency
+
+
+def build_host_graph(df, source='source_ip', target='destination_ip', size_column='packet_size', hosts=None):
+    """
+    Build a HostGraph from packet rows.  Pass hosts to force a fixed node
+    order, e.g. to compare the graphs of two datasets index by index.
+    """
+    if hosts is None:
+        hosts = pd.unique(pd.concat([df[source], df[target]], ignore_index=True))
+    index = pd.Index(hosts)
+    src = index.get_indexer(df[source])
+    dst = index.get_indexer(df[target])
+    n = len(index)
+
+    # Duplicate (src, dst) entries are summed when converting to CSR
+    packets = sparse.coo_matrix((np.ones(len(src)), (src, dst)), shape=(n, n))
+    if size_column in df.columns:
+        sizes = df[size_column].to_numpy(dtype=float)
+    else:
+        sizes = np.zeros(len(src))
+    bytes_ = sparse.coo_matrix((sizes, (src, dst)), shape=(n, n))
+
+    return HostGraph(index.to_numpy(), packets, bytes_)
+
+
+def degrees(graph):
+    """Per-host in/out degree, distinct peers and packet/byte volumes."""
+    adjacency = graph.structure()
+    out_degree = np.diff(adjacency.indptr)
+    in_degree = np.bincount(adjacency.indices, minlength=graph.size)
+
+    # Peers in either direction: out and in neighbours, counting mutual ones once
+    undirected = adjacency + adjacency.T
+    distinct_peers = np.diff(undirected.tocsr().indptr)
+
+    return pd.DataFrame({
+        'out_degree': out_degree,
+        'in_degree': in_degree,
+        'distinct_peers': distinct_peers,
+        'packets_sent': np.asarray(graph.packets.sum(axis=1)).ravel(),
+        'packets_received': np.asarray(graph.packets.sum(axis=0)).ravel(),
+        'bytes_sent': np.asarray(graph.bytes.sum(axis=1)).ravel(),
+        'bytes_received': np.asarray(graph.bytes.sum(axis=0)).ravel(),
+    }, index=pd.Index(graph.hosts, name='host'))
+
+
+def pagerank(graph, damping=0.85, tol=1e-8, max_iter=100, weighted=True):
+    """Power-iteration PageRank on the CSR adjacency (packet-weighted by default)."""
+    n = graph.size
+    if n == 0:
+        return np.array([])
+
+    adjacency = graph.packets if weighted else graph.structure()
+    out_weight = np.asarray(adjacency.sum(axis=1)).ravel()
+    dangling = out_weight == 0
+
+    # Row-normalize once; transition.T @ rank spreads each host's rank to its peers
+    scale = np.divide(1.0, out_weight, out=np.zeros(n), where=~dangling)
+    transition_t = (sparse.diags(scale) @ adjacency).T.tocsr()
+
+    rank = np.full(n, 1.0 / n)
+    for _ in range(max_iter):
+        previous = rank
+        rank = damping * (transition_t @ rank + rank[dangling].sum() / n) + (1 - damping) / n
+        if np.abs(rank - previous).sum() < n * tol:
+            break
+    return rank
+
+
+def components(graph):
+    """Weakly connected component id per host."""
+    _, labels = connected_components(graph.structure(), directed=True, connection='weak')
+    return labels
+
+
+def communities(graph, max_iter=20, seed=42):
+    """
+    Label propagation communities: every host repeatedly adopts the label
+    carrying the most packet weight among its neighbours.  Each round is a
+    sparse matrix product, so the cost per round is O(edges).
+    """
+    n = graph.size
+    if n == 0:
+        return np.array([], dtype=np.int64)
+
+    rng = np.random.default_rng(seed)
+    undirected = (graph.packets + graph.packets.T).tocsr()
+    undirected.data = np.log1p(undirected.data)
+    labels = np.arange(n)
+
+    for _ in range(max_iter):
+        # votes[i, l] = weight of i's neighbours currently labelled l
+        one_hot = sparse.csr_matrix((np.ones(n), (np.arange(n), labels)), shape=(n, n))
+        # Tiny random tie-breaking keeps the process from oscillating
+        votes = (undirected @ one_hot).tocsr()
+        votes.data = votes.data + rng.random(len(votes.data)) * 1e-6
+
+        has_neighbours = np.diff(votes.indptr) > 0
+        new_labels = labels.copy()
+        new_labels[has_neighbours] = np.asarray(votes[has_neighbours].argmax(axis=1)).ravel()
+        if np.array_equal(new_labels, labels):
+            break
+        labels = new_labels
+
+    # Renumber to consecutive ids
+    return pd.factorize(labels)[0]
+
+
+def fan_out_bursts(df, source='source_ip', target='destination_ip', time_column='temporal_patterns', window='1min'):
+    """
+    Distinct destinations contacted per source host per time window,
+    summarized as the peak and mean burst size.
+    """
+    timestamps = pd.to_datetime(df[time_column])
+    buckets = pd.DataFrame({
+        'host': df[source].to_numpy(),
+        'window': timestamps.dt.floor(window).to_numpy(),
+        'peer': df[target].to_numpy(),
+    }).drop_duplicates()
+
+    per_window = buckets.groupby(['host', 'window']).size()
+    per_host = per_window.groupby(level='host')
+    return pd.DataFrame({
+        'max_fan_out': per_host.max(),
+        'mean_fan_out': per_host.mean(),
+        'active_windows': per_host.size(),
+    })
+
+
+def host_graph_features(df, source='source_ip', target='destination_ip', size_column='packet_size',
+                        time_column='temporal_patterns', burst_window='1min', hosts=None):
+    """
+    One row of graph features per host, indexed by host address, ready to be
+    joined onto packet rows by source_ip or destination_ip.
+    """
+    graph = build_host_graph(df, source, target, size_column, hosts=hosts)
+
+    features = degrees(graph)
+    features['pagerank'] = pagerank(graph)
+    features['component'] = components(graph)
+    features['community'] = communities(graph)
+    features['component_size'] = features.groupby('component')['component'].transform('size')
+    features['community_size'] = features.groupby('community')['community'].transform('size')
+
+    if time_column in df.columns:
+        bursts = fan_out_bursts(df, source, target, time_column, burst_window)
+        features = features.join(bursts)
+        features[bursts.columns] = features[bursts.columns].fillna(0)
+
+    return features
+
+
+def windowed_host_graph_features(df, window='1h', time_column='temporal_patterns', **kwargs):
+    """
+    Time-windowed snapshots: host_graph_features computed separately over the
+    rows of each window, indexed by (window, host).
+    """
+    windows = pd.to_datetime(df[time_column]).dt.floor(window)
+
+    snapshots = []
+    for start, rows in df.groupby(windows.to_numpy(), sort=True):
+        snapshot = host_graph_features(rows, time_column=time_column, **kwargs)
+        snapshot.insert(0, 'window', start)
+        snapshots.append(snapshot)
+
+    if not snapshots:
+        return pd.DataFrame()
+    return pd.concat(snapshots).reset_index().set_index(['window', 'host'])
+
+
+def join_host_features(df, features, on='source_ip', prefix='src_'):
+    """Attach per-host features to packet rows, e.g. for training_model.py."""
+    return df.join(features.add_prefix(prefix), on=on)
@@ -0,0 +1,106 @@
+import threading
+import time
+from collections import Counter
+
+import numpy as np
+
+# Packet size histogram: 100-byte bins up to the Ethernet MTU, last bin collects jumbo frames
+SIZE_BIN_WIDTH = 100
+SIZE_BINS = 16
+
+
+class SpaceSaving:
+    """
+    Approximate heavy hitters in fixed memory (Metwally et al.'s Space-Saving):
+    at most `capacity` counters; a new item evicts the smallest counter and
+    inherits its count, so the top items' counts are overestimated by at most
+    the evicted count.
+    """
+
+    def __init__(self, capacity=200):
+        self.capacity = capacity
+        self.counts = {}
+        self.bytes = {}
+
+    def add(self, item, size):
+        if item in self.counts:
+            self.counts[item] += 1
+            self.bytes[item] += size
+            return
+        if len(self.counts) >= self.capacity:
+            evicted = min(self.counts, key=self.counts.get)
+            floor = self.counts.pop(evicted)
+            del self.bytes[evicted]
+        else:
+            floor = 0
+        self.counts[item] = floor + 1
+        self.bytes[item] = size
+
+    def top(self, k=10):
+        items = sorted(self.counts, key=self.counts.get, reverse=True)[:k]
+        return [(item, self.counts[item], self.bytes[item]) for item in items]
+
+
+class LiveAggregates:
+    """
+    Dashboard state updated from every captured row: top flows, protocol mix,
+    flow direction split, packet size histogram and packets per second over
+    the last minute.  Every structure is bounded, so a snapshot costs the
+    same after an hour of capture as after a minute.  Used as a capture row
+    observer; safe to read from the server threads while the capture writes.
+    """
+
+    def __init__(self, top_flows=10, flow_capacity=200, rate_seconds=60):
+        self.lock = threading.Lock()
+        self.top_flows = top_flows
+        self.flows = SpaceSaving(flow_capacity)
+        self.protocols = Counter()
+        self.directions = Counter()
+        self.sizes = np.zeros(SIZE_BINS, dtype=np.int64)
+        # Packets per second in a ring indexed by second modulo rate_seconds
+        self.rate_seconds = rate_seconds
+        self.rates = np.zeros(rate_seconds, dtype=np.int64)
+        self.rate_second = np.full(rate_seconds, -1, dtype=np.int64)
+        self.packets = 0
+        self.bytes = 0
+        self.started = time.time()
+
+    def observe(self, row, timestamp):
+        """Row observer: row is a dict of capture fields, timestamp its capture time."""
+        size = int(row['packet_size'])
+        flow = f"{row['source_ip']}:{row['source_port']} -> {row['destination_ip']}:{row['destination_port']}"
+        second = int(timestamp)
+        slot = second % self.rate_seconds
+
+        with self.lock:
+            self.packets += 1
+            self.bytes += size
+            self.flows.add(flow, size)
+            self.protocols[row['protocol']] += 1
+            self.directions[row['flow_direction']] += 1
+            self.sizes[min(size // SIZE_BIN_WIDTH, SIZE_BINS - 1)] += 1
+            if self.rate_second[slot] != second:
+                self.rate_second[slot] = second
+                self.rates[slot] = 0
+            self.rates[slot] += 1
+
+    def snapshot(self, now=None):
+        """JSON-serialisable view of the current aggregates."""
+        now = now if now is not None else time.time()
+        second = int(now)
+        seconds = np.arange(second - self.rate_seconds + 1, second + 1)
+        with self.lock:
+            slots = seconds % self.rate_seconds
+            rates = np.where(self.rate_second[slots] == seconds, self.rates[slots], 0)
+            return {
+                'time': now,
+                'packets': self.packets,
+                'bytes': self.bytes,
+                'uptime': max(now - self.started, 0),
+                'top_flows': [{'flow': flow, 'packets': packets, 'bytes': size}
+                              for flow, packets, size in self.flows.top(self.top_flows)],
+                'protocols': dict(self.protocols),
+                'directions': dict(self.directions),
+                'sizes': {'bin_width': SIZE_BIN_WIDTH, 'counts': self.sizes.tolist()},
+                'rate': {'start': int(seconds[0]), 'counts': rates.tolist()},
+            }
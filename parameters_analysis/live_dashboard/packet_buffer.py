@@ -0,0 +1,159 @@
+import socket
+import struct
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+
+from parameters_analysis.cidr_analysis.cidr_tree import int_to_ip
+
+# One packet header: 30 bytes, so the default buffer takes ~15 MB
+PACKET_DTYPE = np.dtype([
+    ('timestamp', 'f8'),
+    ('source_ip', 'u4'),
+    ('destination_ip', 'u4'),
+    ('source_port', 'u2'),
+    ('destination_port', 'u2'),
+    ('protocol', 'u1'),
+    ('tcp_flags', 'u1'),
+    ('packet_size', 'u4'),
+    ('payload_size', 'u4'),
+])
+
+PROTOCOL_NUMBERS = {'TCP': 6, 'UDP': 17}
+PROTOCOL_NAMES = {number: name for name, number in PROTOCOL_NUMBERS.items()}
+# Label of stored packets of any other protocol (number 0)
+OTHER_PROTOCOL = 'Other'
+
+# Upper bound on rows returned by one query
+MAX_RESULTS = 10000
+
+
+def pack_ip(ip):
+    return struct.unpack('!I', socket.inet_aton(ip))[0]
+
+
+def protocol_number(name):
+    """Stored number of a protocol name (case-insensitive); unknown names are rejected."""
+    if name.upper() == OTHER_PROTOCOL.upper():
+        return 0
+    if name.upper() not in PROTOCOL_NUMBERS:
+        raise ValueError(f"Unknown protocol '{name}'; expected one of {list(PROTOCOL_NUMBERS) + [OTHER_PROTOCOL]}")
+    return PROTOCOL_NUMBERS[name.upper()]
+
+
+class PacketRingBuffer:
+    """
+    The most recent `capacity` packet headers in one preallocated structured
+    array.  Appends overwrite the oldest slot, so memory is fixed up front;
+    queries filter the array in place with vectorised masks and never touch
+    the disk.  Rows are stored in capture order, so each of the (at most two)
+    contiguous runs of the ring is sorted by time and a time range is located
+    with a binary search before any filtering.
+    """
+
+    def __init__(self, capacity=500000):
+        self.capacity = capacity
+        self.packets = np.zeros(capacity, dtype=PACKET_DTYPE)
+        self.position = 0
+        self.count = 0
+        self.lock = threading.Lock()
+
+    def __len__(self):
+        return min(self.count, self.capacity)
+
+    def append(self, timestamp, source_ip, destination_ip, source_port, destination_port, protocol,
+               packet_size, payload_size, tcp_flags=0):
+        record = (timestamp, pack_ip(source_ip), pack_ip(destination_ip), source_port, destination_port,
+                  PROTOCOL_NUMBERS.get(protocol, 0), tcp_flags, packet_size, payload_size)
+        with self.lock:
+            self.packets[self.position] = record
+            self.position = (self.position + 1) % self.capacity
+            self.count += 1
+
+    def _runs(self):
+        # Oldest run first
+        if self.count <= self.capacity:
+            return [(0, self.count)]
+        return [(self.position, self.capacity), (0, self.position)]
+
+    def query(self, ip=None, port=None, protocol=None, start=None, end=None, limit=1000):
+        """
+        Packets matching every given filter, oldest first: ip / port match
+        either side of the flow, start / end are epoch seconds (inclusive,
+        exclusive).  Returns a copy of at most `limit` rows (the most recent).
+        """
+        number = protocol_number(protocol) if protocol is not None else None
+        with self.lock:
+            matches = []
+            for first, last in self._runs():
+                times = self.packets['timestamp'][first:last]
+                lo = first + (np.searchsorted(times, start, side='left') if start is not None else 0)
+                hi = first + (np.searchsorted(times, end, side='left') if end is not None else len(times))
+                rows = self.packets[lo:hi]
+                mask = np.ones(len(rows), dtype=bool)
+                if ip is not None:
+                    packed = pack_ip(ip)
+                    mask &= (rows['source_ip'] == packed) | (rows['destination_ip'] == packed)
+                if port is not None:
+                    mask &= (rows['source_port'] == port) | (rows['destination_port'] == port)
+                if number is not None:
+                    mask &= rows['protocol'] == number
+                matches.append(rows[mask])
+            result = np.concatenate(matches) if matches else np.zeros(0, dtype=PACKET_DTYPE)
+        return result[-limit:] if limit else result[:0]
+
+    def query_params(self, params):
+        """Dashboard route: query string parameters -> list of packet dicts."""
+        try:
+            start = _seconds(params.get('start'))
+            end = _seconds(params.get('end'))
+            if 'last' in params:
+                start = time.time() - float(params['last'])
+            port = int(params['port']) if 'port' in params else None
+            limit = min(int(params.get('limit', 1000)), MAX_RESULTS)
+            ip = params.get('ip')
+            if ip is not None:
+                pack_ip(ip)
+            protocol = params.get('protocol')
+            if protocol is not None:
+                protocol_number(protocol)
+        except (OSError, ValueError) as error:
+            raise ValueError(f"Invalid query: {error}")
+        return to_records(self.query(ip, port, protocol, start, end, limit))
+
+
+def _seconds(value):
+    if value is None:
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        return pd.Timestamp(value).timestamp()
+
+
+def to_records(packets):
+    """Structured rows -> JSON-friendly dicts with dotted-quad IPs and protocol names."""
+    source_ips = int_to_ip(packets['source_ip'])
+    destination_ips = int_to_ip(packets['destination_ip'])
+    return [{
+        'timestamp': float(packet['timestamp']),
+        'source_ip': source_ip,
+        'destination_ip': destination_ip,
+        'source_port': int(packet['source_port']),
+        'destination_port': int(packet['destination_port']),
+        'protocol': PROTOCOL_NAMES.get(int(packet['protocol']), OTHER_PROTOCOL),
+        'tcp_flags': int(packet['tcp_flags']),
+        'packet_size': int(packet['packet_size']),
+        'payload_size': int(packet['payload_size']),
+    } for packet, source_ip, destination_ip in zip(packets, source_ips, destination_ips)]
+
+
+def to_frame(packets):
+    """Structured rows -> DataFrame in the capture CSV's column names."""
+    df = pd.DataFrame(packets)
+    df['source_ip'] = int_to_ip(packets['source_ip'])
+    df['destination_ip'] = int_to_ip(packets['destination_ip'])
+    df['protocol'] = df['protocol'].map(PROTOCOL_NAMES).fillna(OTHER_PROTOCOL)
+    return df
@@ -0,0 +1,157 @@
+import json
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+# Seconds between two pushes to the browser
+REFRESH_INTERVAL = 1.0
+# Port of the dashboard; set DASHBOARD_PORT when 8050 is taken
+DASHBOARD_PORT = int(os.environ.get('DASHBOARD_PORT', 8050))
+
+DASHBOARD_PAGE = """<!DOCTYPE html>
+<html>
+<head>
+<meta charset="utf-8">
+<title>Live Network Traffic</title>
+<script src="/plotly.js"></script>
+<style>
+  body { font-family: sans-serif; margin: 16px; }
+  .grid { display: grid; grid-template-columns: 1fr 1fr; gap: 8px; }
+  .chart { height: 340px; }
+  #totals { font-size: 14px; color: #444; }
+</style>
+</head>
+<body>
+<h2>Live Network Traffic</h2>
+<div id="totals">Waiting for capture data...</div>
+<div class="grid">
+  <div id="rate" class="chart"></div>
+  <div id="flows" class="chart"></div>
+  <div id="protocols" class="chart"></div>
+  <div id="directions" class="chart"></div>
+  <div id="sizes" class="chart"></div>
+</div>
+<script>
+function pie(id, title, counts) {
+  Plotly.react(id, [{type: 'pie', labels: Object.keys(counts), values: Object.values(counts), hole: 0.4}],
+               {title: title, margin: {t: 40, b: 10}});
+}
+const source = new EventSource('/events');
+source.onmessage = function (event) {
+  const data = JSON.parse(event.data);
+  document.getElementById('totals').textContent =
+    `${data.packets} packets, ${data.bytes} bytes captured in ${Math.round(data.uptime)} s`;
+  Plotly.react('rate', [{type: 'scatter', mode: 'lines', fill: 'tozeroy',
+                          x: data.rate.counts.map((_, i) => new Date((data.rate.start + i) * 1000)),
+                          y: data.rate.counts}],
+               {title: 'Packets per Second (last minute)', margin: {t: 40}});
+  const flows = data.top_flows.slice().reverse();
+  Plotly.react('flows', [{type: 'bar', orientation: 'h', x: flows.map(f => f.packets), y: flows.map(f => f.flow),
+                           text: flows.map(f => `${f.bytes} bytes`)}],
+               {title: 'Top Flows (packets)', margin: {t: 40, l: 260}});
+  pie('protocols', 'Protocol Mix', data.protocols);
+  pie('directions', 'Flow Direction', data.directions);
+  const width = data.sizes.bin_width;
+  Plotly.react('sizes', [{type: 'bar', x: data.sizes.counts.map((_, i) => `${i * width}-${(i + 1) * width}`),
+                           y: data.sizes.counts}],
+               {title: 'Packet Size Distribution (bytes)', margin: {t: 40}});
+};
+</script>
+</body>
+</html>
+"""
+
+
+class DashboardServer(ThreadingHTTPServer):
+    """
+    Local HTTP server for the live dashboard.  GET / serves the page, /events
+    streams aggregate snapshots as Server-Sent Events every refresh_interval
+    seconds, and further JSON endpoints can be registered with add_route().
+    """
+
+    daemon_threads = True
+
+    def __init__(self, aggregates, host='127.0.0.1', port=DASHBOARD_PORT, refresh_interval=REFRESH_INTERVAL):
+        super().__init__((host, port), DashboardHandler)
+        self.aggregates = aggregates
+        self.refresh_interval = refresh_interval
+        self.routes = {'/snapshot': lambda params: aggregates.snapshot()}
+        self._plotly_js = None
+
+    def add_route(self, path, func):
+        """Serve func(query parameters) as JSON at path."""
+        self.routes[path] = func
+
+    @property
+    def plotly_js(self):
+        # Served locally so the dashboard works without internet access
+        if self._plotly_js is None:
+            from plotly.offline import get_plotlyjs
+            self._plotly_js = get_plotlyjs().encode()
+        return self._plotly_js
+
+
+class DashboardHandler(BaseHTTPRequestHandler):
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        if url.path == '/':
+            self.send_body(DASHBOARD_PAGE.encode(), 'text/html; charset=utf-8')
+        elif url.path == '/plotly.js':
+            self.send_body(self.server.plotly_js, 'application/javascript')
+        elif url.path == '/events':
+            self.stream_events()
+        elif url.path in self.server.routes:
+            params = {name: values[-1] for name, values in parse_qs(url.query).items()}
+            try:
+                result = self.server.routes[url.path](params)
+            except ValueError as error:
+                self.send_body(json.dumps({'error': str(error)}).encode(), 'application/json', status=400)
+                return
+            self.send_body(json.dumps(result, default=str).encode(), 'application/json')
+        else:
+            self.send_error(404)
+
+    def send_body(self, body, content_type, status=200):
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def stream_events(self):
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/event-stream')
+        self.send_header('Cache-Control', 'no-cache')
+        self.end_headers()
+        try:
+            while True:
+                snapshot = json.dumps(self.server.aggregates.snapshot())
+                self.wfile.write(f"data: {snapshot}\n\n".encode())
+                self.wfile.flush()
+                time.sleep(self.server.refresh_interval)
+        except (BrokenPipeError, ConnectionResetError):
+            # Browser tab closed
+            return
+
+    def log_message(self, format, *args):
+        # Keep the capture's console output readable
+        pass
+
+
+def start_dashboard(aggregates, host='127.0.0.1', port=DASHBOARD_PORT, refresh_interval=REFRESH_INTERVAL):
+    """
+    Serve the dashboard from a background thread; returns the server, or
+    None when the port cannot be bound (the capture goes on without it).
+    """
+    try:
+        server = DashboardServer(aggregates, host, port, refresh_interval)
+    except OSError as error:
+        print(f"Live dashboard disabled, cannot listen on {host}:{port} ({error}); set DASHBOARD_PORT to another port")
+        return None
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    print(f"Live dashboard at http://{host}:{server.server_address[1]}/")
+    return server
@@ -1,86 +1,112 @@
 import os
-import socket
 
 import pandas as pd
 import matplotlib.pyplot as plt
 import seaborn as sns
 import plotly.express as px
 
-# Load the data from the CSV file
-root_dir = os.path.dirname(os.path.dirname(os.path.dirname(__file__)))
-csv_path = os.path.join(root_dir, 'network_traffic.csv')
-df = pd.read_csv(csv_path)
-
-# Display basic statistics about the dataset
-print(df.describe())
-
-# Check for missing values
-print(df.isnull().sum())
-
-# Display unique protocols
-print("Unique Protocols:", df['protocol'].unique())
-
-# Set the style of the visualizations
-sns.set(style="whitegrid")
-
-# Plot the distribution of protocols
-plt.figure(figsize=(10, 6))
-sns.countplot(x='protocol', data=df)
-plt.title('Protocol Distribution')
-plt.xlabel('Protocol')
-plt.ylabel('Count')
-plt.show()
-
-
-## ---------------------------------  HeatMap ----------------------- ###
-
-# Step 2: Prepare the data
-df_grouped = df.groupby(['source_ip', 'protocol', 'destination_ip']).size().reset_index(name='count')
-
-# Step 3: Create a Sunburst chart
-fig = px.sunburst(
-    df_grouped,
-    path=['source_ip', 'protocol', 'destination_ip'],  # Hierarchical path
-    values='count',  # Size of each segment
-    color='protocol',  # Color by protocol
-    title="Network Traffic Visualization (Source IP → Protocol → Destination IP)"
-)
-
-# Step 4: Save as HTML
-fig.write_html("network_traffic_sunburst.html")
-
-# Display the figure
-fig.show()
-
-
-###### ------------ TreeMap ----------------------- ############
-
-# Step 2: Define the function to get domain names
-def get_domain(ip):
-    try:
-        domain = socket.gethostbyaddr(ip)[0]
-    except socket.herror:
-        domain = "Unknown"
-    return domain
-
-# Step 3: Replace IP addresses with domain names and include IP in brackets
-df['source_ip'] = df['source_ip'].apply(lambda ip: f"{get_domain(ip)} ({ip})")
-df['destination_ip'] = df['destination_ip'].apply(lambda ip: f"{get_domain(ip)} ({ip})")
-
-# Step 4: Prepare the data
-df_grouped = df.groupby(['source_ip', 'protocol', 'destination_ip']).size().reset_index(name='count')
-
-# Step 5: Create a Treemap
-fig = px.treemap(
-    df_grouped,
-    path=['source_ip', 'protocol', 'destination_ip'],  # Hierarchical path
-    values='count',  # Size of each rectangle
-    color='protocol',  # Color by protocol
-    title="Network Traffic Visualization (Source Domain → Protocol → Destination Domain)"
-)
-
-# Step 6: Save as HTML
-fig.write_html("network_traffic_treemap_with_dynamic_domains.html")
-
-# Display the figure
-fig.show()
\ No newline at end of file
+from parameters_analysis.aggregation.engine import run_metrics
+from parameters_analysis.aggregation.figures import finish_figure
+from parameters_analysis.aggregation.loader import get_domain
+from parameters_analysis.aggregation.registry import register_metric
+from parameters_analysis.cidr_analysis.cidr_tree import cached_prefix_tree
+
+# Aggregates this report needs from the shared engine; protocol counts are
+# rolled up from the (source, protocol, destination) counts
+METRICS = [
+    register_metric('ip_protocol_pairs', keys=['source_ip', 'protocol', 'destination_ip'],
+                    count=('protocol', 'size')),
+    register_metric('protocol_counts', keys=['protocol'], count=('protocol', 'size')),
+]
+
+# Row-level columns used directly by the plots
+COLUMNS = ['source_ip', 'destination_ip', 'protocol', 'packet_size']
+
+
+def render(data, output_dir='.', show=True):
+    df = data.frame
+
+    # Display basic statistics about the loaded columns
+    print(df.describe())
+
+    # Check for missing values
+    print(df.isnull().sum())
+
+    # Display unique protocols
+    protocol_counts = data['protocol_counts']
+    print("Unique Protocols:", protocol_counts['protocol'].unique())
+
+    # Set the style of the visualizations
+    sns.set(style="whitegrid")
+
+    # Plot the distribution of protocols
+    plt.figure(figsize=(10, 6))
+    sns.barplot(x='protocol', y='count', data=protocol_counts)
+    plt.title('Protocol Distribution')
+    plt.xlabel('Protocol')
+    plt.ylabel('Count')
+    finish_figure('protocol_distribution', output_dir, show)
+
+    ## ---------------------------------  HeatMap ----------------------- ###
+
+    # Step 2: Roll hosts up into CIDR prefixes so the chart stays within a node budget
+    tree = cached_prefix_tree(df)
+    host_groups = tree.representatives(node_budget=50)
+    pairs = data['ip_protocol_pairs']
+    groups = pd.DataFrame({
+        'source_group': pairs['source_ip'].map(host_groups),
+        'protocol': pairs['protocol'],
+        'destination_group': pairs['destination_ip'].map(host_groups),
+        'count': pairs['count'],
+    })
+
+    # Step 3: Prepare the data
+    df_grouped = groups.groupby(['source_group', 'protocol', 'destination_group'])['count'].sum().reset_index()
+
+    # Step 4: Create a Sunburst chart
+    fig = px.sunburst(
+        df_grouped,
+        path=['source_group', 'protocol', 'destination_group'],  # Hierarchical path
+        values='count',  # Size of each segment
+        color='protocol',  # Color by protocol
+        title="Network Traffic Visualization (Source IP → Protocol → Destination IP)"
+    )
+
+    # Step 5: Save as HTML
+    fig.write_html(os.path.join(output_dir, "network_traffic_sunburst.html"))
+
+    # Display the figure
+    if show:
+        fig.show()
+
+    ###### ------------ TreeMap ----------------------- ############
+
+    # Step 2: Replace individual hosts left after aggregation with domain names, IP in brackets.
+    # Prefix groups keep their CIDR label, so only the remaining hosts are resolved
+    hosts = set(tree.hosts)
+    group_labels = {group: f"{get_domain(group)} ({group})" if group in hosts else group
+                    for group in pd.unique(host_groups)}
+
+    # Step 3: Prepare the data
+    df_grouped = df_grouped.assign(source_label=df_grouped['source_group'].map(group_labels),
+                                   destination_label=df_grouped['destination_group'].map(group_labels))
+
+    # Step 4: Create a Treemap
+    fig = px.treemap(
+        df_grouped,
+        path=['source_label', 'protocol', 'destination_label'],  # Hierarchical path
+        values='count',  # Size of each rectangle
+        color='protocol',  # Color by protocol
+        title="Network Traffic Visualization (Source Domain → Protocol → Destination Domain)"
+    )
+
+    # Step 5: Save as HTML
+    fig.write_html(os.path.join(output_dir, "network_traffic_treemap_with_dynamic_domains.html"))
+
+    # Display the figure
+    if show:
+        fig.show()
+
+
+if __name__ == '__main__':
+    render(run_metrics(METRICS, COLUMNS))
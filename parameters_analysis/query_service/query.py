@@ -0,0 +1,238 @@
+import hashlib
+import json
+import os
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+import pandas as pd
+import pyarrow.parquet as pq
+
+from parameters_analysis.aggregation.engine import _assemble, _scan, compute_metrics, plan
+from parameters_analysis.aggregation.incremental import is_mergeable, merge_tables
+from parameters_analysis.aggregation.loader import TIMESTAMP_COLUMN, root_dir
+from parameters_analysis.aggregation.registry import Metric
+from parameters_analysis.query_service.store import FlowStore
+
+QUERY_CACHE_DIR = os.path.join(root_dir, '.query_cache')
+
+# Filter operators, mapped to pyarrow's filter syntax
+OPERATORS = {'==': '=', '!=': '!=', '<': '<', '<=': '<=', '>': '>', '>=': '>=', 'in': 'in', 'not in': 'not in'}
+
+
+class Query:
+    """
+    An ad-hoc query over the flow store, built from a JSON-like dict:
+
+        {"user": "mayank", "start": "2024-08-27", "end": "2024-09-03",
+         "filters": [["source_ip", "==", "153.91.108.175"]],
+         "group_by": ["destination_ip"],
+         "aggregations": {"bytes": ["packet_size", "sum"], "packets": ["packet_size", "size"]},
+         "top": 10, "order_by": "bytes"}
+
+    Without group_by the matching rows are returned (optionally only
+    `columns`), most recent `limit` rows first.
+    """
+
+    def __init__(self, filters=(), user=None, start=None, end=None, group_by=(), aggregations=None, top=None,
+                 order_by=None, ascending=False, columns=None, limit=1000):
+        self.filters = [tuple(condition) for condition in filters]
+        for column, operator, _ in self.filters:
+            if operator not in OPERATORS:
+                raise ValueError(f"Unknown operator '{operator}' for column '{column}'")
+        self.users = [user] if isinstance(user, str) else list(user or [])
+        self.start = pd.Timestamp(start) if start is not None else None
+        self.end = pd.Timestamp(end) if end is not None else None
+        self.group_by = list(group_by)
+        self.aggregations = {name: tuple(spec) for name, spec in (aggregations or {}).items()}
+        if self.group_by and not self.aggregations:
+            self.aggregations = {'count': (self.group_by[0], 'size')}
+        self.top = top
+        self.order_by = order_by or (next(iter(self.aggregations)) if self.aggregations else TIMESTAMP_COLUMN)
+        self.ascending = ascending
+        self.columns = list(columns) if columns else None
+        self.limit = limit
+
+    @classmethod
+    def from_dict(cls, spec):
+        return cls(**spec)
+
+    def to_dict(self):
+        return {'filters': [list(condition) for condition in self.filters], 'user': self.users,
+                'start': self.start.isoformat() if self.start is not None else None,
+                'end': self.end.isoformat() if self.end is not None else None,
+                'group_by': self.group_by, 'aggregations': {k: list(v) for k, v in self.aggregations.items()},
+                'top': self.top, 'order_by': self.order_by, 'ascending': self.ascending,
+                'columns': self.columns, 'limit': self.limit}
+
+    def cache_key(self, version):
+        canonical = json.dumps(self.to_dict(), sort_keys=True, default=str)
+        return hashlib.sha1(f"{canonical}|{version}".encode()).hexdigest()
+
+    @property
+    def metric(self):
+        return Metric('query', keys=self.group_by, **self.aggregations) if self.group_by else None
+
+    def needed_columns(self):
+        if self.metric is not None:
+            needed = set(self.metric.columns())
+        elif self.columns:
+            needed = set(self.columns) | {TIMESTAMP_COLUMN}
+        else:
+            return None
+        return needed | {column for column, _, _ in self.filters}
+
+    def arrow_filters(self):
+        filters = [(column, OPERATORS[operator], value) for column, operator, value in self.filters]
+        if self.start is not None:
+            filters.append((TIMESTAMP_COLUMN, '>=', self.start))
+        if self.end is not None:
+            filters.append((TIMESTAMP_COLUMN, '<', self.end))
+        return filters or None
+
+    def may_match(self, partition):
+        """False when the partition's manifest statistics rule out every row."""
+        if self.users and partition['user'] not in self.users:
+            return False
+        low, high = partition['min'].get(TIMESTAMP_COLUMN), partition['max'].get(TIMESTAMP_COLUMN)
+        if self.start is not None and high is not None and pd.Timestamp(high) < self.start:
+            return False
+        if self.end is not None and low is not None and pd.Timestamp(low) >= self.end:
+            return False
+
+        for column, operator, value in self.filters:
+            if column not in partition['columns']:
+                return False
+            distinct = partition['distinct'].get(column)
+            if distinct is not None:
+                if operator == '==' and str(value) not in distinct:
+                    return False
+                if operator == 'in' and not {str(v) for v in value} & set(distinct):
+                    return False
+            # Time is pruned through start / end above
+            if column in partition['min'] and column != TIMESTAMP_COLUMN:
+                try:
+                    if not _in_range(partition['min'][column], partition['max'][column], operator, value):
+                        return False
+                except TypeError:
+                    # Value of another type than the column; let the reader decide
+                    continue
+        return True
+
+
+def _in_range(low, high, operator, value):
+    if operator == '==':
+        return low <= value <= high
+    if operator == '<':
+        return low < value
+    if operator == '<=':
+        return low <= value
+    if operator == '>':
+        return high > value
+    if operator == '>=':
+        return high >= value
+    if operator == 'in':
+        return any(low <= v <= high for v in value)
+    return True
+
+
+class QueryService:
+    """
+    Runs queries over a FlowStore: prunes partitions from the manifest,
+    reads only the needed columns with the filters pushed into the Parquet
+    reader, scans partitions in parallel threads (computing partial group-bys
+    per partition and merging them) and caches results in memory and on disk
+    under the query and the store's dataset version.
+    """
+
+    def __init__(self, store=None, workers=None, cache_dir=QUERY_CACHE_DIR, memory_entries=256):
+        self.store = store or FlowStore()
+        self.workers = workers
+        self.cache_dir = cache_dir
+        self.memory_entries = memory_entries
+        self.memory = OrderedDict()
+
+    def _cached(self, key):
+        if key in self.memory:
+            self.memory.move_to_end(key)
+            return self.memory[key]
+        path = os.path.join(self.cache_dir, f"{key}.pkl")
+        if os.path.exists(path):
+            result = pd.read_pickle(path)
+            self._remember(key, result)
+            return result
+        return None
+
+    def _remember(self, key, result):
+        self.memory[key] = result
+        self.memory.move_to_end(key)
+        while len(self.memory) > self.memory_entries:
+            self.memory.popitem(last=False)
+
+    def _store(self, key, result):
+        self._remember(key, result)
+        os.makedirs(self.cache_dir, exist_ok=True)
+        path = os.path.join(self.cache_dir, f"{key}.pkl")
+        pd.to_pickle(result, path + '.tmp')
+        os.replace(path + '.tmp', path)
+
+    def _read(self, partition, query):
+        path = os.path.join(self.store.root, partition['path'])
+        columns = query.needed_columns()
+        if columns is not None:
+            columns = [column for column in partition['columns'] if column in columns]
+        return pq.read_table(path, columns=columns, filters=query.arrow_filters()).to_pandas()
+
+    def _partial(self, partition, query):
+        df = self._read(partition, query)
+        metric = query.metric
+        if metric is None or not is_mergeable(metric):
+            return df
+        keys, primitives = next(iter(plan([metric])[0].items()))
+        return _scan(df, keys, primitives)
+
+    def run(self, query):
+        """Returns (DataFrame, info) with info on caching, pruning and timing."""
+        if isinstance(query, dict):
+            query = Query.from_dict(query)
+        start = time.perf_counter()
+        key = query.cache_key(self.store.version)
+        cached = self._cached(key)
+        if cached is not None:
+            return cached, {'cached': True, 'seconds': time.perf_counter() - start}
+
+        partitions = [partition for partition in self.store.partitions if query.may_match(partition)]
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            partials = list(pool.map(lambda partition: self._partial(partition, query), partitions))
+
+        result = self._combine(partials, query)
+        self._store(key, result)
+        return result, {'cached': False, 'seconds': time.perf_counter() - start,
+                        'partitions_scanned': len(partitions), 'partitions_total': len(self.store.partitions)}
+
+    def _combine(self, partials, query):
+        metric = query.metric
+        if metric is None:
+            columns = query.columns
+            if not partials:
+                return pd.DataFrame(columns=columns or [])
+            rows = pd.concat(partials, ignore_index=True)
+            if query.order_by in rows.columns:
+                rows = rows.sort_values(query.order_by, ascending=query.ascending, kind='stable')
+            rows = rows.head(query.limit)
+            return rows[columns].reset_index(drop=True) if columns else rows.reset_index(drop=True)
+
+        if not partials:
+            return pd.DataFrame(columns=list(metric.keys) + list(metric.aggregations))
+        if is_mergeable(metric):
+            keys, primitives = next(iter(plan([metric])[0].items()))
+            table = partials[0]
+            for partial in partials[1:]:
+                table = merge_tables(table, partial, keys, primitives)
+            result = _assemble(metric, table)
+        else:
+            result = compute_metrics(pd.concat(partials, ignore_index=True), [metric])[0]['query']
+        result = result.sort_values(query.order_by, ascending=query.ascending, kind='stable')
+        if query.top:
+            result = result.head(query.top)
+        return result.reset_index(drop=True)
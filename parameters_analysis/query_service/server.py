@@ -0,0 +1,59 @@
+import json
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+
+class QueryServer(ThreadingHTTPServer):
+    """
+    Local HTTP front end of a QueryService: POST /query with a JSON query
+    body (or GET /query?q=<json>) returns {"columns", "rows", "info"};
+    GET /version returns the dataset version used in cache keys.
+    """
+
+    daemon_threads = True
+
+    def __init__(self, service, host='127.0.0.1', port=8060):
+        super().__init__((host, port), QueryHandler)
+        self.service = service
+
+
+class QueryHandler(BaseHTTPRequestHandler):
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        if url.path == '/version':
+            self.send_json({'version': self.server.service.store.version,
+                            'partitions': len(self.server.service.store.partitions)})
+        elif url.path == '/query':
+            spec = parse_qs(url.query).get('q', ['{}'])[-1]
+            self.answer(spec)
+        else:
+            self.send_error(404)
+
+    def do_POST(self):
+        if urlparse(self.path).path != '/query':
+            self.send_error(404)
+            return
+        length = int(self.headers.get('Content-Length', 0))
+        self.answer(self.rfile.read(length).decode() or '{}')
+
+    def answer(self, spec):
+        try:
+            result, info = self.server.service.run(json.loads(spec))
+        except (ValueError, TypeError, KeyError) as error:
+            self.send_json({'error': str(error)}, status=400)
+            return
+        self.send_json({'columns': list(result.columns),
+                        'rows': json.loads(result.to_json(orient='values', date_format='iso')),
+                        'info': info})
+
+    def send_json(self, payload, status=200):
+        body = json.dumps(payload, default=str).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
@@ -0,0 +1,135 @@
+import hashlib
+import json
+import os
+
+import pandas as pd
+
+from parameters_analysis.aggregation.loader import TIMESTAMP_COLUMN, load_traffic, root_dir
+
+# Columnar copy of the capture datasets: <store>/user=<user>/date=<day>/<file>.parquet
+FLOW_STORE_DIR = os.path.join(root_dir, '.flow_store')
+COLLECTED_DATA_DIR = os.path.join(root_dir, 'collected_data')
+
+# Per-partition min / max kept in the manifest for pruning
+RANGE_COLUMNS = [TIMESTAMP_COLUMN, 'source_port', 'destination_port', 'packet_size']
+# Per-partition distinct values kept in the manifest when there are at most this many
+MAX_DISTINCT = 4096
+DISTINCT_COLUMNS = ['source_ip', 'destination_ip', 'protocol', 'flow_direction']
+
+
+def file_digest(path, chunk_size=1 << 20):
+    digest = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def infer_user(csv_path):
+    """collected_data/<user>/<file>.csv -> <user>; anything else -> 'local'."""
+    parent = os.path.dirname(os.path.abspath(csv_path))
+    if os.path.dirname(parent) == os.path.abspath(COLLECTED_DATA_DIR):
+        return os.path.basename(parent)
+    return 'local'
+
+
+def _json_value(value):
+    if isinstance(value, pd.Timestamp):
+        return value.isoformat()
+    return value.item() if hasattr(value, 'item') else value
+
+
+class FlowStore:
+    """
+    Capture CSVs converted once into Parquet partitions by user and day, with
+    a manifest of per-partition statistics (row count, min / max of the range
+    columns, distinct hosts and protocols) so a query only opens the files
+    that can contain matching rows.  The dataset version changes whenever a
+    partition is added or replaced and is part of every cached query key.
+    """
+
+    def __init__(self, root=FLOW_STORE_DIR):
+        self.root = root
+        self.manifest_path = os.path.join(root, 'manifest.json')
+        self.manifest = self._load_manifest()
+
+    def _load_manifest(self):
+        try:
+            with open(self.manifest_path) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {'sources': {}, 'partitions': []}
+
+    def _save_manifest(self):
+        os.makedirs(self.root, exist_ok=True)
+        with open(self.manifest_path + '.tmp', 'w') as f:
+            json.dump(self.manifest, f, indent=1)
+        os.replace(self.manifest_path + '.tmp', self.manifest_path)
+
+    @property
+    def version(self):
+        digest = hashlib.sha1()
+        for source, info in sorted(self.manifest['sources'].items()):
+            digest.update(f"{source}:{info['hash']}".encode())
+        return digest.hexdigest()
+
+    @property
+    def partitions(self):
+        return self.manifest['partitions']
+
+    def ingest(self, csv_path, user=None):
+        """Convert one capture CSV into partitions; unchanged files are skipped."""
+        source = os.path.abspath(csv_path)
+        digest = file_digest(source)
+        if self.manifest['sources'].get(source, {}).get('hash') == digest:
+            return 0
+        user = user or infer_user(source)
+
+        df = load_traffic(source)
+        if TIMESTAMP_COLUMN not in df.columns or df.empty:
+            return 0
+        df = df.dropna(subset=[TIMESTAMP_COLUMN])
+        stem = os.path.splitext(os.path.basename(source))[0]
+
+        # Replace whatever an earlier version of this file produced
+        for partition in self.partitions:
+            if partition['source'] == source:
+                path = os.path.join(self.root, partition['path'])
+                if os.path.exists(path):
+                    os.remove(path)
+        partitions = [partition for partition in self.partitions if partition['source'] != source]
+
+        for day, rows in df.groupby(df[TIMESTAMP_COLUMN].dt.strftime('%Y-%m-%d'), sort=True):
+            relative = os.path.join(f"user={user}", f"date={day}", f"{stem}.parquet")
+            path = os.path.join(self.root, relative)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            rows.sort_values(TIMESTAMP_COLUMN, kind='stable').to_parquet(path, index=False)
+            partitions.append(self._partition_stats(rows, relative, source, user, day))
+
+        self.manifest['partitions'] = partitions
+        self.manifest['sources'][source] = {'hash': digest, 'user': user}
+        self._save_manifest()
+        return len(df)
+
+    def ingest_directory(self, directory=COLLECTED_DATA_DIR, pattern='.csv'):
+        rows = 0
+        for folder, _, names in os.walk(directory):
+            for name in sorted(names):
+                if name.endswith(pattern):
+                    rows += self.ingest(os.path.join(folder, name))
+        return rows
+
+    @staticmethod
+    def _partition_stats(rows, relative, source, user, day):
+        stats = {'path': relative, 'source': source, 'user': user, 'date': day, 'rows': len(rows),
+                 'columns': list(rows.columns), 'min': {}, 'max': {}, 'distinct': {}}
+        for column in RANGE_COLUMNS:
+            if column in rows.columns:
+                stats['min'][column] = _json_value(rows[column].min())
+                stats['max'][column] = _json_value(rows[column].max())
+        for column in DISTINCT_COLUMNS:
+            if column in rows.columns:
+                values = rows[column].dropna().unique()
+                if len(values) <= MAX_DISTINCT:
+                    stats['distinct'][column] = sorted(str(value) for value in values)
+        return stats
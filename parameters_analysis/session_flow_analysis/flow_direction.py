@@ -1,62 +1,21 @@
 import os
-import socket
 
-import pandas as pd
 import plotly.express as px
 import plotly.graph_objects as go
 
+from parameters_analysis.aggregation.engine import run_metrics
+from parameters_analysis.aggregation.registry import register_metric
 
-def get_domain(ip):
-    try:
-        domain = socket.gethostbyaddr(ip)[0]
-    except socket.herror:
-        domain = "Unknown"
-    return domain
+# Aggregates this report needs from the shared engine
+METRICS = [
+    register_metric('flow_duration_by_direction', keys=['flow_direction'], flow_duration=('flow_duration', 'mean')),
+]
 
+# Row-level columns used directly by the plots; domains are resolved once
+# per distinct IP during enrichment
+COLUMNS = ['source_ip', 'destination_ip', 'source_domain', 'destination_domain', 'protocol', 'flow_duration',
+           'flow_direction']
 
-# Load the data from the CSV file
-root_dir = os.path.dirname(os.path.dirname(os.path.dirname(__file__)))
-csv_path = os.path.join(root_dir, 'network_traffic.csv')
-df = pd.read_csv(csv_path)
-
-
-
-# Compute the average flow duration for each flow direction
-avg_flow_duration = df.groupby('flow_direction')['flow_duration'].mean().reset_index()
-
-# Create a bar chart using the precomputed averages
-fig2 = px.bar(
-    avg_flow_duration,  # Use the DataFrame with averages
-    x='flow_direction',
-    y='flow_duration',
-    title='Average Flow Duration by Flow Direction',
-    labels={
-        'flow_direction': 'Flow Direction',
-        'flow_duration': 'Average Flow Duration (seconds)'
-    },
-    color='flow_direction',
-    barmode='group'
-)
-
-# Save the plot as an HTML file
-with open("flow_session_analysis.html", 'w') as f:
-    f.write(fig2.to_html(full_html=False, include_plotlyjs='cdn'))
-
-# Show the plot
-fig2.show()
-
-
-###########   --------------------  ##############
-
-# Apply the function to resolve IPs to domains
-df['source_domain'] = df['source_ip'].apply(get_domain)
-df['destination_domain'] = df['destination_ip'].apply(get_domain)
-
-# Filter data by flow direction
-inbound_df = df[df['flow_direction'] == 'inbound']
-outbound_df = df[df['flow_direction'] == 'outbound']
-internal_df = df[df['flow_direction'] == 'internal']
-external_df = df[df['flow_direction'] == 'external']
 
 def create_sankey(df, flow_direction):
     # Create node labels with detailed info
@@ -124,22 +83,63 @@ def create_sankey(df, flow_direction):
     return fig
 
 
-# Create Sankey diagrams for inbound and outbound flow directions
-inbound_sankey = create_sankey(inbound_df, 'inbound')
-outbound_sankey = create_sankey(outbound_df, 'outbound')
-internal_sankey = create_sankey(internal_df, 'internal')
-external_sankey = create_sankey(external_df, 'external')
-
-# Combine all plots into a single HTML file
-with open("flow_analysis_sankey.html", 'w') as f:
-    f.write('<html><head><title>Flow Analysis Sankey Diagrams</title></head><body>')
-    f.write(inbound_sankey.to_html(full_html=False, include_plotlyjs='cdn'))
-    f.write(outbound_sankey.to_html(full_html=False, include_plotlyjs='cdn'))
-    f.write(internal_sankey.to_html(full_html=False, include_plotlyjs='cdn'))
-    f.write('</body></html>')
-
-# Show the plots
-inbound_sankey.show()
-outbound_sankey.show()
-internal_sankey.show()
-external_sankey.show()
\ No newline at end of file
+def render(data, output_dir='.', show=True):
+    df = data.frame
+
+    # Average flow duration for each flow direction, precomputed by the engine
+    avg_flow_duration = data['flow_duration_by_direction']
+
+    # Create a bar chart using the precomputed averages
+    fig2 = px.bar(
+        avg_flow_duration,  # Use the DataFrame with averages
+        x='flow_direction',
+        y='flow_duration',
+        title='Average Flow Duration by Flow Direction',
+        labels={
+            'flow_direction': 'Flow Direction',
+            'flow_duration': 'Average Flow Duration (seconds)'
+        },
+        color='flow_direction',
+        barmode='group'
+    )
+
+    # Save the plot as an HTML file
+    with open(os.path.join(output_dir, "flow_session_analysis.html"), 'w') as f:
+        f.write(fig2.to_html(full_html=False, include_plotlyjs='cdn'))
+
+    # Show the plot
+    if show:
+        fig2.show()
+
+    ###########   --------------------  ##############
+
+    # Filter data by flow direction
+    inbound_df = df[df['flow_direction'] == 'inbound']
+    outbound_df = df[df['flow_direction'] == 'outbound']
+    internal_df = df[df['flow_direction'] == 'internal']
+    external_df = df[df['flow_direction'] == 'external']
+
+    # Create Sankey diagrams for inbound and outbound flow directions
+    inbound_sankey = create_sankey(inbound_df, 'inbound')
+    outbound_sankey = create_sankey(outbound_df, 'outbound')
+    internal_sankey = create_sankey(internal_df, 'internal')
+    external_sankey = create_sankey(external_df, 'external')
+
+    # Combine all plots into a single HTML file
+    with open(os.path.join(output_dir, "flow_analysis_sankey.html"), 'w') as f:
+        f.write('<html><head><title>Flow Analysis Sankey Diagrams</title></head><body>')
+        f.write(inbound_sankey.to_html(full_html=False, include_plotlyjs='cdn'))
+        f.write(outbound_sankey.to_html(full_html=False, include_plotlyjs='cdn'))
+        f.write(internal_sankey.to_html(full_html=False, include_plotlyjs='cdn'))
+        f.write('</body></html>')
+
+    # Show the plots
+    if show:
+        inbound_sankey.show()
+        outbound_sankey.show()
+        internal_sankey.show()
+        external_sankey.show()
+
+
+if __name__ == '__main__':
+    render(run_metrics(METRICS, COLUMNS))
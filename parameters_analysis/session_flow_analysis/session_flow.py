@@ -1,28 +1,18 @@
 import os
-import socket
-import pandas as pd
+
 import plotly.graph_objects as go
 
-# Define the domain resolution function
-def get_domain(ip):
-    try:
-        domain = socket.gethostbyaddr(ip)[0]
-    except socket.herror:
-        domain = "Unknown"
-    return domain
+from parameters_analysis.aggregation.engine import run_metrics
+from parameters_analysis.aggregation.loader import resolve_domains
+from parameters_analysis.session_flow_analysis.sessionize import SESSION_COLUMNS, sessions_from_packets
 
-# Load your CSV data into a DataFrame
-root_dir = os.path.dirname(os.path.dirname(os.path.dirname(__file__)))
-csv_path = os.path.join(root_dir, 'network_traffic.csv')
-df = pd.read_csv(csv_path)
+# Aggregates this report needs from the shared engine
+METRICS = []
 
-# Apply the function to resolve IPs to domains
-df['source_domain'] = df['source_ip'].apply(get_domain)
-df['destination_domain'] = df['destination_ip'].apply(get_domain)
+# Row-level columns the sessions are rebuilt from; the capture's own
+# session_duration / session_count never close a session
+COLUMNS = SESSION_COLUMNS + ['tcp_flags']
 
-# Filter data by flow direction
-inbound_df = df[df['flow_direction'] == 'inbound']
-outbound_df = df[df['flow_direction'] == 'outbound']
 
 def create_sankey(df, flow_direction):
     # Create node labels with detailed info
@@ -99,17 +89,43 @@ def create_sankey(df, flow_direction):
     fig.update_layout(title_text=f"Sankey Diagram of {flow_direction.capitalize()} Flow", font_size=10)
     return fig
 
-# Create Sankey diagrams for session data
-inbound_sankey = create_sankey(inbound_df, 'inbound')
-outbound_sankey = create_sankey(outbound_df, 'outbound')
 
-# Combine all plots into a single HTML file
-with open("session_analysis_sankey.html", 'w') as f:
-    f.write('<html><head><title>Session Analysis Sankey Diagrams</title></head><body>')
-    f.write(inbound_sankey.to_html(full_html=False, include_plotlyjs='cdn'))
-    f.write(outbound_sankey.to_html(full_html=False, include_plotlyjs='cdn'))
-    f.write('</body></html>')
+def session_links(sessions):
+    """Total duration and number of sessions per initiator, responder and protocol."""
+    links = sessions.groupby(['source_ip', 'destination_ip', 'protocol', 'flow_direction'], sort=False).agg(
+        session_duration=('duration', 'sum'),
+        session_count=('session_id', 'size'),
+    ).reset_index()
+    links['source_domain'] = resolve_domains(links['source_ip'])
+    links['destination_domain'] = resolve_domains(links['destination_ip'])
+    return links
+
+
+def render(data, output_dir='.', show=True):
+    sessions = sessions_from_packets(data.frame)
+    sessions.to_csv(os.path.join(output_dir, 'sessions.csv'), index=False)
+    df = session_links(sessions)
+
+    # Filter data by flow direction
+    inbound_df = df[df['flow_direction'] == 'inbound']
+    outbound_df = df[df['flow_direction'] == 'outbound']
+
+    # Create Sankey diagrams for session data
+    inbound_sankey = create_sankey(inbound_df, 'inbound')
+    outbound_sankey = create_sankey(outbound_df, 'outbound')
+
+    # Combine all plots into a single HTML file
+    with open(os.path.join(output_dir, "session_analysis_sankey.html"), 'w') as f:
+        f.write('<html><head><title>Session Analysis Sankey Diagrams</title></head><body>')
+        f.write(inbound_sankey.to_html(full_html=False, include_plotlyjs='cdn'))
+        f.write(outbound_sankey.to_html(full_html=False, include_plotlyjs='cdn'))
+        f.write('</body></html>')
+
+    # Show the plots
+    if show:
+        inbound_sankey.show()
+        outbound_sankey.show()
+
 
-# Show the plots
-inbound_sankey.show()
-outbound_sankey.show()
\ No newline at end of file
+if __name__ == '__main__':
+    render(run_metrics(METRICS, COLUMNS))
@@ -0,0 +1,127 @@
+import numpy as np
+import pandas as pd
+
+# A pair of hosts silent for longer than this (seconds) starts a new session
+IDLE_GAP = 60
+
+# TCP flag bits as written to the capture's tcp_flags column
+FIN, RST, ACK = 0x01, 0x04, 0x10
+
+# Packet columns sessionize() reads; tcp_flags is optional (older captures lack it)
+SESSION_COLUMNS = ['source_ip', 'destination_ip', 'source_port', 'destination_port', 'protocol', 'packet_size',
+                   'payload_size', 'flow_direction', 'temporal_patterns']
+
+# Columns of session_table(), in order
+SESSION_TABLE_COLUMNS = ['session_id', 'source_ip', 'destination_ip', 'destination_port', 'protocol',
+                         'flow_direction', 'start', 'end', 'duration', 'packets', 'bytes', 'payload_bytes',
+                         'mean_gap', 'max_gap', 'gap_std']
+
+
+def _pair_codes(df, by):
+    """Integer key per row, equal for both directions of a host pair (or connection)."""
+    ips, hosts = pd.factorize(pd.concat([df['source_ip'], df['destination_ip']], ignore_index=True))
+    source, destination = ips[:len(df)].astype(np.int64), ips[len(df):].astype(np.int64)
+    low, high = np.minimum(source, destination), np.maximum(source, destination)
+    codes = low * len(hosts) + high
+    if by == 'connection':
+        # Ports follow the address order of their endpoints
+        swapped = source > destination
+        low_port = np.where(swapped, df['destination_port'], df['source_port'])
+        high_port = np.where(swapped, df['source_port'], df['destination_port'])
+        protocol = pd.factorize(df['protocol'])[0]
+        # Dense pair numbers leave room to pack both 16-bit ports and the protocol into one int64
+        codes = ((pd.factorize(codes)[0] * 65536 + low_port) * 65536 + high_port) * 16 + protocol
+    elif by != 'host_pair':
+        raise ValueError(f"Unknown session key '{by}'; expected 'host_pair' or 'connection'")
+    return codes
+
+
+def close_boundaries(flags, pair, first):
+    """
+    Rows that start a new session because the pair's connection was closed:
+    the previous significant packet carried FIN or RST and this one does
+    not.  Bare ACKs (the tail of a FIN handshake) are not significant, so
+    they stay with the session they close.
+    """
+    closing = (flags & (FIN | RST)) != 0
+    significant = flags != ACK
+    # Closing state of the last significant packet, carried forward over bare ACKs
+    state = pd.Series(np.where(significant, closing, np.nan))
+    state = state.groupby(pair).ffill().to_numpy()
+    previous = np.roll(state, 1)
+    previous[first] = np.nan
+    return (previous == 1) & significant & ~closing
+
+
+def sessionize(df, idle_gap=IDLE_GAP, by='host_pair'):
+    """
+    Split packet rows into sessions without Python loops: rows are ordered
+    by host pair (both directions together) and timestamp, and a session
+    starts at a pair's first packet, after a gap longer than `idle_gap`
+    seconds, or after the connection was closed with FIN / RST (when the
+    capture has a tcp_flags column).  by='connection' sessionizes each
+    bidirectional 5-tuple separately instead of each host pair.
+
+    Returns the rows in session order with session_id and gap (seconds since
+    the previous packet of the session, NaN for its first packet) added.
+    """
+    pair = _pair_codes(df, by)
+    seconds = df['temporal_patterns'].to_numpy(dtype='datetime64[ns]').astype(np.int64) / 1e9
+    # lexsort is stable, so packets within the same second keep capture order
+    order = np.lexsort((seconds, pair))
+    pair, seconds = pair[order], seconds[order]
+
+    # Sliced so that an empty capture has no first row either
+    first = np.r_[True, pair[1:] != pair[:-1]][:len(pair)]
+    gap = np.diff(seconds, prepend=seconds[:1])
+    boundary = first | (gap > idle_gap)
+    if 'tcp_flags' in df.columns:
+        flags = df['tcp_flags'].fillna(0).to_numpy(dtype=np.int64)[order]
+        boundary |= close_boundaries(flags, pair, first)
+
+    rows = df.iloc[order].reset_index(drop=True)
+    rows['session_id'] = np.cumsum(boundary) - 1
+    rows['gap'] = np.where(boundary, np.nan, gap)
+    return rows
+
+
+def session_table(rows):
+    """
+    One row per session from sessionize() output (rows grouped by
+    session_id, in order): endpoints as seen in the session's first packet
+    (the initiator is the source), start / end, duration, packet and byte
+    counts, and inter-packet gap statistics.  Reductions run over the
+    session boundaries with np.*.reduceat instead of a groupby.
+    """
+    if len(rows) == 0:
+        # reduceat needs at least one session boundary
+        return pd.DataFrame(columns=SESSION_TABLE_COLUMNS)
+    session_ids = rows['session_id'].to_numpy()
+    starts = np.flatnonzero(np.r_[True, session_ids[1:] != session_ids[:-1]])
+    packets = np.diff(np.r_[starts, len(rows)])
+
+    sessions = rows.iloc[starts][['session_id', 'source_ip', 'destination_ip', 'destination_port', 'protocol',
+                                  'flow_direction']].reset_index(drop=True)
+    times = rows['temporal_patterns'].to_numpy()
+    sessions['start'] = np.minimum.reduceat(times, starts)
+    sessions['end'] = np.maximum.reduceat(times, starts)
+    sessions['duration'] = (sessions['end'] - sessions['start']).dt.total_seconds()
+    sessions['packets'] = packets
+    sessions['bytes'] = np.add.reduceat(rows['packet_size'].to_numpy(), starts)
+    sessions['payload_bytes'] = np.add.reduceat(rows['payload_size'].to_numpy(), starts)
+
+    # The first packet of a session has no gap
+    gap = rows['gap'].to_numpy()
+    gaps = packets - 1
+    total = np.add.reduceat(np.nan_to_num(gap), starts)
+    squares = np.add.reduceat(np.nan_to_num(gap) ** 2, starts)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        sessions['mean_gap'] = np.where(gaps > 0, total / gaps, np.nan)
+        sessions['max_gap'] = np.where(gaps > 0, np.fmax.reduceat(gap, starts), np.nan)
+        variance = (squares - total ** 2 / gaps) / (gaps - 1)
+        sessions['gap_std'] = np.where(gaps > 1, np.sqrt(np.maximum(variance, 0)), np.nan)
+    return sessions
+
+
+def sessions_from_packets(df, idle_gap=IDLE_GAP, by='host_pair'):
+    return session_table(sessionize(df, idle_gap, by))
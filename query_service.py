@@ -0,0 +1,46 @@
+import argparse
+import json
+
+from parameters_analysis.query_service.query import QueryService
+from parameters_analysis.query_service.server import QueryServer
+from parameters_analysis.query_service.store import COLLECTED_DATA_DIR, FlowStore
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Query the historical capture datasets.")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    ingest = commands.add_parser('ingest', help="convert capture CSVs into the columnar flow store")
+    ingest.add_argument('paths', nargs='*', help=f"CSV files (default: everything under {COLLECTED_DATA_DIR})")
+    ingest.add_argument('--user', default=None, help="user the files belong to (default: from collected_data/<user>)")
+
+    query = commands.add_parser('query', help="run one query and print the result")
+    query.add_argument('spec', help='JSON query, e.g. \'{"group_by": ["destination_port"], "top": 10}\'')
+    query.add_argument('--workers', type=int, default=None, help="parallel partition scans")
+
+    serve = commands.add_parser('serve', help="answer queries over HTTP")
+    serve.add_argument('--host', default='127.0.0.1')
+    serve.add_argument('--port', type=int, default=8060)
+    serve.add_argument('--workers', type=int, default=None, help="parallel partition scans")
+
+    args = parser.parse_args()
+    store = FlowStore()
+
+    if args.command == 'ingest':
+        if args.paths:
+            rows = sum(store.ingest(path, user=args.user) for path in args.paths)
+        else:
+            rows = store.ingest_directory()
+        print(f"Ingested {rows} rows; {len(store.partitions)} partitions, dataset version {store.version[:12]}")
+    elif args.command == 'query':
+        result, info = QueryService(store, workers=args.workers).run(json.loads(args.spec))
+        print(result.to_string(index=False))
+        print(info)
+    else:
+        server = QueryServer(QueryService(store, workers=args.workers), args.host, args.port)
+        print(f"Query service at http://{args.host}:{args.port}/query")
+        server.serve_forever()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,36 @@
+import argparse
+import os
+import time
+
+import pandas as pd
+
+from parameters_analysis.aggregation.flow_metrics import FLOW_METRIC_COLUMNS, recompute_flow_metrics
+from parameters_analysis.aggregation.loader import CSV_PATH, TIMESTAMP_COLUMN, TIMESTAMP_FORMAT, parse_timestamps
+from parameters_analysis.session_flow_analysis.sessionize import IDLE_GAP
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Recompute the flow-level columns of a capture CSV from its "
+                                                 "per-packet columns.")
+    parser.add_argument('csv', nargs='?', default=CSV_PATH, help="capture CSV to read")
+    parser.add_argument('--output', default=None, help="where to write the result (default: <csv>_recomputed.csv)")
+    parser.add_argument('--bidirectional', action='store_true', help="count both directions of a connection as one flow")
+    parser.add_argument('--flow-timeout', type=float, default=None,
+                        help="seconds of silence after which a flow starts over (default: never)")
+    parser.add_argument('--idle-gap', type=float, default=IDLE_GAP,
+                        help=f"seconds of silence that end a session (default: {IDLE_GAP})")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    df = pd.read_csv(args.csv)
+    df[TIMESTAMP_COLUMN] = parse_timestamps(df[TIMESTAMP_COLUMN])
+    df = recompute_flow_metrics(df, args.bidirectional, args.flow_timeout, args.idle_gap)
+
+    output = args.output or os.path.splitext(args.csv)[0] + '_recomputed.csv'
+    df.to_csv(output, index=False, date_format=TIMESTAMP_FORMAT)
+    print(f"Recomputed {', '.join(FLOW_METRIC_COLUMNS)} for {len(df)} rows in {time.perf_counter() - start:.2f}s; "
+          f"written to {output}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,255 @@
+import argparse
+import ast
+import hashlib
+import importlib
+import importlib.util
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import matplotlib
+import pandas as pd
+
+# Reports are rendered without a display; select the backend before any pyplot import
+matplotlib.use('Agg')
+
+from parameters_analysis.aggregation.engine import AggregationResults, compute_metrics, enrich, plan, required_columns
+from parameters_analysis.aggregation.loader import CSV_PATH, load_traffic, root_dir
+from parameters_analysis.aggregation.registry import DERIVED_COLUMNS
+from parameters_analysis.aggregation.suite import REPORTS, suite_requirements
+
+# Intermediate stage outputs, keyed by input file hash and stage parameters
+REPORT_CACHE_DIR = os.path.join(root_dir, '.report_cache')
+
+STAGES = ['load', 'enrich', 'aggregate']
+
+
+def file_hash(path, chunk_size=1 << 20):
+    digest = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def stage_key(*parts):
+    return hashlib.sha1(repr(parts).encode()).hexdigest()
+
+
+def source_hash(module_name, package='parameters_analysis'):
+    """
+    Hash of a module's source and of every module of the package it imports,
+    directly or through other modules (function-level imports included), so
+    editing a helper a report renders through invalidates its artifacts.
+    """
+    sources = {}
+    pending = [module_name]
+    while pending:
+        name = pending.pop()
+        if name in sources:
+            continue
+        try:
+            spec = importlib.util.find_spec(name)
+        except (ImportError, ValueError):
+            # `from module import function`: the name is not a module
+            continue
+        if spec is None or not spec.origin or not spec.origin.endswith('.py'):
+            continue
+        with open(spec.origin, 'rb') as f:
+            sources[name] = f.read()
+        for node in ast.walk(ast.parse(sources[name])):
+            if isinstance(node, ast.ImportFrom) and node.module and not node.level:
+                names = [node.module] + [f"{node.module}.{alias.name}" for alias in node.names]
+            elif isinstance(node, ast.Import):
+                names = [alias.name for alias in node.names]
+            else:
+                continue
+            pending.extend(imported for imported in names if imported.split('.')[0] == package)
+
+    digest = hashlib.sha1()
+    for name in sorted(sources):
+        digest.update(name.encode())
+        digest.update(sources[name])
+    return digest.hexdigest()
+
+
+class ReportRunner:
+    """
+    Runs the reports headlessly as a DAG: load -> enrich -> aggregate ->
+    render.  Every stage's key is derived from the input file hash, the
+    stage's parameters and the upstream key, so a stage is only recomputed
+    when something it depends on changed; load/enrich/aggregate outputs are
+    pickled under cache_dir and renderers skip reports whose artifacts
+    were produced from the same inputs.
+    """
+
+    def __init__(self, csv_path=None, reports=REPORTS, output_dir='reports', cache_dir=REPORT_CACHE_DIR,
+                 use_cache=True, workers=None):
+        self.csv_path = os.path.abspath(csv_path or CSV_PATH)
+        self.reports = list(reports)
+        self.output_dir = os.path.abspath(output_dir)
+        self.cache_dir = cache_dir
+        self.use_cache = use_cache
+        self.workers = workers
+        self.timings = {}
+        self._frame = None
+
+    def keys(self, metrics, columns):
+        """Cache key of every stage, computed from parameters only."""
+        base, needed = required_columns(metrics, columns)
+        derived = sorted(column for column in needed if column in DERIVED_COLUMNS)
+        signatures = sorted(repr(metric.signature()) for metric in metrics)
+
+        keys = {'input': file_hash(self.csv_path)}
+        keys['load'] = stage_key('load', keys['input'], sorted(base))
+        keys['enrich'] = stage_key('enrich', keys['load'], derived)
+        keys['aggregate'] = stage_key('aggregate', keys['enrich'], signatures)
+        return keys, base, needed
+
+    def cache_path(self, stage, key):
+        return os.path.join(self.cache_dir, f"{stage}-{key}.pkl")
+
+    def _memoized(self, stage, key, compute):
+        """Return the cached output of a stage, or compute and store it."""
+        path = self.cache_path(stage, key)
+        start = time.perf_counter()
+        if self.use_cache and os.path.exists(path):
+            value = pd.read_pickle(path)
+            cached = True
+        else:
+            value = compute()
+            os.makedirs(self.cache_dir, exist_ok=True)
+            # Write then rename so an interrupted run never leaves a partial entry
+            pd.to_pickle(value, path + '.tmp')
+            os.replace(path + '.tmp', path)
+            cached = False
+        self.timings[stage] = {'seconds': time.perf_counter() - start, 'cached': cached, 'key': key}
+        return value
+
+    def run_stages(self, metrics, keys, base, needed, rows=True):
+        """
+        Resolve the aggregate stage, pulling upstream stages only on a cache
+        miss.  The enriched rows are only loaded with rows=True (some report
+        to render plots individual rows); otherwise a cached aggregate skips
+        loading entirely and the results carry no frame.
+        """
+        def load():
+            return load_traffic(self.csv_path, columns=base)
+
+        def enriched():
+            return enrich(self._memoized('load', keys['load'], load), needed)
+
+        def aggregate():
+            return compute_metrics(self.frame(keys, enriched), metrics)
+
+        self._frame = None
+        tables, passes = self._memoized('aggregate', keys['aggregate'], aggregate)
+        frame = self.frame(keys, enriched) if rows else None
+        return AggregationResults(frame, tables, passes, {stage: self.timings[stage]['seconds']
+                                                          for stage in STAGES if stage in self.timings})
+
+    def frame(self, keys, enriched):
+        if self._frame is None:
+            self._frame = self._memoized('enrich', keys['enrich'], enriched)
+        return self._frame
+
+    def render_key(self, keys, report):
+        return stage_key('render', keys['aggregate'], report, source_hash(report))
+
+    def run(self):
+        start = time.perf_counter()
+        self.timings = {}
+        modules = [importlib.import_module(report) for report in self.reports]
+        metrics, columns = suite_requirements(modules)
+
+        keys, base, needed = self.keys(metrics, columns)
+        render_timings = {}
+        pending = {}
+        for report in self.reports:
+            key = self.render_key(keys, report)
+            report_dir = os.path.join(self.output_dir, report.rsplit('.', 1)[-1])
+            if self.use_cache and _read_manifest(report_dir).get('key') == key:
+                render_timings[report] = {'seconds': 0.0, 'cached': True, 'key': key}
+            else:
+                pending[report] = (key, report_dir)
+
+        # Row-level data is only needed by reports that plot rows and have to be rendered again
+        rows = any(importlib.import_module(report).COLUMNS for report in pending)
+        data = self.run_stages(metrics, keys, base, needed, rows)
+        _, rollups = plan(metrics)
+        # Workers read the stage outputs from the cache instead of having them pickled per task
+        results_path = self.cache_path('results', stage_key('results', keys['aggregate'], rows))
+        if not os.path.exists(results_path):
+            pd.to_pickle(data, results_path + '.tmp')
+            os.replace(results_path + '.tmp', results_path)
+
+        with ProcessPoolExecutor(max_workers=self.workers) as pool:
+            futures = {report: pool.submit(render_report, report, results_path, report_dir, key)
+                       for report, (key, report_dir) in pending.items()}
+            for report, future in futures.items():
+                render_timings[report] = {'seconds': future.result(), 'cached': False,
+                                          'key': pending[report][0]}
+
+        summary = {
+            'input': self.csv_path,
+            'input_hash': keys['input'],
+            'passes': data.passes,
+            'rollups': len(rollups),
+            'stages': {stage: self.timings[stage] for stage in STAGES if stage in self.timings},
+            'render': render_timings,
+            'total_seconds': time.perf_counter() - start,
+        }
+        os.makedirs(self.output_dir, exist_ok=True)
+        with open(os.path.join(self.output_dir, 'timings.json'), 'w') as f:
+            json.dump(summary, f, indent=2)
+        return summary
+
+
+def _read_manifest(report_dir):
+    try:
+        with open(os.path.join(report_dir, 'manifest.json')) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def render_report(report, results_path, report_dir, key):
+    """Render one report into its own artifact directory; runs in a worker process."""
+    os.makedirs(report_dir, exist_ok=True)
+    # pyvis copies its assets next to the working directory
+    os.chdir(report_dir)
+    module = importlib.import_module(report)
+    data = pd.read_pickle(results_path)
+
+    start = time.perf_counter()
+    module.render(data, output_dir=report_dir, show=False)
+    elapsed = time.perf_counter() - start
+
+    artifacts = sorted(name for name in os.listdir(report_dir) if name != 'manifest.json')
+    with open(os.path.join(report_dir, 'manifest.json'), 'w') as f:
+        json.dump({'report': report, 'key': key, 'seconds': elapsed, 'artifacts': artifacts}, f, indent=2)
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Render the traffic analysis reports without a display.")
+    parser.add_argument('csv_path', nargs='?', default=None, help="capture CSV (default: network_traffic.csv)")
+    parser.add_argument('--output-dir', default='reports', help="directory receiving one folder per report")
+    parser.add_argument('--reports', nargs='+', default=REPORTS, help="report modules to render")
+    parser.add_argument('--workers', type=int, default=None, help="renderer processes (default: CPU count)")
+    parser.add_argument('--no-cache', action='store_true', help="recompute every stage")
+    args = parser.parse_args()
+
+    summary = ReportRunner(args.csv_path, args.reports, args.output_dir, use_cache=not args.no_cache,
+                           workers=args.workers).run()
+
+    for stage, timing in summary['stages'].items():
+        print(f"{stage}: {timing['seconds']:.2f} s{' (cached)' if timing['cached'] else ''}")
+    for report, timing in summary['render'].items():
+        print(f"{report}: {timing['seconds']:.2f} s{' (cached)' if timing['cached'] else ''}")
+    print(f"total: {summary['total_seconds']:.2f} s, artifacts in {args.output_dir}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,127 @@
+import argparse
+import json
+import resource
+import subprocess
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+import torch
+
+from training.prepare_model import MODELS_DIR, VARIANTS
+from training.prompts import build_window_prompts
+from training.tokenizing import TOKENS_DIR, VOCABULARY_PATH
+from training.train import BATCH_SIZE, MAX_BATCH_TOKENS, MAX_NEW_TOKENS, length_batches, load_model
+
+
+def rss_mb():
+    """Current resident set size of this process (Linux), else its peak."""
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('VmRSS:'):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return peak_rss_mb()
+
+
+def peak_rss_mb():
+    # ru_maxrss is in kilobytes on Linux and in bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024 if sys.platform == 'darwin' else 1024)
+
+
+def run_variant(args):
+    """Benchmark one variant in this process; prints one JSON line with its measurements."""
+    prompts = build_window_prompts(args.tokens_dir, args.vocabulary)['prompt'].tolist()[:args.prompts]
+    if not prompts:
+        # Reported by the parent process as this variant's failure
+        raise SystemExit(f"No prompts to benchmark: no window prompts in {args.tokens_dir} or --prompts "
+                         f"{args.prompts} (tokenize captures with training.tokenizing first)")
+
+    started = time.perf_counter()
+    model, tokenizer, variant = load_model(args.model, args.threads, args.variant, args.models_dir)
+    load_seconds = time.perf_counter() - started
+    loaded_rss = rss_mb()
+
+    lengths = np.array([len(ids) for ids in tokenizer(prompts)['input_ids']])
+    batches = list(length_batches(lengths, args.batch_size, args.max_batch_tokens))
+
+    def generate(batch):
+        inputs = tokenizer([prompts[index] for index in batch], return_tensors='pt', padding=True,
+                           return_token_type_ids=False)
+        with torch.inference_mode():
+            outputs = model.generate(**inputs, max_new_tokens=args.max_new_tokens, do_sample=False,
+                                     pad_token_id=tokenizer.pad_token_id)
+        return outputs[:, inputs['input_ids'].shape[1]:]
+
+    generate(batches[0])        # warm-up: first-call allocations and graph setup
+    latencies, generated, texts = [], 0, [None] * len(prompts)
+    for batch in batches:
+        start = time.perf_counter()
+        new_tokens = generate(batch)
+        latencies.append(time.perf_counter() - start)
+        generated += int((new_tokens != tokenizer.pad_token_id).sum())
+        for index, text in zip(batch, tokenizer.batch_decode(new_tokens, skip_special_tokens=True)):
+            texts[index] = text
+
+    print(json.dumps({
+        'variant': variant,
+        'load_s': round(load_seconds, 2),
+        'prompts': len(prompts),
+        'batches': len(batches),
+        'tokens_per_s': round(generated / sum(latencies), 1),
+        'batch_latency_mean_s': round(float(np.mean(latencies)), 3),
+        'batch_latency_p95_s': round(float(np.percentile(latencies, 95)), 3),
+        'rss_loaded_mb': round(loaded_rss, 1),
+        'rss_peak_mb': round(peak_rss_mb(), 1),
+        'texts': texts,
+    }))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare generation speed and memory of the fp32 model with its "
+                                                 "prepared int8 / ONNX Runtime variants.")
+    parser.add_argument('--model', default='mistral', help="model name or local directory (small for quick runs)")
+    parser.add_argument('--variants', nargs='+', choices=['fp32'] + VARIANTS, default=['fp32'] + VARIANTS)
+    parser.add_argument('--models-dir', default=MODELS_DIR)
+    parser.add_argument('--tokens-dir', default=TOKENS_DIR)
+    parser.add_argument('--vocabulary', default=VOCABULARY_PATH)
+    parser.add_argument('--prompts', type=int, default=64, help="window prompts to generate for")
+    parser.add_argument('--threads', type=int, default=None)
+    parser.add_argument('--batch-size', type=int, default=BATCH_SIZE)
+    parser.add_argument('--max-batch-tokens', type=int, default=MAX_BATCH_TOKENS)
+    parser.add_argument('--max-new-tokens', type=int, default=MAX_NEW_TOKENS)
+    parser.add_argument('--variant', help=argparse.SUPPRESS)     # set in the per-variant worker processes
+    args = parser.parse_args()
+
+    if args.variant:
+        run_variant(args)
+        return
+
+    # One process per variant, so each peak RSS only counts that variant's model
+    results = []
+    for variant in args.variants:
+        command = [sys.executable, '-m', 'training.benchmark_model', '--variant', variant] + sys.argv[1:]
+        completed = subprocess.run(command, capture_output=True, text=True)
+        lines = [line for line in completed.stdout.splitlines() if line.startswith('{')]
+        if completed.returncode or not lines:
+            print(f"{variant} failed:\n{completed.stderr.strip().splitlines()[-1] if completed.stderr else ''}")
+            continue
+        results.append(json.loads(lines[-1]))
+
+    if not results:
+        return
+    baseline = next((result['texts'] for result in results if result['variant'] == 'fp32'), None)
+    for result in results:
+        texts = result.pop('texts')
+        if baseline is not None:
+            # Share of prompts whose greedy output is unchanged by quantization
+            result['same_as_fp32'] = round(float(np.mean([a == b for a, b in zip(texts, baseline)])), 3)
+    print(pd.DataFrame(results).set_index('variant').to_string())
+
+
+if __name__ == '__main__':
+    main()
@@ -1,13 +1,10 @@
-import os
-import pandas as pd
-import networkx as nx
 import plotly.graph_objects as go
-from sklearn.preprocessing import LabelEncoder
 
-# Load CSV file
-root_dir = os.path.dirname(os.path.dirname(os.path.dirname(__file__)))
-csv_path = os.path.join(root_dir + '/humanbehaviour', 'tokenized_data.csv')
-df = pd.read_csv(csv_path)
+from parameters_analysis.graph_analysis.graph_builder import build_edge_list, compute_layout, to_plotly
+from training.tokenizing import TOKENS_DIR, load_token_frame, token_spaces
+
+# Load the token matrices written by tokenizing.py (ids within each field's space)
+df = load_token_frame(TOKENS_DIR)
 
 # Clean up column names in case of extra spaces
 df.columns = df.columns.str.strip()
@@ -15,89 +12,30 @@ df.columns = df.columns.str.strip()
 # Print column names to check if they exist
 print(df.columns)
 
-# Tokenization using LabelEncoder for IP addresses and protocol
-le = LabelEncoder()
-
-# Ensure the 'source_ip_token', 'destination_ip_token', and 'protocol_token' columns exist
-if 'source_ip_token' in df.columns and 'destination_ip_token' in df.columns and 'protocol_token' in df.columns:
-    # Apply LabelEncoder to the IP address and protocol fields
-    df['source_ip_token'] = le.fit_transform(df['source_ip_token'])
-    df['destination_ip_token'] = le.fit_transform(df['destination_ip_token'])
-    df['protocol_token'] = le.fit_transform(df['protocol_token'])
-else:
+# Token ids are used as they are: source and destination IPs share one vocabulary, so an id names
+# the same host on both sides of an edge, and in every run
+if not {'source_ip_token', 'destination_ip_token', 'protocol_token'} <= set(df.columns):
     print("Missing necessary columns 'source_ip_token', 'destination_ip_token', or 'protocol_token'")
 
-# Normalize numerical values such as packet_size and session_duration
-df['packet_size'] = df['packet_size_token'].astype(float)
-df['session_duration'] = df['session_duration_token'].astype(float)
-
-# Create a directed graph using NetworkX
-G = nx.DiGraph()
-
-# Add edges from tokenized data
-for _, row in df.iterrows():
-    G.add_edge(row['source_ip_token'], row['destination_ip_token'],  # Use integer-encoded tokens as nodes
-               protocol=row['protocol_token'],
-               packet_size=row['packet_size'],
-               flow_direction=row['flow_direction_token'],
-               session_duration=row['session_duration'])
-
-# Extract node and edge data for visualization
-edges = G.edges(data=True)
-nodes = G.nodes()
-
-# Prepare data for Plotly
-edge_x = []
-edge_y = []
-edge_text = []
-
-for edge in edges:
-    start, end, data = edge
-    x0, y0 = start % 10, start // 10  # Simple layout calculation
-    x1, y1 = end % 10, end // 10  # Simple layout calculation
-    edge_x.append(x0)
-    edge_x.append(x1)
-    edge_x.append(None)  # Separate lines
-    edge_y.append(y0)
-    edge_y.append(y1)
-    edge_y.append(None)  # Separate lines
-    edge_text.append(f"Protocol: {data['protocol']}, Packet Size: {data['packet_size']}")
-
-# Prepare node positions
-node_x = []
-node_y = []
-node_text = []
-
-for node in nodes:
-    x = node % 10  # Simple layout calculation
-    y = node // 10  # Simple layout calculation
-    node_x.append(x)
-    node_y.append(y)
-    node_text.append(f"Node: {node}")
-
-# Create Plotly figure
-fig = go.Figure()
-
-# Add edges
-fig.add_trace(go.Scatter(
-    x=edge_x, y=edge_y,
-    mode='lines',
-    line=dict(width=0.5, color='gray'),
-    hoverinfo='text',
-    text=edge_text,
-    name='Edges'
-))
-
-# Add nodes
-fig.add_trace(go.Scatter(
-    x=node_x, y=node_y,
-    mode='markers+text',
-    marker=dict(size=10, color='lightblue'),
-    text=node_text,
-    textposition="bottom center",
-    hoverinfo='text',
-    name='Nodes'
-))
+# Approximate packet sizes and session durations from their log buckets
+spaces = token_spaces()
+df['packet_size'] = spaces['size'].lower_bound(df['packet_size_token'])
+df['session_duration'] = spaces['duration'].lower_bound(df['session_duration_token'])
+
+# Aggregate token rows into one weighted edge per (source, destination) pair
+edges = build_edge_list(df, source='source_ip_token', target='destination_ip_token', size_column='packet_size')
+protocols = df[['source_ip_token', 'destination_ip_token', 'protocol_token']].drop_duplicates().sort_values('protocol_token')
+protocols = protocols['protocol_token'].astype(str).groupby(
+    [protocols['source_ip_token'], protocols['destination_ip_token']]).agg(','.join)
+edges = edges.merge(protocols.rename('protocols').reset_index(), on=['source_ip_token', 'destination_ip_token'])
+edges['label'] = ("Protocol: " + edges['protocols'] + ", Packets: " + edges['packets'].astype(str)
+                  + ", Mean Packet Size: " + (edges['bytes'] / edges['packets']).round(3).astype(str))
+
+# Cached, scalable layout instead of a fixed node % 10 grid
+positions = compute_layout(edges, source='source_ip_token', target='destination_ip_token', method='force')
+
+# Create Plotly figure from edge/node traces built in one pass
+fig = go.Figure(data=to_plotly(edges, positions, source='source_ip_token', target='destination_ip_token'))
 
 # Update layout
 fig.update_layout(
@@ -0,0 +1,152 @@
+import argparse
+import json
+import os
+import platform
+import shutil
+import tempfile
+
+import torch
+from transformers import AutoConfig, AutoModelForCausalLM, AutoTokenizer
+
+from training.tokenizing import data_dir
+
+# Prepared variants of a model live in <MODELS_DIR>/<model name>-<variant>
+MODELS_DIR = os.path.join(data_dir, 'models')
+VARIANTS = ['onnx', 'int8']         # loader preference order
+MANIFEST = 'prepared.json'
+INT8_WEIGHTS = 'quantized_int8.pt'
+ONNX_FILE = 'model_quantized.onnx'
+
+
+def prepared_dir(model_name, variant, models_dir=MODELS_DIR):
+    name = os.path.basename(os.path.normpath(model_name)).replace('/', '--')
+    return os.path.join(models_dir, f'{name}-{variant}')
+
+
+def _quantize_linear(model):
+    # Weights of every nn.Linear become int8; activations are quantized on the fly per batch
+    return torch.ao.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+
+
+def prepare_int8(model_name, output_dir):
+    """Dynamically quantized PyTorch copy: config, tokenizer and the int8 state dict."""
+    model = AutoModelForCausalLM.from_pretrained(model_name, torch_dtype=torch.float32)
+    model.eval()
+    model = _quantize_linear(model)
+    os.makedirs(output_dir, exist_ok=True)
+    model.config.save_pretrained(output_dir)
+    model.generation_config.save_pretrained(output_dir)
+    torch.save(model.state_dict(), os.path.join(output_dir, INT8_WEIGHTS))
+
+
+def load_int8(directory):
+    config = AutoConfig.from_pretrained(directory)
+    model = _quantize_linear(AutoModelForCausalLM.from_config(config, torch_dtype=torch.float32).eval())
+    # The file holds packed int8 parameters written by prepare_int8, not just tensors
+    model.load_state_dict(torch.load(os.path.join(directory, INT8_WEIGHTS), weights_only=False))
+    return model.eval()
+
+
+def _ort_quantization_config():
+    from optimum.onnxruntime.configuration import AutoQuantizationConfig
+    if platform.machine().lower() in ('arm64', 'aarch64'):
+        return AutoQuantizationConfig.arm64(is_static=False, per_channel=False)
+    flags = ''
+    if os.path.exists('/proc/cpuinfo'):
+        with open('/proc/cpuinfo') as f:
+            flags = f.read()
+    if 'avx512_vnni' in flags:
+        return AutoQuantizationConfig.avx512_vnni(is_static=False, per_channel=False)
+    return AutoQuantizationConfig.avx2(is_static=False, per_channel=False)
+
+
+def _import_ort():
+    try:
+        from optimum.onnxruntime import ORTModelForCausalLM, ORTQuantizer
+    except ImportError:
+        raise ImportError("The ONNX variant requires 'optimum' and 'onnxruntime' "
+                          "(pip install 'optimum[onnxruntime]')")
+    return ORTModelForCausalLM, ORTQuantizer
+
+
+def prepare_onnx(model_name, output_dir):
+    """ONNX Runtime copy: the model exported to ONNX (with KV cache), weights quantized to int8."""
+    ORTModelForCausalLM, ORTQuantizer = _import_ort()
+    with tempfile.TemporaryDirectory() as exported:
+        ORTModelForCausalLM.from_pretrained(model_name, export=True).save_pretrained(exported)
+        quantizer = ORTQuantizer.from_pretrained(exported)
+        quantizer.quantize(save_dir=output_dir, quantization_config=_ort_quantization_config())
+        # The quantizer only writes the model and its config
+        generation_config = os.path.join(exported, 'generation_config.json')
+        if os.path.exists(generation_config):
+            shutil.copy(generation_config, output_dir)
+
+
+def load_onnx(directory, threads=None):
+    ORTModelForCausalLM, _ = _import_ort()
+    import onnxruntime
+    options = onnxruntime.SessionOptions()
+    if threads:
+        options.intra_op_num_threads = threads
+    return ORTModelForCausalLM.from_pretrained(directory, file_name=ONNX_FILE, session_options=options)
+
+
+def prepare_model(model_name, variant, models_dir=MODELS_DIR):
+    """Write the variant of model_name, with its tokenizer and a manifest; returns its directory."""
+    output_dir = prepared_dir(model_name, variant, models_dir)
+    if variant == 'int8':
+        prepare_int8(model_name, output_dir)
+    elif variant == 'onnx':
+        prepare_onnx(model_name, output_dir)
+    else:
+        raise ValueError(f"Unknown variant '{variant}'; expected one of {VARIANTS}")
+    AutoTokenizer.from_pretrained(model_name).save_pretrained(output_dir)
+    # Written last: a directory without a manifest is an interrupted preparation and is ignored
+    with open(os.path.join(output_dir, MANIFEST), 'w') as f:
+        json.dump({'source': model_name, 'variant': variant}, f)
+    return output_dir
+
+
+def find_prepared(model_name, variant='auto', models_dir=MODELS_DIR):
+    """
+    (variant, directory) of the prepared model to load: the requested
+    variant, or with 'auto' the first one of VARIANTS that is prepared and
+    loadable here.  ('fp32', model_name) when none is.
+    """
+    if variant == 'fp32':
+        return 'fp32', model_name
+    for candidate in (VARIANTS if variant == 'auto' else [variant]):
+        directory = prepared_dir(model_name, candidate, models_dir)
+        if not os.path.exists(os.path.join(directory, MANIFEST)):
+            if variant != 'auto':
+                raise FileNotFoundError(f"No {candidate} variant of {model_name} in {models_dir}; "
+                                        f"run python -m training.prepare_model --variant {candidate}")
+            continue
+        if candidate == 'onnx' and variant == 'auto':
+            try:
+                _import_ort()
+            except ImportError:
+                continue
+        return candidate, directory
+    return 'fp32', model_name
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Prepare int8 / ONNX Runtime variants of a causal LM for CPU "
+                                                 "inference.")
+    parser.add_argument('--model', default='mistral', help="model name or local directory")
+    parser.add_argument('--variant', choices=VARIANTS + ['all'], default='all')
+    parser.add_argument('--models-dir', default=MODELS_DIR)
+    args = parser.parse_args()
+
+    for variant in (VARIANTS if args.variant == 'all' else [args.variant]):
+        try:
+            output_dir = prepare_model(args.model, variant, args.models_dir)
+        except ImportError as e:
+            print(f"Skipping {variant}: {e}")
+            continue
+        print(f"Prepared {variant} variant of {args.model} in {output_dir}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,210 @@
+import time
+from ipaddress import ip_address
+
+import numpy as np
+import pandas as pd
+
+from training.tokenizing import (PortSpace, TOKEN_COLUMNS, TOKENS_DIR, VOCABULARY_PATH, Tokenizer, VocabularySpace,
+                                 load_token_matrix, load_token_times, token_files)
+
+# Seconds of traffic summarized per prompt, and how far consecutive windows of a host move
+WINDOW = 300
+SLIDE = None            # None: tumbling windows (slide = WINDOW)
+# Prompt length limit, in tokens of the model's tokenizer (whitespace words by default)
+TOKEN_BUDGET = 256
+# Longest lists a summary starts from before trimming to the budget
+TOP_DESTINATIONS = 8
+TOP_COUNTRIES = 3
+
+COLUMN = {column: position for position, column in enumerate(TOKEN_COLUMNS)}
+
+
+class TokenDecoder:
+    """Turns per-space token ids back into short labels for prompts."""
+
+    def __init__(self, tokenizer):
+        self.spaces = tokenizer.spaces
+
+    def label(self, column, token):
+        space = self.spaces[TOKEN_COLUMNS[column]]
+        token = int(token)
+        if token == 0:
+            return 'unknown'
+        if isinstance(space, VocabularySpace):
+            return str(space.values[token - 1]) if token <= len(space.values) else 'other'
+        if isinstance(space, PortSpace):
+            if token <= 1024:
+                return str(token - 1)
+            if token == space.size - 1:
+                return 'ephemeral'
+            low = 1024 + (token - 1025) * space.PORT_BLOCK
+            return f'{low}-{low + space.PORT_BLOCK - 1}'
+        low = space.lower_bound(token)
+        if token >= space.buckets:
+            return f'{low:g}+'
+        return f'{low:g}-{space.lower_bound(token + 1):g}'
+
+
+def window_bounds(hosts, times, window=WINDOW, slide=SLIDE):
+    """
+    Order rows by (host, time) and return (order, starts, ends): rows
+    order[starts[i]:ends[i]] form the i-th window, which starts at a slide
+    boundary of that host's traffic and covers `window` seconds from it.
+    Empty windows are never produced.
+    """
+    slide = slide or window
+    order = np.lexsort((times, hosts))
+    hosts, times = hosts[order], times[order]
+    boundaries = np.floor(times / slide)
+    bins = (boundaries - boundaries.min() if len(boundaries) else boundaries).astype(np.int64)
+
+    # One sortable integer per (host, bin); rows are already in its order
+    key = hosts.astype(np.int64) * (int(bins.max(initial=0)) + 1) + bins
+    starts = np.flatnonzero(np.r_[True, key[1:] != key[:-1]]) if len(key) else np.array([], dtype=np.int64)
+
+    # A window ends at the host's first row at or after its boundary + window: merge the (host, end time)
+    # of every window into the row order, ahead of rows at that exact time, and count the rows before it
+    ends_at = boundaries[starts] * slide + window
+    merged = np.lexsort((np.r_[np.ones(len(times)), np.zeros(len(starts))], np.r_[times, ends_at],
+                         np.r_[hosts, hosts[starts]]))
+    positions = np.empty(len(merged), dtype=np.int64)
+    positions[merged] = np.arange(len(merged))
+    # Windows merge in their own order, so window i has i windows ahead of it
+    ends = positions[len(times):] - np.arange(len(starts))
+
+    # A window shorter than the slide can miss the rows of its bin
+    filled = ends > starts
+    return order, starts[filled], ends[filled]
+
+
+def whitespace_tokens(text):
+    return len(text.split())
+
+
+def fit_sections(sections, budget, count_tokens):
+    """
+    Join sections in priority order while they fit the budget.  A section
+    given as (prefix, items) is shortened item by item until it fits.
+    """
+    text = ''
+    for section in sections:
+        if isinstance(section, str):
+            candidates = [section]
+        else:
+            prefix, items = section
+            candidates = [f"{prefix} {', '.join(items[:count])}" for count in range(len(items), 0, -1)]
+        for candidate in candidates:
+            joined = f'{text}; {candidate}' if text else candidate
+            if count_tokens(joined) <= budget:
+                text = joined
+                break
+    return text
+
+
+def percentages(decoder, column, tokens):
+    ids, counts = np.unique(tokens, return_counts=True)
+    order = np.argsort(-counts, kind='stable')
+    return [f"{decoder.label(column, ids[i])} {100 * counts[i] / len(tokens):.0f}%" for i in order]
+
+
+def summarize_window(window, window_times, host, decoder, budget=TOKEN_BUDGET, count_tokens=whitespace_tokens):
+    """
+    Compact text for one host's window: totals, protocol and direction mix,
+    top remote endpoints, packet size histogram, timing and countries,
+    trimmed to `budget` tokens (later sections are dropped first).
+    """
+    start = time.strftime('%Y-%m-%d %H:%M:%S', time.gmtime(window_times[0]))
+    duration = window_times[-1] - window_times[0]
+    sections = [f"host {decoder.label('source_ip', host)} from {start} UTC for {duration:.0f}s: "
+                f"{len(window)} packets"]
+
+    sections.append(('protocols', percentages(decoder, 'protocol', window[:, COLUMN['protocol']])))
+    sections.append(('directions', percentages(decoder, 'flow_direction', window[:, COLUMN['flow_direction']])))
+
+    # Remote endpoint of each packet: whichever address is not the host, with that side's port
+    sources, destinations = window[:, COLUMN['source_ip']], window[:, COLUMN['destination_ip']]
+    outbound = sources == host
+    remotes = np.where(outbound, destinations, sources)
+    ports = np.where(outbound, window[:, COLUMN['destination_port']], window[:, COLUMN['source_port']])
+    endpoints = remotes.astype(np.int64) * PortSpace.size + ports
+    ids, counts = np.unique(endpoints, return_counts=True)
+    top = np.argsort(-counts, kind='stable')[:TOP_DESTINATIONS]
+    sections.append(('top destinations', [
+        f"{decoder.label('destination_ip', ids[i] // PortSpace.size)}:"
+        f"{decoder.label('destination_port', ids[i] % PortSpace.size)} x{counts[i]}" for i in top]))
+
+    sizes, counts = np.unique(window[:, COLUMN['packet_size']], return_counts=True)
+    sections.append(('sizes', [f"{decoder.label('packet_size', size)} bytes x{count}"
+                               for size, count in zip(sizes, counts)]))
+
+    if len(window_times) > 1:
+        gaps = np.diff(window_times)
+        sections.append(f"gaps median {np.median(gaps):.2f}s max {gaps.max():.1f}s")
+
+    sections.append(('countries', percentages(decoder, 'country', window[:, COLUMN['country']])[:TOP_COUNTRIES]))
+    return fit_sections(sections, budget, count_tokens)
+
+
+def _private(value):
+    try:
+        address = ip_address(value)
+    except ValueError:
+        return False
+    # Broadcast and multicast destinations are not a host of the capture
+    return address.is_private and not (address.is_multicast or address.is_reserved or address.is_unspecified)
+
+
+def local_hosts(tokens, decoder):
+    """
+    The capturing host's address per row: the destination of inbound
+    packets and the source of outbound / internal ones.  Packets marked
+    external (the capture's network setting did not match) fall back to
+    the private address, else the source.
+    """
+    directions = ['unknown'] + decoder.spaces['direction'].values
+    inbound = np.array([label == 'inbound' for label in directions], dtype=bool)
+    undecided = np.array([label not in ('inbound', 'outbound', 'internal') for label in directions], dtype=bool)
+    private = np.array([False] + [_private(value) for value in decoder.spaces['ip'].values], dtype=bool)
+
+    direction = np.minimum(tokens[:, COLUMN['flow_direction']], len(directions) - 1)
+    sources, destinations = tokens[:, COLUMN['source_ip']], tokens[:, COLUMN['destination_ip']]
+    # Overflow ids have no stored address and count as public
+    source_private = np.where(sources < len(private), private[np.minimum(sources, len(private) - 1)], False)
+    destination_private = np.where(destinations < len(private),
+                                   private[np.minimum(destinations, len(private) - 1)], False)
+    to_destination = inbound[direction] | (undecided[direction] & destination_private & ~source_private)
+    return np.where(to_destination, destinations, sources)
+
+
+def build_window_prompts(tokens_dir=TOKENS_DIR, vocabulary_path=VOCABULARY_PATH, window=WINDOW, slide=SLIDE,
+                         budget=TOKEN_BUDGET, count_tokens=whitespace_tokens):
+    """
+    One prompt per host and time window over all tokenized files, instead
+    of one per packet.  Rows are ordered once by (host, time); every window
+    is then a contiguous slice (a view) of the ordered token matrix.
+    """
+    tokenizer = Tokenizer(vocabulary_path, tokens_dir)
+    decoder = TokenDecoder(tokenizer)
+    paths = token_files(tokens_dir)
+    columns = len(TOKEN_COLUMNS)
+    tokens = tokenizer.local_ids(np.concatenate([load_token_matrix(path) for path in paths])
+                                 if paths else np.empty((0, columns), dtype=np.int32))
+    times = np.concatenate([load_token_times(path) for path in paths]) if paths else np.empty(0)
+
+    timed = ~np.isnan(times)
+    tokens, times = tokens[timed], times[timed]
+    hosts = local_hosts(tokens, decoder)
+    order, starts, ends = window_bounds(hosts, times, window, slide)
+    tokens, times, hosts = tokens[order], times[order], hosts[order]
+
+    windows = []
+    for start, end in zip(starts, ends):
+        windows.append({
+            'host': decoder.label('source_ip', hosts[start]),
+            'start': pd.Timestamp(times[start], unit='s'),
+            'end': pd.Timestamp(times[end - 1], unit='s'),
+            'packets': int(end - start),
+            'prompt': summarize_window(tokens[start:end], times[start:end], hosts[start], decoder, budget,
+                                       count_tokens),
+        })
+    return pd.DataFrame(windows, columns=['host', 'start', 'end', 'packets', 'prompt'])
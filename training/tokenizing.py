@@ -1,39 +1,335 @@
+import argparse
+import glob
+import json
 import os
+import zlib
+
+import numpy as np
 import pandas as pd
-from sklearn.preprocessing import LabelEncoder
-
-# Load CSV
-root_dir = os.path.dirname(os.path.dirname(os.path.dirname(__file__)))
-csv_path = os.path.join(root_dir + '/humanbehaviour', 'network_traffic.csv')
-df = pd.read_csv(csv_path)
-
-# Initialize a LabelEncoder for categorical fields
-label_enc = LabelEncoder()
-
-# Apply label encoding to categorical fields
-df['protocol'] = label_enc.fit_transform(df['protocol'])
-df['flow_direction'] = label_enc.fit_transform(df['flow_direction'])
-df['country'] = label_enc.fit_transform(df['country'])
-df['region'] = label_enc.fit_transform(df['region'])
-df['city'] = label_enc.fit_transform(df['city'])
-
-# Normalize numeric fields (optional)
-df['packet_size'] = df['packet_size'] / df['packet_size'].max()
-
-# Create tokenized columns
-df['source_ip_token'] = df['source_ip']
-df['destination_ip_token'] = df['destination_ip']
-df['protocol_token'] = df['protocol']
-df['packet_size_token'] = df['packet_size']
-df['flow_direction_token'] = df['flow_direction']
-df['session_duration_token'] = df['session_duration']
-
-# Save tokenized data for LLM input with columns
-tokenized_df = df[['source_ip_token', 'destination_ip_token', 'protocol_token',
-                   'packet_size_token', 'flow_direction_token', 'session_duration_token']]
-
-# Save to CSV in a structured way
-output_path = os.path.join(root_dir + '/humanbehaviour', 'tokenized_data.csv')
-tokenized_df.to_csv(output_path, index=False)
-
-print(f"Tokenized data saved to {output_path}")
+
+from parameters_analysis.aggregation.flow_metrics import packet_times
+from parameters_analysis.aggregation.loader import CSV_PATH, TIMESTAMP_COLUMN, parse_timestamps, root_dir
+
+# Load CSV; outputs go to the repository root
+data_dir = root_dir
+csv_path = CSV_PATH
+
+# Persisted vocabulary and tokenized files (one int32 matrix per capture file)
+VOCABULARY_PATH = os.path.join(data_dir, 'token_vocabulary.json')
+TOKENS_DIR = os.path.join(data_dir, 'tokens')
+
+# Columns read besides the tokenized ones, to recover each packet's time
+TIME_COLUMNS = ['source_port', 'flow_duration', 'capture_time', TIMESTAMP_COLUMN]
+
+# Layout of the token files; bumped when it changes, so files written before are tokenized again
+TOKEN_FORMAT = 2
+
+# Token id 0 is padding; every space's local id 0 stands for a missing value
+PAD = 0
+MISSING = 0
+
+
+class VocabularySpace:
+    """
+    Values that get their own id the first time they are seen, in order,
+    until `capacity` ids are used; later new values share `overflow` ids
+    chosen by a stable hash.  Ids are never reassigned, so files tokenized
+    earlier stay valid as the vocabulary grows.
+    """
+
+    def __init__(self, capacity, overflow=0):
+        self.capacity = capacity
+        self.overflow = overflow
+        self.values = []
+        self.ids = {}
+
+    @property
+    def size(self):
+        return 1 + self.capacity + self.overflow
+
+    def load(self, values):
+        self.values = list(values)
+        self.ids = {value: position + 1 for position, value in enumerate(self.values)}
+
+    def _id(self, value):
+        token = self.ids.get(value)
+        if token is None:
+            if len(self.values) < self.capacity:
+                self.values.append(value)
+                token = self.ids[value] = len(self.values)
+            elif self.overflow:
+                token = 1 + self.capacity + zlib.crc32(value.encode()) % self.overflow
+            else:
+                token = MISSING
+        return token
+
+    def encode(self, values):
+        # One dictionary lookup per distinct value
+        codes, distinct = pd.factorize(values.astype(str).where(values.notna()))
+        mapped = np.array([self._id(value) for value in distinct], dtype=np.int32)
+        return np.where(codes >= 0, mapped[codes] if len(mapped) else MISSING, MISSING).astype(np.int32)
+
+
+class PortSpace:
+    """
+    Well-known ports keep their own id, registered ports share one id per
+    block of PORT_BLOCK, and all ephemeral ports (49152+) share one id.
+    """
+
+    PORT_BLOCK = 1024
+    EPHEMERAL = 49152
+
+    size = 1 + 1024 + (EPHEMERAL - 1024) // PORT_BLOCK + 1
+
+    def encode(self, values):
+        ports = pd.to_numeric(values, errors='coerce').to_numpy()
+        missing = np.isnan(ports)
+        ports = np.nan_to_num(ports).astype(np.int64)
+        ids = np.where(ports < 1024, 1 + ports,
+                       np.where(ports < self.EPHEMERAL, 1 + 1024 + (ports - 1024) // self.PORT_BLOCK, self.size - 1))
+        return np.where(missing, MISSING, ids).astype(np.int32)
+
+
+class LogSpace:
+    """Non-negative numbers bucketed by log2(1 + value * scale), capped at `buckets`."""
+
+    def __init__(self, buckets, scale=1.0):
+        self.buckets = buckets
+        self.scale = scale
+
+    @property
+    def size(self):
+        return 1 + self.buckets
+
+    def encode(self, values):
+        numbers = pd.to_numeric(values, errors='coerce').to_numpy(dtype=float)
+        missing = np.isnan(numbers)
+        buckets = np.floor(np.log2(1 + np.maximum(np.nan_to_num(numbers), 0) * self.scale))
+        return np.where(missing, MISSING, 1 + np.minimum(buckets, self.buckets - 1)).astype(np.int32)
+
+    def lower_bound(self, ids):
+        """Smallest value of each bucket, to turn ids back into approximate values."""
+        return (np.exp2(np.maximum(np.asarray(ids) - 1, 0)) - 1) / self.scale
+
+
+def token_spaces():
+    # The order fixes each space's id offset; append new spaces at the end only
+    return {
+        'ip': VocabularySpace(capacity=65536, overflow=4096),
+        'port': PortSpace(),
+        'protocol': VocabularySpace(capacity=64),
+        'size': LogSpace(buckets=17),
+        'direction': VocabularySpace(capacity=16),
+        'duration': LogSpace(buckets=32, scale=1000),      # milliseconds
+        'country': VocabularySpace(capacity=512, overflow=64),
+        'region': VocabularySpace(capacity=8192, overflow=1024),
+        'city': VocabularySpace(capacity=32768, overflow=4096),
+    }
+
+
+# Capture column -> token space, in the column order of the token matrices
+TOKEN_COLUMNS = {
+    'source_ip': 'ip',
+    'destination_ip': 'ip',
+    'destination_port': 'port',
+    'protocol': 'protocol',
+    'packet_size': 'size',
+    'flow_direction': 'direction',
+    'session_duration': 'duration',
+    'country': 'country',
+    'region': 'region',
+    'city': 'city',
+    'source_port': 'port',
+}
+
+
+class Tokenizer:
+    """
+    Turns capture rows into int32 token matrices, one column per entry of
+    TOKEN_COLUMNS.  Each space owns a fixed id range (its offset is the sum
+    of the sizes before it), so a token id means the same thing in every
+    file and in every run.  The vocabulary and the list of tokenized files
+    are persisted next to the outputs; tokenize_files() only processes new
+    or changed capture files.
+    """
+
+    def __init__(self, vocabulary_path=VOCABULARY_PATH, tokens_dir=TOKENS_DIR):
+        self.vocabulary_path = vocabulary_path
+        self.tokens_dir = tokens_dir
+        self.spaces = token_spaces()
+        self.offsets = {}
+        offset = PAD + 1
+        for name, space in self.spaces.items():
+            self.offsets[name] = offset
+            offset += space.size
+        self.vocabulary_size = offset
+        self.files = {}
+        self.load()
+
+    def load(self):
+        if not os.path.exists(self.vocabulary_path):
+            return
+        with open(self.vocabulary_path) as f:
+            state = json.load(f)
+        for name, values in state['vocabularies'].items():
+            self.spaces[name].load(values)
+        # Files tokenized with other columns or in another layout are tokenized again (they would not line up)
+        current = state.get('columns') == TOKEN_COLUMNS and state.get('format') == TOKEN_FORMAT
+        self.files = state['files'] if current else {}
+
+    def save(self):
+        state = {
+            'vocabulary_size': self.vocabulary_size,
+            'columns': TOKEN_COLUMNS,
+            'format': TOKEN_FORMAT,
+            'offsets': self.offsets,
+            'vocabularies': {name: space.values for name, space in self.spaces.items()
+                             if isinstance(space, VocabularySpace)},
+            'files': self.files,
+        }
+        # Write to a temporary file first so an interrupted save keeps the previous vocabulary
+        os.makedirs(os.path.dirname(self.vocabulary_path) or '.', exist_ok=True)
+        temporary = self.vocabulary_path + '.tmp'
+        with open(temporary, 'w') as f:
+            json.dump(state, f)
+        os.replace(temporary, self.vocabulary_path)
+
+    def encode(self, df):
+        """Rows -> int32 matrix of global token ids (missing columns encode as missing)."""
+        matrix = np.empty((len(df), len(TOKEN_COLUMNS)), dtype=np.int32)
+        for position, (column, name) in enumerate(TOKEN_COLUMNS.items()):
+            values = df[column] if column in df.columns else pd.Series([None] * len(df), dtype=object)
+            matrix[:, position] = self.offsets[name] + self.spaces[name].encode(values)
+        return matrix
+
+    def local_ids(self, matrix):
+        """Global token ids -> ids within each column's space."""
+        offsets = np.array([self.offsets[name] for name in TOKEN_COLUMNS.values()], dtype=np.int32)
+        return np.asarray(matrix) - offsets
+
+    def output_path(self, path, file_format='npy'):
+        name = os.path.splitext(os.path.basename(path))[0]
+        user = os.path.basename(os.path.dirname(os.path.abspath(path)))
+        return os.path.join(self.tokens_dir, f"{user}-{name}.{'arrow' if file_format == 'arrow' else 'npy'}")
+
+    def tokenize_file(self, path, file_format='npy'):
+        df = pd.read_csv(path, usecols=lambda column: column in TOKEN_COLUMNS or column in TIME_COLUMNS)
+        matrix = self.encode(df)
+        output = self.output_path(path, file_format)
+        os.makedirs(os.path.dirname(times_path(output)), exist_ok=True)
+        if file_format == 'arrow':
+            write_arrow(matrix, output)
+        else:
+            np.save(output, matrix)
+        # Packet times (epoch seconds) next to the tokens, for windowing by time
+        if TIMESTAMP_COLUMN in df.columns:
+            df[TIMESTAMP_COLUMN] = parse_timestamps(df[TIMESTAMP_COLUMN])
+            np.save(times_path(output), packet_times(df))
+        else:
+            np.save(times_path(output), np.full(len(df), np.nan))
+        stat = os.stat(path)
+        self.files[os.path.abspath(path)] = {'size': stat.st_size, 'mtime': stat.st_mtime, 'rows': len(matrix),
+                                             'tokens': output}
+        return output
+
+    def is_current(self, path):
+        entry = self.files.get(os.path.abspath(path))
+        if entry is None or not os.path.exists(entry['tokens']) or not os.path.exists(times_path(entry['tokens'])):
+            return False
+        stat = os.stat(path)
+        return entry['size'] == stat.st_size and entry['mtime'] == stat.st_mtime
+
+    def tokenize_files(self, paths, file_format='npy'):
+        """Tokenize the new or changed files, then persist the grown vocabulary."""
+        outputs = []
+        for path in paths:
+            if self.is_current(path):
+                continue
+            outputs.append(self.tokenize_file(path, file_format))
+            print(f"Tokenized {path} -> {outputs[-1]}")
+        if outputs:
+            self.save()
+        return outputs
+
+
+def write_arrow(matrix, path):
+    """
+    Uncompressed Arrow IPC file holding the matrix as one fixed-size list
+    column (a row of int32 tokens per packet), in a single chunk, so its
+    values are one contiguous row-major buffer that maps to a 2-D array.
+    """
+    import pyarrow as pa
+    import pyarrow.feather as feather
+    matrix = np.ascontiguousarray(matrix, dtype=np.int32)
+    tokens = pa.FixedSizeListArray.from_arrays(pa.array(matrix.ravel()), matrix.shape[1])
+    table = pa.table({'tokens': tokens}, metadata={'columns': json.dumps(list(TOKEN_COLUMNS))})
+    feather.write_feather(table, path, compression='uncompressed', chunksize=max(len(matrix), 1))
+
+
+def load_token_matrix(path):
+    """
+    Token matrix of one file without reading it into memory: .npy files are
+    memory-mapped, and an Arrow file's token column is a zero-copy 2-D view
+    of the mapped file.
+    """
+    if path.endswith('.arrow'):
+        import pyarrow as pa
+        import pyarrow.feather as feather
+        table = feather.read_table(pa.memory_map(path), memory_map=True)
+        chunks = table.column('tokens').chunks
+        if not chunks:
+            return np.empty((0, len(TOKEN_COLUMNS)), dtype=np.int32)
+        # write_arrow() writes one chunk; flatten() honours its offset without copying
+        return chunks[0].flatten().to_numpy(zero_copy_only=True).reshape(-1, len(TOKEN_COLUMNS))
+    return np.load(path, mmap_mode='r')
+
+
+def times_path(tokens_path):
+    """Packet times of a token file: <tokens dir>/times/<name>.npy."""
+    directory, name = os.path.split(tokens_path)
+    return os.path.join(directory, 'times', os.path.splitext(name)[0] + '.npy')
+
+
+def load_token_times(tokens_path):
+    return np.load(times_path(tokens_path), mmap_mode='r')
+
+
+def token_files(tokens_dir=TOKENS_DIR):
+    return sorted(glob.glob(os.path.join(tokens_dir, '*.npy')) + glob.glob(os.path.join(tokens_dir, '*.arrow')))
+
+
+def load_token_frame(tokens_dir=TOKENS_DIR, local=True):
+    """All tokenized files as one DataFrame of <column>_token ids (per-space ids when local)."""
+    tokenizer = Tokenizer(tokens_dir=tokens_dir)
+    matrices = [load_token_matrix(path) for path in token_files(tokens_dir)]
+    matrix = np.concatenate(matrices) if matrices else np.empty((0, len(TOKEN_COLUMNS)), dtype=np.int32)
+    if local:
+        matrix = tokenizer.local_ids(matrix)
+    return pd.DataFrame(matrix, columns=[f'{column}_token' for column in TOKEN_COLUMNS])
+
+
+def capture_files(paths):
+    """CSV files named directly or found (recursively) in the given directories."""
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            files.extend(sorted(glob.glob(os.path.join(path, '**', '*.csv'), recursive=True)))
+        else:
+            files.append(path)
+    return files
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Tokenize capture CSVs into int32 token matrices.")
+    parser.add_argument('paths', nargs='*', default=[csv_path], help="capture CSV files or directories")
+    parser.add_argument('--format', choices=['npy', 'arrow'], default='npy', help="output file format")
+    args = parser.parse_args()
+
+    tokenizer = Tokenizer()
+    outputs = tokenizer.tokenize_files(capture_files(args.paths), args.format)
+    print(f"{len(outputs)} files tokenized; vocabulary of {tokenizer.vocabulary_size} ids saved to "
+          f"{tokenizer.vocabulary_path}")
+
+
+if __name__ == '__main__':
+    main()
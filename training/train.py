@@ -1,55 +1,265 @@
+import argparse
+import hashlib
+import json
+import os
+import time
+
+import numpy as np
 import pandas as pd
-from transformers import AutoTokenizer, AutoModelForCausalLM
 import torch
+from transformers import AutoTokenizer, AutoModelForCausalLM
+
+from training.prepare_model import MODELS_DIR, VARIANTS, find_prepared, load_int8, load_onnx
+from training.prompts import SLIDE, TOKEN_BUDGET, WINDOW, build_window_prompts
+from training.tokenizing import TOKENS_DIR, VOCABULARY_PATH, load_token_frame
+
+# Hugging Face model name or local directory (a small local model works for tests)
+MODEL_NAME = "mistral"
+
+# Batching: at most BATCH_SIZE prompts, and at most MAX_BATCH_TOKENS padded prompt tokens, per generate call
+BATCH_SIZE = 16
+MAX_BATCH_TOKENS = 4096
+MAX_NEW_TOKENS = 64
+
+OUTPUT_PATH = 'mistral_processed_output.csv'
+# Generated text per distinct prompt, appended as batches finish; also the resume point
+CHECKPOINT_PATH = 'mistral_processed_output.jsonl'
+
+
+def load_model(model_name=MODEL_NAME, threads=None, variant='auto', models_dir=MODELS_DIR):
+    """
+    Load the model for CPU inference; `threads` sets the intra-op thread
+    count.  variant 'auto' picks the ONNX Runtime or int8 copy written by
+    prepare_model.py when there is one, else the fp32 model.  Returns the
+    model, its tokenizer and the variant loaded.
+    """
+    if threads:
+        torch.set_num_threads(threads)
+    variant, directory = find_prepared(model_name, variant, models_dir)
+    tokenizer = AutoTokenizer.from_pretrained(directory)
+    # Decoder-only models continue from the end of the prompt, so pad on the left
+    tokenizer.padding_side = 'left'
+    if tokenizer.pad_token is None:
+        tokenizer.pad_token = tokenizer.eos_token
+    if variant == 'onnx':
+        model = load_onnx(directory, threads)
+    elif variant == 'int8':
+        model = load_int8(directory)
+    else:
+        model = AutoModelForCausalLM.from_pretrained(directory)
+        model.eval()
+    print(f"Loaded {variant} model from {directory}")
+    return model, tokenizer, variant
+
+
+# Join all tokenized fields of a row into a prompt
+def row_prompt(row):
+    return " ".join(map(str, row))
+
+
+def prompt_key(prompt, settings):
+    """Content hash of a prompt and the generation settings, used to generate each prompt once."""
+    return hashlib.sha1(json.dumps([prompt, settings], sort_keys=True).encode()).hexdigest()
+
+
+class ResultCache:
+    """
+    Prompt keys generated so far, backed by an append-only JSON lines file
+    holding the text of each.  Every finished batch is flushed to disk, so
+    an interrupted run resumes with the prompts that are still missing.
+    Only the keys are kept in memory; results() reads texts back from disk.
+    """
 
-# Load the mistral model and tokenizer from Hugging Face
-tokenizer = AutoTokenizer.from_pretrained("mistral")
-model = AutoModelForCausalLM.from_pretrained("mistral")
+    def __init__(self, path=CHECKPOINT_PATH):
+        self.path = path
+        self.keys = set()
+        if os.path.exists(path):
+            for key, _ in self._entries():
+                self.keys.add(key)
+        self.file = open(path, 'a')
 
+    def _entries(self):
+        with open(self.path) as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    # A line cut short by an interruption; its prompt is generated again
+                    continue
+                yield entry['key'], entry['result']
 
-# Load your tokenized data from tokenized_data.csv
-def load_tokenized_data(csv_file):
-    df = pd.read_csv(csv_file)
-    return df
+    def __contains__(self, key):
+        return key in self.keys
 
+    def __len__(self):
+        return len(self.keys)
 
-# Function to process each tokenized row with Mistral
-def process_with_mistral(row, model, tokenizer):
-    # Join all tokenized fields into a prompt to send to Mistral
-    input_data = " ".join(map(str, row))
+    def add(self, keys, results):
+        for key, result in zip(keys, results):
+            self.file.write(json.dumps({'key': key, 'result': result}) + '\n')
+        self.file.flush()
+        os.fsync(self.file.fileno())
+        self.keys.update(keys)
 
-    # Tokenize input
-    inputs = tokenizer(input_data, return_tensors="pt")
+    def results(self, keys):
+        """(key, text) of each of the given keys stored on disk, in file order."""
+        wanted = set(keys)
+        for key, result in self._entries():
+            if key in wanted:
+                wanted.discard(key)
+                yield key, result
 
-    # Generate output using the Mistral model
-    with torch.no_grad():
-        outputs = model.generate(inputs["input_ids"], max_length=100)
+    def close(self):
+        self.file.close()
+
+
+class ResultWriter:
+    """
+    The output CSV, one Processed_Text row per prompt (after its window's
+    columns, or its token row index), appended as results arrive: rows are
+    in completion order, not prompt order.
+    """
+
+    def __init__(self, output_path=OUTPUT_PATH, windows=None):
+        self.output_path = output_path
+        self.windows = windows.drop(columns='prompt') if windows is not None else None
+        self.rows = 0
+        self._frame([], []).to_csv(output_path, index=False)
+
+    def _frame(self, positions, texts):
+        if self.windows is None:
+            return pd.DataFrame({'row': pd.Series(positions, dtype=np.int64), 'Processed_Text': texts})
+        frame = self.windows.iloc[positions].reset_index(drop=True)
+        frame['Processed_Text'] = pd.Series(texts, dtype=object)
+        return frame
+
+    def write(self, positions, texts):
+        self._frame(positions, texts).to_csv(self.output_path, mode='a', header=False, index=False)
+        self.rows += len(positions)
+
+
+def length_batches(lengths, batch_size=BATCH_SIZE, max_batch_tokens=MAX_BATCH_TOKENS):
+    """
+    Group prompt indices into batches of similar length: sorted by token
+    count, a batch grows until it holds batch_size prompts or its padded
+    size (prompts x longest prompt) would exceed max_batch_tokens.
+    """
+    batch, longest = [], 0
+    for index in np.argsort(lengths, kind='stable'):
+        length = int(lengths[index])
+        if batch and (len(batch) >= batch_size or (len(batch) + 1) * max(longest, length) > max_batch_tokens):
+            yield batch
+            batch, longest = [], 0
+        batch.append(int(index))
+        longest = max(longest, length)
+    if batch:
+        yield batch
+
+
+def generate_batch(prompts, model, tokenizer, max_new_tokens=MAX_NEW_TOKENS):
+    # Tokenize input with padding to the longest prompt of the batch
+    inputs = tokenizer(prompts, return_tensors="pt", padding=True, return_token_type_ids=False)
+
+    # Generate output using the model; greedy decoding so cached results are reproducible
+    with torch.inference_mode():
+        outputs = model.generate(**inputs, max_new_tokens=max_new_tokens, do_sample=False,
+                                 pad_token_id=tokenizer.pad_token_id)
 
     # Decode the output tokens back to text
-    result = tokenizer.decode(outputs[0], skip_special_tokens=True)
-    return result
+    return tokenizer.batch_decode(outputs, skip_special_tokens=True)
 
 
-# Function to iterate over the data and analyze using Mistral
-def analyze_data_with_mistral(csv_file):
-    df = load_tokenized_data(csv_file)
+def analyze_data_with_mistral(prompts, model, tokenizer, cache, writer, batch_size=BATCH_SIZE,
+                              max_batch_tokens=MAX_BATCH_TOKENS, max_new_tokens=MAX_NEW_TOKENS, model_name=MODEL_NAME,
+                              variant='fp32', chunk_size=10000):
+    """
+    Generate text for every prompt, each distinct prompt once, and write
+    it to `writer` for every prompt that produced it: results of earlier
+    runs first, then each batch as it finishes.
+    """
+    settings = {'model': model_name, 'max_new_tokens': max_new_tokens}
+    if variant != 'fp32':
+        # Quantized variants generate slightly different text; keep their results apart
+        settings['variant'] = variant
+    positions = {}
+    pending = {}
+    for index, prompt in enumerate(prompts):
+        key = prompt_key(prompt, settings)
+        positions.setdefault(key, []).append(index)
+        if key not in cache:
+            pending[key] = prompt
+    print(f"{len(prompts)} prompts, {len(positions)} distinct, {len(pending)} still to generate")
 
-    # Process each row
-    results = []
-    for index, row in df.iterrows():
-        result = process_with_mistral(row, model, tokenizer)
-        print(f"Processed row {index + 1}: {result}")
+    def emit(keys, results):
+        indices, texts = [], []
+        for key, result in zip(keys, results):
+            indices.extend(positions[key])
+            texts.extend([result] * len(positions[key]))
+        writer.write(indices, texts)
+
+    keys, results = [], []
+    for key, result in cache.results(key for key in positions if key not in pending):
+        keys.append(key)
         results.append(result)
+        if len(keys) >= chunk_size:
+            emit(keys, results)
+            keys, results = [], []
+    if keys:
+        emit(keys, results)
 
-    return results
+    pending_keys, prompts = list(pending), list(pending.values())
+    lengths = np.array([len(ids) for ids in tokenizer(prompts)['input_ids']]) if prompts else np.array([])
+    done, start = 0, time.perf_counter()
+    for batch in length_batches(lengths, batch_size, max_batch_tokens):
+        results = generate_batch([prompts[index] for index in batch], model, tokenizer, max_new_tokens)
+        keys = [pending_keys[index] for index in batch]
+        cache.add(keys, results)
+        emit(keys, results)
+        done += len(batch)
+        print(f"Processed {done}/{len(prompts)} prompts ({done / (time.perf_counter() - start):.1f} prompts/s)")
+    return writer.rows
 
 
 # Main function
-if __name__ == "__main__":
-    csv_file = 'tokenized_data.csv'
-    results = analyze_data_with_mistral(csv_file)
+def main():
+    parser = argparse.ArgumentParser(description="Generate text for tokenized capture traffic with a causal LM.")
+    parser.add_argument('--model', default=MODEL_NAME, help="model name or local directory")
+    parser.add_argument('--tokens-dir', default=TOKENS_DIR, help="token matrices written by tokenizing.py")
+    parser.add_argument('--vocabulary', default=VOCABULARY_PATH, help="vocabulary written by tokenizing.py")
+    parser.add_argument('--prompts', choices=['windows', 'rows'], default='windows',
+                        help="one prompt per host time window (summary), or one per packet row")
+    parser.add_argument('--window', type=float, default=WINDOW, help="seconds of traffic per window")
+    parser.add_argument('--slide', type=float, default=SLIDE, help="seconds between window starts (default: window)")
+    parser.add_argument('--token-budget', type=int, default=TOKEN_BUDGET, help="maximum tokens per window prompt")
+    parser.add_argument('--variant', choices=['auto', 'fp32'] + VARIANTS, default='auto',
+                        help="model variant (auto: prepared ONNX / int8 copy if any, else fp32)")
+    parser.add_argument('--models-dir', default=MODELS_DIR, help="prepared variants written by prepare_model.py")
+    parser.add_argument('--threads', type=int, default=None, help="CPU threads for inference (default: torch's)")
+    parser.add_argument('--batch-size', type=int, default=BATCH_SIZE)
+    parser.add_argument('--max-batch-tokens', type=int, default=MAX_BATCH_TOKENS)
+    parser.add_argument('--max-new-tokens', type=int, default=MAX_NEW_TOKENS)
+    parser.add_argument('--output', default=OUTPUT_PATH)
+    parser.add_argument('--checkpoint', default=CHECKPOINT_PATH, help="generated text per prompt, for resuming")
+    args = parser.parse_args()
 
-    # Optionally, save results to a new CSV file
-    output_df = pd.DataFrame({'Processed_Text': results})
-    output_df.to_csv('mistral_processed_output.csv', index=False)
-    print("Processing complete. Results saved to mistral_processed_output.csv")
+    model, tokenizer, variant = load_model(args.model, args.threads, args.variant, args.models_dir)
+    windows = None
+    if args.prompts == 'windows':
+        windows = build_window_prompts(args.tokens_dir, args.vocabulary, args.window, args.slide, args.token_budget,
+                                       count_tokens=lambda text: len(tokenizer(text)['input_ids']))
+        prompts = windows['prompt'].tolist()
+    else:
+        df = load_token_frame(args.tokens_dir, local=False)
+        prompts = [row_prompt(row) for row in df.itertuples(index=False)]
+    cache = ResultCache(args.checkpoint)
+    writer = ResultWriter(args.output, windows)
+    try:
+        rows = analyze_data_with_mistral(prompts, model, tokenizer, cache, writer, args.batch_size,
+                                         args.max_batch_tokens, args.max_new_tokens, args.model, variant)
+    finally:
+        cache.close()
+    print(f"Processing complete. {rows} results saved to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,35 +1,190 @@
+import argparse
+import io
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import joblib
+import numpy as np
 import pandas as pd
-from sklearn.model_selection import train_test_split
 from sklearn.preprocessing import StandardScaler
 from sklearn.ensemble import RandomForestClassifier
+from sklearn.linear_model import SGDClassifier
 from sklearn.metrics import classification_report, accuracy_score
 
-# Load and preprocess data
-df = pd.read_csv('network_traffic.csv')
-df = df.dropna()
+from parameters_analysis.feature_store.features import FEATURE_SETS
+from parameters_analysis.feature_store.store import FEATURE_STORE_DIR, FeatureStore, read_rows
+from parameters_analysis.flow_scoring.scorer import MODEL_PATH
+from training.tokenizing import capture_files
+
+FEATURES = FEATURE_SETS['packet'].features
+# Changes whenever the feature computation does; a model trained on other features starts over
+FEATURE_HASH = FEATURE_SETS['packet'].hash
+CLASSES = np.array([0, 1])
+
+# Trees added to the forest per update; each new batch of data gets its own trees
+TREES_PER_UPDATE = 100
+
+
+def file_features(path, offset=0, first_row=0, store_dir=FEATURE_STORE_DIR):
+    """
+    Feature matrix and labels of the rows of one capture file from byte
+    `offset` on, which are rows first_row... of the file (the rows before
+    are learned already).  Only those rows are read and featurized, as a
+    row range entry of the feature store, so graph features describe the
+    hosts over the new rows.  Returns (X, y, offset to continue from, rows
+    read).
+    """
+    table = FeatureStore(store_dir).load_rows('packet', path, offset)
+    positions = np.asarray(table.keys['row'])
+    X = np.asarray(table.matrix, dtype=np.float64)
+
+    header, data, _ = read_rows(path, offset)
+    if 'label' in header.decode().strip().split(','):
+        # Only the new rows, as they were featurized
+        data = data[:table.manifest['end'] - table.manifest['offset']]
+        y = pd.read_csv(io.BytesIO(header + data), usecols=['label'])['label'].to_numpy(dtype=np.int64)[positions]
+    else:
+        # Demonstration labels when the capture has no 'label' column: 0 = legitimate user, 1 = intruder,
+        # alternating; real labels should come from analysis or domain knowledge
+        y = ((first_row + positions) % 2).astype(np.int64)
+    return X, y, table.manifest['end'], table.manifest['source_rows']
+
+
+def new_learner(kind, n_jobs=-1):
+    if kind == 'forest':
+        # warm_start: later fit() calls add trees trained on the new data and keep the old ones
+        return RandomForestClassifier(n_estimators=0, warm_start=True, n_jobs=n_jobs)
+    if kind == 'sgd':
+        return SGDClassifier(loss='log_loss', random_state=42)
+    raise ValueError(f"Unknown learner '{kind}'; expected 'forest' or 'sgd'")
+
+
+def load_state(path, learner):
+    """The persisted training state, or a fresh one; a stored schema that no longer matches starts over."""
+    if os.path.exists(path):
+        state = joblib.load(path)
+        if state['features'] == FEATURES and state.get('feature_hash') == FEATURE_HASH and state['learner'] == learner:
+            return state
+        print(f"{path} was trained with other features or learner; training from scratch")
+    return {'features': FEATURES, 'feature_hash': FEATURE_HASH, 'learner': learner, 'model': new_learner(learner),
+            'scaler': StandardScaler(), 'files': {}}
+
+
+def save_state(state, path):
+    # Written beside the target first, so an interrupted save keeps the previous model
+    joblib.dump(state, path + '.tmp')
+    os.replace(path + '.tmp', path)
+
+
+def row_offset(path, rows):
+    """Byte offset after the header and the first `rows` rows (for states that recorded rows only)."""
+    with open(path, 'rb') as f:
+        for _ in range(rows + 1):
+            f.readline()
+        return f.tell()
+
+
+def pending_files(paths, state):
+    """(path, byte offset, rows) already learned of files that are new or have grown since the last update."""
+    pending = []
+    for path in paths:
+        entry = state['files'].get(os.path.abspath(path))
+        stat = os.stat(path)
+        if entry is None:
+            pending.append((path, 0, 0))
+        elif (stat.st_size, stat.st_mtime) != (entry['size'], entry['mtime']):
+            # Captures only append rows; anything else (a shrunk file) is learned again in full
+            if stat.st_size < entry['size']:
+                pending.append((path, 0, 0))
+            else:
+                offset = entry['offset'] if 'offset' in entry else row_offset(path, entry['rows'])
+                pending.append((path, offset, entry['rows']))
+    return pending
+
+
+def update(state, X, y, trees_per_update=TREES_PER_UPDATE, n_jobs=-1):
+    """
+    Fold a batch of new rows into the model; returns False when the batch
+    cannot be learned yet.  The scaler is fitted on the first batch only:
+    the learned trees and weights expect inputs scaled the way they were
+    trained, so its statistics must not move afterwards.
+    """
+    model = state['model']
+    if state['learner'] == 'forest' and len(np.unique(y)) < len(CLASSES):
+        # Trees fitted on one class predict a single probability column, which breaks the whole forest
+        return False
+    if not hasattr(state['scaler'], 'mean_'):
+        state['scaler'].fit(X)
+    X = state['scaler'].transform(X)
+    if state['learner'] == 'forest':
+        model.n_jobs = n_jobs
+        model.n_estimators += trees_per_update
+        model.fit(X, y)
+    else:
+        model.partial_fit(X, y, classes=CLASSES)
+    return True
+
+
+def train(paths, model_path=MODEL_PATH, learner='forest', workers=None, n_jobs=-1, trees_per_update=TREES_PER_UPDATE):
+    """
+    Update the persisted model with the rows it has not seen: files are
+    read and featurized in parallel processes, the current model is
+    evaluated on the new rows (prequential evaluation: test first, then
+    train), and then every new row is folded into it, so no row is held
+    out for good.  Work is proportional to the new data only.
+    """
+    state = load_state(model_path, learner)
+    pending = pending_files(paths, state)
+    if not pending:
+        print("No new capture data; model unchanged")
+        return state
+
+    start = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        results = list(pool.map(file_features, *zip(*pending)))
+    X = np.concatenate([result[0] for result in results])
+    y = np.concatenate([result[1] for result in results])
+    print(f"Featurized {len(X)} new rows from {len(pending)} files in {time.perf_counter() - start:.2f}s")
+
+    if len(X):
+        if hasattr(state['scaler'], 'mean_'):
+            # Rows the model has not seen yet, predicted before it learns them
+            y_pred = state['model'].predict(state['scaler'].transform(X))
+            print(f"Accuracy on the new rows before the update: {accuracy_score(y, y_pred)}")
+            print(classification_report(y, y_pred, zero_division=0))
+        else:
+            print("First update: no model to evaluate on the new rows yet")
+
+        start = time.perf_counter()
+        if not update(state, X, y, trees_per_update, n_jobs):
+            # The files stay pending, so their rows are learned together with a later batch holding both classes
+            print("New rows hold only one class; forest update deferred until rows of both classes arrive")
+            return state
+        print(f"Updated {learner} model on {len(X)} rows in {time.perf_counter() - start:.2f}s")
 
-# Adding a 'label' column for demonstration
-# 0 = legitimate user, 1 = intruder
-# This should be based on actual data analysis or domain knowledge
-df['label'] = [0 if x % 2 == 0 else 1 for x in range(len(df))]  # Example: alternating labels
+    for (path, _, learned), (_, _, offset, rows) in zip(pending, results):
+        stat = os.stat(path)
+        state['files'][os.path.abspath(path)] = {'size': stat.st_size, 'mtime': stat.st_mtime, 'offset': offset,
+                                                 'rows': learned + rows}
+    save_state(state, model_path)
+    print(f"Model, scaler and feature schema saved to {model_path}")
+    return state
 
-# Feature scaling
-scaler = StandardScaler()
-features = ['packet_size', 'total_packets', 'total_bytes', 'flow_duration']
-df[features] = scaler.fit_transform(df[features])
 
-# Define features and target variable
-X = df[features]
-y = df['label']
+def main():
+    parser = argparse.ArgumentParser(description="Train or update the intruder classifier on new capture data.")
+    parser.add_argument('paths', nargs='*', default=['network_traffic.csv'], help="capture CSV files or directories")
+    parser.add_argument('--model', default=MODEL_PATH, help="persisted model to update")
+    parser.add_argument('--learner', choices=['forest', 'sgd'], default='forest',
+                        help="warm-started random forest, or SGD logistic regression updated with partial_fit")
+    parser.add_argument('--workers', type=int, default=None, help="processes reading files (default: all cores)")
+    parser.add_argument('--n-jobs', type=int, default=-1, help="cores fitting the forest (default: all)")
+    parser.add_argument('--trees-per-update', type=int, default=TREES_PER_UPDATE)
+    args = parser.parse_args()
 
-# Split data into training and testing sets
-X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, random_state=42)
+    train(capture_files(args.paths), args.model, args.learner, args.workers, args.n_jobs, args.trees_per_update)
 
-# Train the model
-model = RandomForestClassifier()
-model.fit(X_train, y_train)
 
-# Predict and evaluate
-y_pred = model.predict(X_test)
-print(f"Accuracy: {accuracy_score(y_test, y_pred)}")
-print(classification_report(y_test, y_pred))
+if __name__ == '__main__':
+    main()